@@ -1039,19 +1039,25 @@ class Configuration:
         structure[MetaTbl] = m
         fieldtypes[MetaTbl] = f
 
+        deferred = {}
         types = self.GetAllObjectConfs()
         for ty in types:
             t = []
             f = {}
+            d = []
             for fld in self.GetAllObjectFlds(ty.id):
                 f[fld.id] = fld.datatype
                 if fld.datatype == "file":
                     continue
                 t.append(fld.id)
+                if fld.get("deferred"):
+                    d.append(fld.id)
             structure[ty.dbparam] = t
             fieldtypes[ty.dbparam] = f
+            if d:
+                deferred[ty.dbparam] = d
         
-        self._structure.Init(structure, fieldtypes, m, self.configuration.frontendCodepage)
+        self._structure.Init(structure, fieldtypes, m, self.configuration.frontendCodepage, deferred=deferred)
         # reset cached db
         self.Close()
         return structure
@@ -1077,6 +1083,8 @@ class AppFactory:
             poolTag = "nive.utils.dataPool2.sqlite3Pool.Sqlite3"
         elif poolTag.lower() == "mysql":
             poolTag = "nive.utils.dataPool2.mySqlPool.MySql"
+        elif poolTag.lower() == "memory":
+            poolTag = "nive.utils.dataPool2.sqlite3Pool.Sqlite3Memory"
 
         # if a database connection other than the default is configured
         cTag = self.dbConfiguration.connection
@@ -1093,6 +1101,13 @@ class AppFactory:
                       structure=self._structure, 
                       root=conn.fileRoot, 
                       useTrashcan=conn.useTrashcan, 
+                      trashcanRetention=conn.get("trashcanRetention", 0),
+                      trashcanInterval=conn.get("trashcanInterval", 3600),
+                      trashcanQueue=conn.get("trashcanQueue", False),
+                      directoryDepth=conn.get("directoryDepth", 0),
+                      directoryWidth=conn.get("directoryWidth", 2),
+                      treeIndex=conn.get("treeIndex", False),
+                      contentStore=conn.get("contentStore", False),
                       dbCodePage=conn.dbCodePage,
                       debug=conn.querylog[0],
                       log=conn.querylog[1])
@@ -1126,6 +1141,8 @@ class AppFactory:
             poolTag = "nive.utils.dataPool2.sqlite3Pool.Sqlite3"
         elif poolTag.lower() == "mysql":
             poolTag = "nive.utils.dataPool2.mySqlPool.MySql"
+        elif poolTag.lower() == "memory":
+            poolTag = "nive.utils.dataPool2.sqlite3Pool.Sqlite3Memory"
         dbObj = GetClassRef(poolTag, self.reloadExtensions, True, None)
         return dbObj._DefaultConnection(config=self.dbConfiguration, connectNow=False)
 
@@ -93,7 +93,8 @@ configuration.modules = [
     #"nive.components.extensions.localgroups",
     # tools
     "nive.components.tools.dbStructureUpdater", "nive.components.tools.dbSqldataDump", "nive.components.tools.cmsstatistics",
-    "nive.components.tools.gcdump",
+    "nive.components.tools.gcdump", "nive.components.tools.dbTreeIndex", "nive.components.tools.dbIndexAdvisor",
+    "nive.components.tools.dbTrashcan", "nive.components.tools.dbFileLayout",
     # administration and persistence
     "nive.adminview",
     "nive.components.extensions.persistence.dbPersistenceConfiguration"
@@ -122,6 +122,11 @@ class ContainerCopy:
                 msgs.append(_(u"Object not found"))
                 result = False
                 continue
+            # an object cannot be moved into its own subtree
+            if self.GetID() > 0 and self.db.IsContained(self.GetID(), id):
+                msgs.append(_(u"Object cannot be moved into itself"))
+                result = False
+                continue
 
             type=obj.GetTypeID()
             # allow subobject
@@ -74,30 +74,27 @@ class Sort:
             return False, _(u"List is empty")
         if isinstance(objs, basestring):
             objs = ConvertToNumberList(objs)
-        ids = []
-        for oi in objs:
-            # check if listed objects are objects or ids
-            if not IObject.providedBy(oi):
-                ids.append(int(oi))
-        if ids:
-            # load remaining objects by id
-            objs2 = self.GetObjsBatch(ids)
+        # all sort values are stored in a single bulk update
         pos = 10
+        values = []
         processed = []
+        loaded = {}
         for obj in objs:
-            if not IObject.providedBy(obj):
-                for o in objs2:
-                    if o.id == int(obj):
-                        obj = o
-                        break
-            if not IObject.providedBy(obj):
-                continue
-            if obj.id in processed:
+            if IObject.providedBy(obj):
+                id = obj.id
+                loaded[id] = obj
+            else:
+                id = int(obj)
+            if id in processed:
                 continue
-            processed.append(obj.id)
-            obj.meta.set("pool_sort", pos)
-            obj.CommitInternal(user)
+            processed.append(id)
+            values.append((id, {u"pool_sort": pos}))
             pos += 10
+        ids = self.UpdateMany(values, user=user)
+        # refresh objects passed in
+        for id, data in values:
+            if id in ids and id in loaded and not loaded[id].meta.IsEmpty():
+                loaded[id].meta.SetContent(data)
         return True, _(u"OK")
         
         
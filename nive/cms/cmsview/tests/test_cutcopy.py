@@ -65,7 +65,15 @@ class tdbCutCopy(unittest.TestCase):
         #self.assertFalse(len(self.page.GetObjs()))
         self.assert_(root.Delete(new_texts[0].id, user))
         self.assert_(root.Delete(new_texts[1].id, user))
-        
+
+    def test_moveself(self):
+        user = User(u"test")
+        user.groups.append("group:editor")
+        page2 = db_app.create_page(self.page, user)
+        result, msgs = page2.Move([self.page.id], 0, user)
+        self.assertFalse(result)
+        self.assertEqual(self.page.meta.pool_unitref, 0)
+
 
 
 class tViewCutCopy(unittest.TestCase):
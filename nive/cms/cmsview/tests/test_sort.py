@@ -84,6 +84,19 @@ class tdbSort(unittest.TestCase):
         root.MoveStart(self.text1.id, user, selection="elements")
         root.MoveEnd(self.text1.id, user, selection="elements")
 
+    def test_updatesort(self):
+        root = self.app.root("editor")
+        user = User(u"test")
+        ok, msg = root.UpdateSort([self.text2.id, self.text1, self.page.id, self.text2.id], user)
+        self.assert_(ok)
+        self.assertEqual(self.text1.meta.pool_sort, 20)
+        sort = dict(root.Select(parameter={u"id": [self.page.id, self.text1.id, self.text2.id]}, 
+                                operators={u"id": u"IN"}, fields=[u"id", u"pool_sort"]))
+        self.assertEqual(sort[self.text2.id], 10)
+        self.assertEqual(sort[self.text1.id], 20)
+        self.assertEqual(sort[self.page.id], 30)
+        self.assertEqual(root.GetObj(self.text1.id).meta.pool_changedby, u"test")
+
 
 
 class tViewSort(unittest.TestCase):
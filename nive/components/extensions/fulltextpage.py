@@ -160,10 +160,11 @@ class RewriteFulltext(Tool):
         conn.commit()
         self.stream.write(localizer.translate(_(u"Deleted previous fulltext index.<br/>")))
         
-        pages = root.Select(parameter={"pool_stag":10,"pool_state":1})
-        cnt = len(pages)
+        pages = root.SelectIter(parameter={"pool_stag":10,"pool_state":1})
+        cnt = 0
         err = 0
         for page in pages:
+            cnt += 1
             page = page[0]
             obj = root.LookupObj(page)
             if not obj:
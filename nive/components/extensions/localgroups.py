@@ -45,6 +45,14 @@ class LocalGroups(object):
         """
         if self.id <= 0:
             return self._LocalGroups(username)
+        # lookup all parents in a single query if the tree index is used
+        groups = self.db.GetInheritedGroups(self.id, userid=username)
+        if groups is not None:
+            g = [r[1] for r in groups]
+            root = self.root()
+            if root.id <= 0:
+                g += root._LocalGroups(username)
+            return g
         g = []
         o = self
         while o:
@@ -0,0 +1,63 @@
+#----------------------------------------------------------------------
+# Copyright 2012, 2013 Arndt Droullier, Nive GmbH. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#----------------------------------------------------------------------
+
+__doc__ = ""
+
+from nive.tools import Tool
+from nive.definitions import ToolConf, FieldConf, IApplication
+from nive.i18n import _
+
+configuration = ToolConf(
+    id = "dbFileLayout",
+    context = "nive.components.tools.dbFileLayout.dbFileLayout",
+    name = _(u"Relocate files"),
+    description = _(u"Moves stored files to the directory layout configured by DatabaseConf.directoryDepth and directoryWidth."),
+    apply = (IApplication,),
+    data = [
+        FieldConf(id="batchSize", datatype="number", default=100, name=_(u"Batch size"), description=_(u"Number of files moved and committed at once."))
+    ],
+    mimetype = "text/html"
+)
+
+
+class dbFileLayout(Tool):
+    """
+    Relocates existing files after changing the directory layout of the file storage. 
+    Files are moved in batches and each batch is committed separately, so the application
+    can be used while the tool is running. The tool can be run again if interrupted.
+    """
+
+    def _Run(self, **values):
+        datapool = self.app.db
+        if not datapool:
+            self.stream.write(_(u"Database connection error"))
+            return 0
+        batchSize = int(values.get("batchSize") or 100)
+        files = moved = errors = 0
+        last = 0
+        while True:
+            result = datapool.RelocateFiles(start=last, batchSize=batchSize)
+            files += result["files"]
+            moved += result["moved"]
+            errors += result["errors"]
+            last = result["last"]
+            if not last:
+                break
+        self.stream.write(_(u"Files relocated: ${moved} of ${files}. Errors: ${errors}", 
+                            mapping={u"moved": moved, u"files": files, u"errors": errors}))
+        return 1
+
@@ -0,0 +1,282 @@
+#----------------------------------------------------------------------
+# Copyright 2012, 2013 Arndt Droullier, Nive GmbH. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#----------------------------------------------------------------------
+
+__doc__ = """
+Index advisor
+-------------
+Runs EXPLAIN for the select statements used by the application and reports full table
+scans, temporary tables and extra sort steps together with suggested indexes.
+
+Statements are taken from
+
+- the query collector history (enable `DatabaseConf.queryCollector`)
+- the statement cache of generated search statements
+- statements passed as `statements` parameter (separated by ;)
+
+Suggested indexes can be added as `FieldConf.index` or `ObjectConf.indexes` settings.
+Run the database structure updater afterwards to create the indexes.
+"""
+
+import re
+from cgi import escape
+
+from pyramid.i18n import get_localizer
+from pyramid.threadlocal import get_current_request
+
+from nive.tools import Tool
+from nive.helper import FakeLocalizer
+from nive.definitions import ToolConf, FieldConf, IApplication
+from nive.i18n import _
+from nive.utils.dataPool2.connection import IsReadStatement
+from nive.utils.dataPool2.collector import SqlShape
+
+
+configuration = ToolConf()
+configuration.id = "dbIndexAdvisor"
+configuration.context = "nive.components.tools.dbIndexAdvisor.dbIndexAdvisor"
+configuration.name = _(u"Index advisor")
+configuration.description = _(u"Explains the database statements used by the application and suggests indexes.")
+configuration.apply = (IApplication,)
+configuration.data = [
+    FieldConf(id="recorded",   datatype="bool", default=1,   name=_(u"Recorded statements"), description=_(u"Statements recorded by the query collector.")),
+    FieldConf(id="cached",     datatype="bool", default=1,   name=_(u"Search statements"),   description=_(u"Statements in the search statement cache.")),
+    FieldConf(id="statements", datatype="text", default=u"", name=_(u"Statements"),          description=_(u"Additional select statements separated by ;"))
+]
+configuration.mimetype = "text/html"
+
+
+_tables = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+_conditions = re.compile(r"(?:(\w+)\.)?(\w+)\s*(=|<=|>=|<|>|\bIN\b|\bBETWEEN\b)", re.I)
+_columns = re.compile(r"(?:(\w+)\.)?(\w+)(?:\s+(?:ASC|DESC))?\s*(?:,|$)", re.I)
+_keywords = (u"ON", u"WHERE", u"INNER", u"LEFT", u"RIGHT", u"OUTER", u"JOIN", u"GROUP", u"ORDER", u"LIMIT", u"AND", u"OR")
+
+
+class dbIndexAdvisor(Tool):
+    """
+    """
+
+    def _Run(self, **values):
+
+        try:
+            localizer = get_localizer(get_current_request())
+        except:
+            localizer = FakeLocalizer()
+
+        app = self.app
+        connection = app.NewConnection()
+        if not connection:
+            self.stream.write(localizer.translate(_(u"""<div class="alert alert-error">No database connection configured</div>""")))
+            return 0
+        db = connection.GetDBManager()
+        if not db:
+            self.stream.write(localizer.translate(_(u"<div class='alert alert-error'>Database connection error (${name})</div>", mapping={"name": app.dbConfiguration.context})))
+            return 0
+
+        statements = self.Statements(values.get("recorded"), values.get("cached"), values.get("statements"))
+        self.results = []
+        try:
+            for sql, count in statements:
+                self.results.append(self.Analyse(db, sql, count))
+        finally:
+            connection.close()
+
+        self.stream.write(localizer.translate(_(u"<h4>Statements: ${count}</h4>", mapping={"count": len(self.results)})))
+        self.stream.write(u"""<table class="table"><tbody>
+<tr><th>%s</th><th>%s</th><th>%s</th><th>%s</th></tr>""" % (localizer.translate(_(u"Statement")),
+                                                              localizer.translate(_(u"Executed")),
+                                                              localizer.translate(_(u"Query plan")),
+                                                              localizer.translate(_(u"Suggested indexes"))))
+        row = u"""
+<tr><td><code>%s</code></td><td>%s</td><td>%s</td><td>%s</td></tr>"""
+        for r in self.results:
+            if r["error"]:
+                plan = u"<span class='text-error'>%s</span>" % escape(r["error"])
+            else:
+                plan = u"<br/>".join([self._FmtStep(step) for step in r["plan"]])
+            indexes = u"<br/>".join([u"%s: (%s)" % (i["table"], u", ".join([u'"%s"'%f for f in i["fields"]])) for i in r["indexes"]])
+            self.stream.write(row % (escape(r["sql"]), r["count"] or u"", plan, indexes))
+        self.stream.write(u"""
+</tbody></table>""")
+        return 1
+
+
+    def Statements(self, recorded=True, cached=True, statements=u""):
+        """
+        Collects the select statements to be explained. Returns a list of (sql, count) tuples.
+        Count is the number of executions recorded by the query collector.
+        """
+        result = []
+        shapes = set()
+        def add(sql, count):
+            sql = sql.strip()
+            if not sql or not IsReadStatement(sql):
+                return
+            shape = SqlShape(sql)
+            if shape in shapes:
+                return
+            shapes.add(shape)
+            result.append((sql, count))
+
+        datapool = self.app.db
+        if recorded:
+            collector = datapool.usedconnection.collector
+            if collector:
+                for h in collector.History():
+                    add(h["shape"], h["count"])
+        if cached:
+            for sql in datapool.GetCachedStatements():
+                add(sql, 0)
+        if statements:
+            for sql in statements.split(u";"):
+                add(sql, 0)
+        return result
+
+
+    def Analyse(self, db, sql, count=0):
+        """
+        Explains the statement and suggests indexes for full table scans and sort steps. ::
+
+            sql     = statement
+            count   = number of executions
+            plan    = query plan steps. see dbManager.Explain()
+            indexes = list of suggested indexes {table, fields}
+            error   = database error if the statement could not be explained
+        """
+        result = {"sql": sql, "count": count, "plan": [], "indexes": [], "error": None}
+        try:
+            result["plan"] = db.Explain(sql)
+        except Exception, e:
+            result["error"] = unicode(e)
+            return result
+        result["indexes"] = self.SuggestIndexes(db, sql, result["plan"])
+        return result
+
+
+    def SuggestIndexes(self, db, sql, plan):
+        """
+        Suggests one index for each table read by a full table scan or sorted in an extra
+        step. The index fields are the columns compared by equality followed by either the
+        sort columns or the first range condition. Indexes already existing are skipped.
+        """
+        aliases = self._Tables(sql)
+        tables = []
+        for step in plan:
+            if step["scan"] or step["temp"]:
+                table = aliases.get(step["table"])
+                if table and not table in tables:
+                    tables.append(table)
+        sort = [c for c in self._Sort(sql, aliases, db) if c[0]]
+        if [s for s in plan if s["filesort"]]:
+            for table, column in sort:
+                if not table in tables:
+                    tables.append(table)
+
+        equal, ranges = self._Conditions(sql, aliases, db)
+        suggestions = []
+        for table in tables:
+            fields = [c[1] for c in equal if c[0]==table]
+            order = [c[1] for c in sort if c[0]==table]
+            if order and len(order)==len(sort):
+                fields += order
+            else:
+                fields += [c[1] for c in ranges if c[0]==table][:1]
+            fields = self._Unique(fields)
+            if not fields:
+                continue
+            exists = False
+            for index in db.GetIndexes(table).values():
+                if tuple(index["fields"][:len(fields)]) == tuple(fields):
+                    exists = True
+                    break
+            if not exists:
+                suggestions.append({"table": table, "fields": tuple(fields)})
+        return suggestions
+
+
+    def _Tables(self, sql):
+        # maps table names and aliases to table names
+        aliases = {}
+        for table, alias in _tables.findall(sql):
+            aliases[table] = table
+            if alias and not alias.upper() in _keywords:
+                aliases[alias] = table
+        return aliases
+
+
+    def _Column(self, alias, column, aliases, db):
+        # returns (table, column) or (None, column) if the table cannot be resolved
+        if alias:
+            return aliases.get(alias), column
+        for table in set(aliases.values()):
+            if db.IsColumn(table, column):
+                return table, column
+        return None, column
+
+
+    def _Conditions(self, sql, aliases, db):
+        where = self._Clause(sql, u"WHERE", (u"GROUP BY", u"ORDER BY", u"LIMIT"))
+        equal = []
+        ranges = []
+        for alias, column, operator in _conditions.findall(where):
+            if column.upper() in _keywords:
+                continue
+            c = self._Column(alias, column, aliases, db)
+            if operator == u"=" or operator.upper() == u"IN":
+                equal.append(c)
+            else:
+                ranges.append(c)
+        return equal, ranges
+
+
+    def _Sort(self, sql, aliases, db):
+        order = self._Clause(sql, u"ORDER BY", (u"LIMIT",))
+        return [self._Column(alias, column, aliases, db) for alias, column in _columns.findall(order.strip())]
+
+
+    def _Clause(self, sql, start, end):
+        upper = sql.upper()
+        pos = upper.find(start)
+        if pos == -1:
+            return u""
+        pos += len(start)
+        stop = len(sql)
+        for e in end:
+            p = upper.find(e, pos)
+            if p != -1 and p < stop:
+                stop = p
+        return sql[pos:stop]
+
+
+    def _Unique(self, fields):
+        result = []
+        for f in fields:
+            if not f in result:
+                result.append(f)
+        return result
+
+
+    def _FmtStep(self, step):
+        flags = []
+        if step["scan"]:
+            flags.append(u"scan")
+        if step["temp"]:
+            flags.append(u"temporary")
+        if step["filesort"]:
+            flags.append(u"filesort")
+        if not flags:
+            return escape(step["detail"])
+        return u"<strong>%s</strong> (%s)" % (escape(step["detail"]), u", ".join(flags))
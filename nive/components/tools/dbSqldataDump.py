@@ -83,9 +83,7 @@ class dbSqldataDump(Tool):
             fields=table[1]
             columns = (",").join(fields)
             sql="select %s from %s" % (columns, tablename)
-            c = conn.cursor()
-            c.execute(sql)
-            for rec in c.fetchall():
+            for rec in datapool.Iterate(sql):
                 data = []
                 for col in rec:
                     data.append(conn.FmtParam(col))
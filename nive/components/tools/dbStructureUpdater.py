@@ -21,7 +21,7 @@ import types
 
 
 from nive.tools import Tool, ToolView
-from nive.definitions import ToolConf, ViewConf, FieldConf, IApplication, Structure, MetaTbl
+from nive.definitions import ToolConf, ViewConf, FieldConf, IApplication, Structure, MetaTbl, MetaIndexes
 from nive.i18n import _
 from nive.views import BaseView
 from nive.helper import FakeLocalizer
@@ -93,7 +93,7 @@ This tool compares the physically existing database structure (tables, columns)
 The database structure is shown on the left, configuration settings on the right. <br/><br/>
 Existing database columns will only be altered if manually selected in the 'Modify' column. Modifying a table may destroy the data
 stored (e.g if converted from string to integer), so don't forget to create backups of the database before modifying anything.<br/>
-By default this tool will only create new tables and columns and never delete any column.
+By default this tool will only create new tables, columns and indexes and never delete any column or index.
  </div>       """)
         self.stream.write(localizer.translate(_(text)))
 
@@ -147,8 +147,13 @@ By default this tool will only create new tables and columns and never delete an
                 result = 0
                 continue
             db.dbConn.commit()
+            
+            indexes = db.ConvertConfToIndexes(aT["dbparam"], fmt, aT.get("indexes"))
+            if not self.updateIndexes(db, aT["dbparam"], indexes, modify, localizer):
+                result = 0
                 
             self.printStructure(db.GetColumns(aT["dbparam"], fmt), aT["dbparam"], fmt, db, localizer)
+            self.printIndexes(db.GetIndexes(aT["dbparam"]), indexes, localizer)
 
         # check meta table exists and update ---------------------------------------------------------------
         meta = app.GetAllMetaFlds(ignoreSystem=False)
@@ -171,7 +176,12 @@ By default this tool will only create new tables and columns and never delete an
             result = 0
         db.dbConn.commit()
         
+        indexes = db.ConvertConfToIndexes(tableName, meta, MetaIndexes)
+        if not self.updateIndexes(db, tableName, indexes, modify, localizer):
+            result = 0
+        
         self.printStructure(db.GetColumns(tableName, meta), tableName, meta, db, localizer)
+        self.printIndexes(db.GetIndexes(tableName), indexes, localizer)
 
 
         # check structure tables exist and update ------------------------------------------------------------
@@ -196,10 +206,19 @@ By default this tool will only create new tables and columns and never delete an
                 result = 0
             db.dbConn.commit()
 
+            indexes = db.ConvertConfToIndexes(tableName, fields, table[1].get("indexes"))
+            if not self.updateIndexes(db, tableName, indexes, modify, localizer):
+                result = 0
+
             if showSystem:
                 self.printStructure(db.GetColumns(tableName, fields), tableName, fields, db, localizer)
+                self.printIndexes(db.GetIndexes(tableName), indexes, localizer)
+
 
 
+        # optional columns (e.g. pool_files.digest) are checked again by the pool
+        if getattr(app.db, "_fileDigests", None) is False:
+            app.db._fileDigests = None
 
         if db.modifyColumns:
             self.stream.write(u"""<div class="alert alert-error"><input class="btn" type="submit" name="submit" value=" %s "/><br/>%s</div>""" % (
@@ -256,5 +275,47 @@ By default this tool will only create new tables and columns and never delete an
         self.stream.write(footer)
 
         return 
+
+
+    def updateIndexes(self, db, tableName, indexes, modify, localizer):
+        # creates missing indexes. changed indexes are only recreated if modify is set.
+        # database errors (e.g. key too long) are reported but do not stop the update.
+        try:
+            db.UpdateIndexes(tableName, indexes, modify=bool(modify))
+        except Exception, e:
+            db.dbConn.rollback()
+            self.stream.write(localizer.translate(_(u"<div class='alert alert-error'>Index update failed (${name}): ${error}</div>", mapping={"name":tableName, "error":unicode(e)})))
+            return False
+        db.dbConn.commit()
+        return True
+
+
+    def printIndexes(self, existing, indexes, localizer):
+        header = u"""
+<table class="table"><tbody>
+<tr><td>%(Index)s</td><td>%(Db Columns)s</td><td>%(Configuration settings)s</td></tr>
+"""  % {"Index": localizer.translate(_(u"Index")), 
+        "Db Columns": localizer.translate(_(u"Database settings")), 
+        "Configuration settings": localizer.translate(_(u"Configuration settings"))
+       }
+
+        row = u"""
+<tr><td>%s</td><td>%s</td><td>%s</td></tr>
+"""
+        
+        def fmt(index):
+            if not index:
+                return u""
+            return u"%s%s" % (u", ".join(index["fields"]), index["unique"] and u" (unique)" or u"")
+
+        footer = u"""
+</tbody></table> <br/>"""
+
+        conf = dict([(i["id"], i) for i in indexes])
+        self.stream.write(header)
+        for id in sorted(set(existing.keys() + conf.keys())):
+            self.stream.write(row % (id, fmt(existing.get(id)), fmt(conf.get(id))))
+        self.stream.write(footer)
+        return
     
     
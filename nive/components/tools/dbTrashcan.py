@@ -0,0 +1,55 @@
+#----------------------------------------------------------------------
+# Copyright 2012, 2013 Arndt Droullier, Nive GmbH. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#----------------------------------------------------------------------
+
+__doc__ = ""
+
+from nive.tools import Tool
+from nive.definitions import ToolConf, FieldConf, IApplication
+from nive.utils.utils import FormatBytesForDisplay
+from nive.i18n import _
+
+configuration = ToolConf(
+    id = "dbTrashcan",
+    context = "nive.components.tools.dbTrashcan.dbTrashcan",
+    name = _(u"Empty trashcan"),
+    description = _(u"Deletes files moved to the trashcan of the file storage and reports the freed space."),
+    apply = (IApplication,),
+    data = [
+        FieldConf(id="days", datatype="number", default=0, name=_(u"Keep files (days)"), description=_(u"Files deleted less than the number of days ago are kept. 0 deletes all files."))
+    ],
+    mimetype = "text/html"
+)
+
+
+class dbTrashcan(Tool):
+    """
+    Purges the trashcan directory. Files are also removed automatically if 
+    `DatabaseConf.trashcanRetention` is set.
+    """
+
+    def _Run(self, **values):
+        datapool = self.app.db
+        if not datapool:
+            self.stream.write(_(u"Database connection error"))
+            return 0
+        purger = datapool.GetTrashcanPurger()
+        purger.Flush()
+        result = purger.Purge(int(values.get("days") or 0)*24*3600)
+        self.stream.write(_(u"Trashcan emptied: ${files} files deleted, ${size} freed", 
+                            mapping={u"files": result["files"], u"size": FormatBytesForDisplay(result["bytes"]) or u"0 bytes"}))
+        return 1
+
@@ -0,0 +1,49 @@
+#----------------------------------------------------------------------
+# Copyright 2012, 2013 Arndt Droullier, Nive GmbH. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#----------------------------------------------------------------------
+
+__doc__ = ""
+
+from nive.tools import Tool
+from nive.definitions import ToolConf, IApplication
+from nive.i18n import _
+
+configuration = ToolConf(
+    id = "dbTreeIndex",
+    context = "nive.components.tools.dbTreeIndex.dbTreeIndex",
+    name = _(u"Rebuild tree index"),
+    description = _(u"Regenerates the tree index table (pool_tree) based on the parent references stored in pool_meta."),
+    apply = (IApplication,),
+    data = [],
+    mimetype = "text/html"
+)
+
+
+class dbTreeIndex(Tool):
+    """
+    Rebuilds the closure table used as tree index. Run the tool once after enabling
+    `DatabaseConf.treeIndex` for an existing database.
+    """
+
+    def _Run(self, **values):
+        datapool = self.app.db
+        if not datapool:
+            self.stream.write(_(u"Database connection error"))
+            return 0
+        cnt = datapool.RebuildTreeIndex()
+        self.stream.write(_(u"Tree index rebuilt: ${cnt} records", mapping={u"cnt": cnt}))
+        return 1
+
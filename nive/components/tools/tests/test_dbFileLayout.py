@@ -0,0 +1,43 @@
+
+import unittest
+
+from nive.definitions import *
+from nive.components.tools.dbFileLayout import *
+
+from nive.tests import db_app
+
+from nive.helper import FormatConfTestFailure
+
+# -----------------------------------------------------------------
+
+class DBFileLayoutTest1(unittest.TestCase):
+
+    def test_conf1(self):
+        r=configuration.test()
+        if not r:
+            return
+        print FormatConfTestFailure(r)
+        self.assert_(False, "Configuration Error")
+
+    def test_tool(self):
+        dbFileLayout(configuration,None)
+        
+    
+class DBFileLayoutTest1_db(unittest.TestCase):
+
+    def setUp(self):
+        self.app = db_app.app_db()
+        self.app.Register(configuration)
+
+    def tearDown(self):
+        self.app.Close()
+    
+    def test_toolrun1(self):
+        t = self.app.GetTool("dbFileLayout", self.app)
+        self.assert_(t)
+        r,v = t(batchSize=10)
+        self.assert_(r)
+
+
+if __name__ == '__main__':
+    unittest.main()
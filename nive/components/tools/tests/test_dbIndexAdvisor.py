@@ -0,0 +1,74 @@
+
+import time
+import unittest
+
+from nive.definitions import *
+from nive.components.tools.dbIndexAdvisor import *
+
+from nive.tests import db_app
+
+from nive.helper import FormatConfTestFailure
+
+# -----------------------------------------------------------------
+
+class DBIndexAdvisorTest1(unittest.TestCase):
+
+    def test_conf1(self):
+        r=configuration.test()
+        if not r:
+            return
+        print FormatConfTestFailure(r)
+        self.assert_(False, "Configuration Error")
+
+    def test_tool(self):
+        dbIndexAdvisor(configuration,None)
+        
+    
+class DBIndexAdvisorTest1_db(unittest.TestCase):
+
+    def setUp(self):
+        self.app = db_app.app_db()
+        self.app.Register(configuration)
+
+    def tearDown(self):
+        self.app.Close()
+    
+    def test_toolrun1(self):
+        t = self.app.GetTool("dbIndexAdvisor", self.app)
+        self.assert_(t)
+        r,v = t(statements=u"select id from data1 where fnumber = 1 order by ftext; delete from data1")
+        self.assert_(r)
+        self.assert_(v.getvalue().find(u"data1: (\"fnumber\", \"ftext\")")!=-1)
+        self.assertEqual([s["sql"] for s in t.results if s["sql"].startswith(u"delete")], [])
+
+    def test_suggest(self):
+        t = self.app.GetTool("dbIndexAdvisor", self.app)
+        conn = self.app.NewConnection()
+        db = conn.GetDBManager()
+        try:
+            r = t.Analyse(db, u"SELECT meta__.id FROM pool_meta AS meta__ INNER JOIN data1 AS data__ ON (meta__.pool_dataref = data__.id) WHERE data__.ftext = ? AND meta__.pool_type = ? ORDER BY meta__.pool_sort")
+            self.assertFalse(r["error"])
+            self.assert_([s for s in r["plan"] if s["filesort"]])
+            self.assertEqual(r["indexes"], [{"table": u"pool_meta", "fields": (u"pool_type", u"pool_sort")}])
+            # existing index: pool_meta_pool_unitref_pool_sort
+            r = t.Analyse(db, u"select id from pool_meta where pool_unitref = ? order by pool_sort limit ?, ?")
+            self.assertFalse(r["error"])
+            self.assertEqual(r["indexes"], [])
+            self.assertFalse([s for s in r["plan"] if s["scan"] or s["filesort"]])
+            r = t.Analyse(db, u"select id from pool_meta where pool_state > 0 and pool_stag = 1")
+            self.assertEqual(r["indexes"], [{"table": u"pool_meta", "fields": (u"pool_stag", u"pool_state")}])
+            r = t.Analyse(db, u"select nothing from notable")
+            self.assert_(r["error"])
+        finally:
+            conn.close()
+
+    def test_statements(self):
+        t = self.app.GetTool("dbIndexAdvisor", self.app)
+        self.app.db.FmtSQLSelect([u"id", u"title"], {u"pool_type": u"type1"}, sort=u"title", max=10)
+        statements = t.Statements(recorded=False, cached=True)
+        self.assert_(statements)
+        self.assertEqual(t.Statements(recorded=False, cached=False, statements=u"select 1; select 1;update x set y=1"), [(u"select 1", 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+
+import unittest
+
+from nive.definitions import *
+from nive.components.tools.dbTrashcan import *
+
+from nive.tests import db_app
+
+from nive.helper import FormatConfTestFailure
+
+# -----------------------------------------------------------------
+
+class DBTrashcanTest1(unittest.TestCase):
+
+    def test_conf1(self):
+        r=configuration.test()
+        if not r:
+            return
+        print FormatConfTestFailure(r)
+        self.assert_(False, "Configuration Error")
+
+    def test_tool(self):
+        dbTrashcan(configuration,None)
+        
+    
+class DBTrashcanTest1_db(unittest.TestCase):
+
+    def setUp(self):
+        self.app = db_app.app_db()
+        self.app.Register(configuration)
+
+    def tearDown(self):
+        self.app.Close()
+    
+    def test_toolrun1(self):
+        t = self.app.GetTool("dbTrashcan", self.app)
+        self.assert_(t)
+        r,v = t(days=30)
+        self.assert_(r)
+
+
+if __name__ == '__main__':
+    unittest.main()
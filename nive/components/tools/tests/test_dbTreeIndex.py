@@ -0,0 +1,47 @@
+
+import time
+import unittest
+
+from nive.definitions import *
+from nive.components.tools.dbTreeIndex import *
+
+from nive.tests import db_app
+
+from nive.helper import FormatConfTestFailure
+
+# -----------------------------------------------------------------
+
+class DBTreeIndexTest1(unittest.TestCase):
+
+    def test_conf1(self):
+        r=configuration.test()
+        if not r:
+            return
+        print FormatConfTestFailure(r)
+        self.assert_(False, "Configuration Error")
+
+    def test_tool(self):
+        dbTreeIndex(configuration,None)
+        
+    
+class DBTreeIndexTest1_db(unittest.TestCase):
+
+    def setUp(self):
+        self.app = db_app.app_db()
+        self.app.Register(configuration)
+
+    def tearDown(self):
+        self.app.Close()
+    
+    def test_toolrun1(self):
+        t = self.app.GetTool("dbTreeIndex", self.app)
+        self.assert_(t)
+        r,v = t()
+        self.assert_(r)
+        db = self.app.db
+        cnt = db.GetCountEntries()
+        self.assert_(db.GetCountEntries(db.TreeTable) >= cnt)
+
+
+if __name__ == '__main__':
+    unittest.main()
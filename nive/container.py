@@ -26,7 +26,7 @@ from time import time
 from datetime import datetime
 
 from nive.definitions import Conf
-from nive.definitions import StagContainer, StagPageElement, MetaTbl
+from nive.definitions import StagContainer, StagPageElement, MetaTbl, ReadonlySystemFlds
 from nive.definitions import IContainer, ICache, IObject, IConf 
 from nive.definitions import ContainmentError, ConfigurationError
 from nive.workflow import WorkflowNotAllowed
@@ -84,11 +84,18 @@ class Container(object):
             operators = dict. see nive.Search
             kw.sort = sort objects. if None container default sort is used
             kw.batch = load subobjects as batch
+            kw.readonly = return read only database entries instead of objects. see below.
+            kw.files = load the files of all subobjects in one query (batch only)
             **kw = see Container.GetObj()
             returns all matching subobjects as list
     
         see :class:`nive.Search` for parameter/operators description
         
+        Read only entries (nive.utils.dataPool2.base.ReadonlyEntry) are lightweight records
+        containing meta and data values (e.g. entry.meta.title, entry.data.textblock). 
+        Use them for listings which do not need object functionality. Read only entries are 
+        not cached and no events are triggered.
+        
         Events
         - loadObj(obj)
         """
@@ -103,6 +110,9 @@ class Container(object):
         if kw.get("queryRestraints")!=False:
             parameter,operators = root.ObjQueryRestraints(self, parameter, operators)
         objects = root.SelectDict(parameter=parameter, fields=fields, operators=operators, sort = sort)
+        if kw.get("readonly"):
+            ids = [c["id"] for c in objects]
+            return self.app.db.GetBatch(ids, preload=kw.get("preload", u"all"), meta=objects, readonly=True)
         useBatch = kw.get("batch", True)
         if useBatch:
             ids = [c["id"] for c in objects]
@@ -323,6 +333,119 @@ class ContainerEdit:
         return obj
 
 
+    def CreateMany(self, type, datalist, user, **kw):
+        """
+        Creates multiple sub objects of the same type at once. Records are inserted
+        in bulk and committed in a single transaction. Objects are not loaded. ::
+
+            type = object type id as string or object configuration
+            datalist = list of dictionaries containing data for the new objects
+            user = the currently active user
+            returns the list of new object ids
+
+        Unlike `Create()` the new objects do not run workflow initialisation and
+        no per object events are triggered. File fields are ignored. Use `Create()`
+        for types with workflow or files.
+
+        Events
+
+        - beforeAddMany(datalist=datalist, type=type, user=user, kw) called for the container
+        - afterAddMany(ids=ids, type=type, user=user, kw) called for the container after the objects have been committed
+
+        Workflow actions
+
+        - add (called once in context of the container)
+        """
+        app = self.GetApp()
+        typedef = app.GetObjectConf(type)
+        if not typedef:
+            raise ConfigurationError, "Type not found (%s)" % (str(type))
+
+        # allow subobject
+        if not self.IsTypeAllowed(type, user):
+            raise ContainmentError, "Add type not allowed here (%s)" % (str(type))
+
+        if not self.WfAllow("add", user=user):
+            raise WorkflowNotAllowed, "Not allowed in current workflow state (add)"
+
+        self.Signal("beforeAddMany", datalist=datalist, type=type, user=user, **kw)
+        dataflds = [f["id"] for f in typedef["data"] if f["datatype"]!="file"]
+        metaflds = [f["id"] for f in app._meta if not f["id"] in ReadonlySystemFlds]
+        rows = []
+        for data in datalist:
+            row = {"meta": {}, "data": {}}
+            for id in dataflds:
+                if data.has_key(id):
+                    row["data"][id] = data[id]
+            for id in metaflds:
+                if data.has_key(id):
+                    row["meta"][id] = data[id]
+            row["meta"]["pool_type"] = typedef["id"]
+            row["meta"]["pool_unitref"] = self.id
+            row["meta"]["pool_stag"] = typedef.get("selectTag", StagContainer)
+            rows.append(row)
+        ids = app.db.CreateEntries(typedef["dbparam"], rows, user=user)
+        self.WfAction("add", user=user)
+        self.Signal("afterAddMany", ids=ids, type=type, user=user, **kw)
+        return ids
+
+
+    def UpdateMany(self, values, user, **kw):
+        """
+        Updates meta fields of multiple sub objects at once. Records are updated in bulk and
+        committed in a single transaction. Objects are not loaded. ::
+
+            values = list of (id, data) tuples. data contains meta fields only.
+            user = the currently active user
+            returns the list of updated object ids
+
+        Ids not contained in this container and read only system fields are ignored. No
+        per object events or workflow actions are triggered.
+
+        Events
+
+        - afterUpdateMany(ids=ids, user=user, kw) called for the container after the changes have been committed
+        """
+        if not values:
+            return []
+        app = self.GetApp()
+        db = app.db
+        # restrict to sub objects
+        ids = [int(id) for id, data in values]
+        parameter = {u"id": ids, u"pool_unitref": self.id}
+        operators = {u"id": u"IN"}
+        contained = [r[0] for r in self.root().Select(parameter=parameter, fields=[u"id"], operators=operators, sort=u"", max=len(ids))]
+
+        date = db.GetDBDate()
+        if user==None:
+            user=""
+        else:
+            user=str(user)
+        metaflds = [f["id"] for f in app._meta if not f["id"] in ReadonlySystemFlds]
+        rows = []
+        for id, data in values:
+            id = int(id)
+            if not id in contained:
+                continue
+            meta = {u"pool_change": date, u"pool_changedby": user}
+            for f in metaflds:
+                if data.has_key(f):
+                    meta[f] = data[f]
+            rows.append((id, meta))
+        try:
+            db.UpdateFieldsMany(db.MetaTable, rows)
+            db.Commit()
+        except:
+            db.Undo()
+            raise
+        ids = [r[0] for r in rows]
+        if ICache.providedBy(self):
+            for id in ids:
+                self.RemoveCache(id)
+        self.Signal("afterUpdateMany", ids=ids, user=user, **kw)
+        return ids
+
+
     def Duplicate(self, obj, user, updateValues=None, **kw):
         """
         Duplicate the object including all data and files and store as new subobject. ::
@@ -395,6 +395,10 @@ class FieldConf(baseConf):
                     callback(fieldconf, object) and return a list with id and name items.
         settings :  Extended settings for fields. Possible values depend on datatype.
         fulltext :  Use this field in fulltext index.
+        index :     Create a database index for the column. True, False or "unique". 
+                    If None ID references (datatype unit) are indexed.
+        deferred :  Data fields only. The column is not loaded with the object but on first
+                    access. Use for large values not required in listings.
         
     Extended values (optional and used as default for forms) ::
 
@@ -420,6 +424,8 @@ class FieldConf(baseConf):
         self.listItems = None
         self.settings = {}
         self.fulltext = False
+        self.index = None
+        self.deferred = False
         # used as default for forms
         self.name = u""
         self.description = u""
@@ -478,6 +484,15 @@ class AppConf(baseConf):
         useCache :         Cache database on application level.
         frontendCodepage : Default=utf-8. The codepage used to render the html frontend.
         workflowEnabled :  Enable or disable the workflow engine.
+        searchTotals :     Default strategy to calculate the total number of search results. 
+                           exact, cached, estimate or more. See nive.search. 
+        fileDelivery :     How files are sent: "wsgi" (default, uses wsgi.file_wrapper if 
+                           available), "x-sendfile", "x-accel-redirect" or a dotted python name. 
+                           See nive.views.FileDelivery.
+        fileDeliveryPath : Internal nginx location mapped to the file root. Used by 
+                           "x-accel-redirect". Default /_files/.
+        fileFingerprint :  Generate file urls including the file digest. These are sent with 
+                           far future expiry and Cache-Control immutable. See views.FileUrl().
         events  : Register for one or multiple Application events. 
                   Register each event as e.g. Conf(event="run", callback=function).
         
@@ -500,6 +515,12 @@ class AppConf(baseConf):
         self.frontendCodepage = "utf-8"
         self.fulltextIndex = False
         self.workflowEnabled = False
+        self.searchTotals = "exact"
+        
+        # file download
+        self.fileDelivery = "wsgi"
+        self.fileDeliveryPath = "/_files/"
+        self.fileFingerprint = False
         
         # security
         self.groups = []
@@ -560,8 +581,9 @@ class DatabaseConf(baseConf):
     """
     Database configuration ::
 
-        *context : Database type to be used. supports "Sqlite3" and "MySql" by default. 
-                   MySql requires python-mysqldb installed.
+        *context : Database type to be used. supports "Sqlite3", "MySql" and "Memory" by default. 
+                   MySql requires python-mysqldb installed. Memory is a sqlite database stored
+                   in memory for tests and benchmarks.
         *dbName  : sqlite3=database file path, mysql=database name 
         fileRoot : Relative or absolute root directory for files.
         host     : database server host.
@@ -569,15 +591,51 @@ class DatabaseConf(baseConf):
         user     : database server user.
         password : database server password.
         useTrashcan : Move files to fileRoot.__traschcan directory on delete.
+        trashcanRetention : Seconds deleted files are kept in the trashcan. Older files are 
+                    removed by the trashcan purger. 0 keeps files until purged manually.
+        trashcanInterval : Seconds between two trashcan purge runs. Default 3600.
+        trashcanQueue : Move deleted files to the trashcan in a background thread.
+                    See nive.utils.dataPool2.trashcan.
+        directoryDepth : Number of directory levels files are stored in. Each level is named by
+                    `directoryWidth` digits of the object id, starting with the last digits. 
+                    0 uses the default layout (two levels, 100 directories each). Run the file
+                    layout tool to move existing files.
+        directoryWidth : Number of id digits per directory level. Default 2.
+        treeIndex : Maintain the pool_tree closure table and use it for tree lookups. Run the 
+                    tree index tool once after enabling the index for existing databases.
+        contentStore : Store files once by SHA-256 digest. Identical files and duplicated objects
+                    reference the same file. Files are removed with the last reference.
         unicode  : Database is using unicode mode.
         dbCodePage : If not in unicode mode, the database codepage used (default "utf-8").
         connection : Specifies the database connection management class. Default None.
+                     e.g. "nive.utils.dataPool2.mySqlPool.MySqlConnPool" for a connection pool.
+        poolSize : Maximum number of connections if a connection pool is used.
+        poolMinSize : Number of connections kept open by the connection pool.
+        poolTimeout : Seconds to wait for a free connection if the connection pool is exhausted.
+        poolIdle : Idle connections are closed after `poolIdle` seconds.
+        poolValidate : Interval in seconds to validate idle pool connections in the background.
+                       0 validates connections on checkout if verifyConnection is set.
+        replicas : List of connection values for read replicas e.g. [{"host": "replica1"}]. Used by
+                   "nive.utils.dataPool2.mySqlPool.MySqlConnReplicated". 
         verifyConnection : Verify connection is still alive each time a connection is requested.
                            Automatically reconnects if the connection is closed.
         timeout  : Timeout in seconds for database requests, if supported.
+        journalMode : Sqlite journal mode. Default TRUNCATE. Use the connection 
+                      "nive.utils.dataPool2.sqlite3Pool.Sqlite3ConnWAL" for WAL mode. 
+        synchronous : Sqlite synchronous level. Default OFF.
+        cacheSize : Sqlite page cache size. Positive values in pages, negative values in KiB.
+        mmapSize : Sqlite memory mapped i/o size in bytes. Default 0 (disabled).
+        busyTimeout : Sqlite seconds to wait if the database is locked. Default 5.
         querylog : Enable database query log. "querylog" is used as filename the application 
                    will use for the query log and the number of traceback lines. 
                    use e.g. (10,'sql.log')
+        queryCollector : Collect all statements of a request (debug mode). A summary is logged 
+                   as "nive.queries" and added as X-Nive-Queries response header.
+                   See nive.utils.dataPool2.collector.
+        queryRepeat : Statements executed `queryRepeat` times or more in one request are reported
+                   as repeated (N+1 queries). Default 5.
+        queryHistory : Number of different statements the query collector keeps across requests
+                   (e.g. used by the index advisor tool). Default 500.
         events  : Register for one or multiple Application events. 
                   Register each event as e.g. Conf(event="run", callback=function).
     
@@ -596,12 +654,33 @@ class DatabaseConf(baseConf):
         self.user = ""
         self.password = ""
         self.useTrashcan = False
+        self.trashcanRetention = 0
+        self.trashcanInterval = 3600
+        self.trashcanQueue = False
+        self.directoryDepth = 0
+        self.directoryWidth = 2
+        self.treeIndex = False
+        self.contentStore = False
         self.unicode = True
         self.timeout = 3
+        self.journalMode = "TRUNCATE"
+        self.synchronous = "OFF"
+        self.cacheSize = 0
+        self.mmapSize = 0
+        self.busyTimeout = 5
         self.verifyConnection = False
         self.connection = None
+        self.poolSize = 10
+        self.poolMinSize = 0
+        self.poolTimeout = 10
+        self.poolIdle = 300
+        self.poolValidate = 60
+        self.replicas = []
         self.dbCodePage = "utf-8"
         self.querylog=(0,None)
+        self.queryCollector = False
+        self.queryRepeat = 5
+        self.queryHistory = 500
         baseConf.__init__(self, copyFrom, **values)
         
         
@@ -616,7 +695,7 @@ class DatabaseConf(baseConf):
         report = []
         # check context
         c = self.context
-        if c in ("Sqlite3", "Mysql", "MySql"):
+        if c in ("Sqlite3", "Mysql", "MySql", "Memory"):
             return report
         o = TryResolveName(c)
         if not o:
@@ -648,6 +727,9 @@ class ObjectConf(baseConf):
         views :    List of object view definitions. Either nive.definitions.ViewConf or 
                    nive.definitions.ViewModuleConf.
         forms :    Configuration of object form subsets and actions. Refer to nive.Form.
+        indexes :  Composite indexes for the data table. Either a list of field ids or 
+                   dictionaries e.g. {"fields": ("field1", "field2"), "unique": True}. 
+                   Single column indexes are defined as `FieldConf.index`.
     
         subtypes  : Define possible subtypes. None=no objects allowed, "*"=all objects allowed, 
                     [IContainer,IPageElement]=list with interfaces of allowed objects.
@@ -679,6 +761,7 @@ class ObjectConf(baseConf):
         self.template = None
         self.extensions = None
         self.data = []
+        self.indexes = []
         self.forms = {}
         self.views = []
         self.workflowEnabled = False
@@ -1408,7 +1491,7 @@ Conf(id="binary",      name=_(u"Binary"),             description=u""),   # not
 # system meta fields -----------------------------------------------------------------------
 SystemFlds = (
 FieldConf(id="id",             datatype="number",    size=8,     default=0,     required=0,   readonly=1, name=_(u"ID")),
-FieldConf(id="pool_type",      datatype="list",      size=35,    default=u"",   required=1,   readonly=1, name=_(u"Type")),
+FieldConf(id="pool_type",      datatype="list",      size=35,    default=u"",   required=1,   readonly=1, name=_(u"Type"), index=True),
 FieldConf(id="pool_unitref",   datatype="number",    size=8,     default=0,     required=0,   readonly=1, name=_(u"Container")),
 FieldConf(id="pool_state",     datatype="number",    size=4,     default=1,     required=0,   readonly=0, name=_(u"State")),
 FieldConf(id="pool_stag",      datatype="number",    size=4,     default=0,     required=0,   readonly=0, name=_(u"Select Number")),
@@ -1417,15 +1500,17 @@ FieldConf(id="pool_dataref",   datatype="number",    size=8,     default=0,
 FieldConf(id="title",          datatype="string",    size=255,   default=u"",   required=0,   readonly=0, name=_(u"Title"), fulltext=True),
 FieldConf(id="pool_sort",      datatype="number",    size=8,     default=0,     required=0,   readonly=0, name=_(u"Sort")),
 FieldConf(id="pool_wfp",       datatype="list",      size=35,    default=u"",   required=0,   readonly=0, name=_(u"Workflow Process")),
-FieldConf(id="pool_wfa",       datatype="list",      size=35,    default=u"",   required=0,   readonly=0, name=_(u"Workflow Activity")),
+FieldConf(id="pool_wfa",       datatype="list",      size=35,    default=u"",   required=0,   readonly=0, name=_(u"Workflow Activity"), index=True),
 FieldConf(id="pool_category",  datatype="list",      size=35,    default=u"",   required=0,   readonly=0, name=_(u"Category")),
-FieldConf(id="pool_filename",  datatype="string",    size=255,   default=u"",   required=0,   readonly=0, name=_(u"Filename")),
+FieldConf(id="pool_filename",  datatype="string",    size=255,   default=u"",   required=0,   readonly=0, name=_(u"Filename"), index=True),
 FieldConf(id="pool_create",    datatype="datetime",  size=100,   default=u"",   required=0,   readonly=1, name=_(u"Created")),
 FieldConf(id="pool_change",    datatype="datetime",  size=100,   default=u"",   required=0,   readonly=1, name=_(u"Changed")),
 FieldConf(id="pool_createdby", datatype="string",    size=35,    default=u"",   required=0,   readonly=1, name=_(u"Created by"), settings={u"relation":"userid"}),
 FieldConf(id="pool_changedby", datatype="string",    size=35,    default=u"",   required=0,   readonly=1, name=_(u"Changed by"), settings={u"relation":"userid"}),
 )
 ReadonlySystemFlds = ("id", "pool_type", "pool_datatbl", "pool_unitref", "pool_dataref")
+# composite indexes for the meta table. Container listings select by unitref ordered by sort.
+MetaIndexes = (("pool_unitref", "pool_sort"),)
 
 # base table structure -------------------------------------------------------------------
 
@@ -1434,8 +1519,10 @@ FileTbl = "pool_files"
 FulltextTbl = "pool_fulltext"
 SystemTbl = "pool_sys"
 LocalGroupsTbl = "pool_groups"
+TreeTbl = "pool_tree"
 """
-``Structure`` defines the additional tables with settings for identity column and table fields. 
+``Structure`` defines the additional tables with settings for identity column, table fields
+and indexes. 
 """
 Structure={
 FileTbl: {"identity": "fileid",
@@ -1448,25 +1535,37 @@ FileTbl: {"identity": "fileid",
     FieldConf(id="size",       datatype="number",    size=8,     default=0,    required=0,   readonly=0, name=_(u"File size")),
     FieldConf(id="extension",  datatype="string",    size=5,     default='',   required=0,   readonly=0, name=_(u"File extension")),
     FieldConf(id="version",    datatype="string",    size=5,     default='',   required=0,   readonly=0, name=_(u"Version")),
-)},
+    FieldConf(id="digest",     datatype="string",    size=64,    default='',   required=0,   readonly=1, name=_(u"SHA-256 digest"), index=True),
+), 
+          "indexes": (("id", "filekey"),)},
 FulltextTbl: {"identity": None,
               "fields": (
     FieldConf(id="id",     datatype="number",    size=8,     default=0,    required=1,   readonly=1, name=_(u"Object ID")),
     FieldConf(id="text",   datatype="text",      size=0,     default="",   required=0,   readonly=0, name=_(u"Text")),
     FieldConf(id="files",  datatype="text",      size=0,     default="",   required=0,   readonly=0, name=_(u"Files")),
-)},
+), 
+              "indexes": (("id",),)},
 SystemTbl: {"identity": None,
             "fields": (
     FieldConf(id="id",     datatype="string",    size=50,    default='',   required=0,   readonly=0, name=_(u"Key")),
     FieldConf(id="value",  datatype="text",      size=0,     default="",   required=0,   readonly=0, name=_(u"Value")),
     FieldConf(id="ts",     datatype="number",    size=8,     default="",   required=0,   readonly=0, name=_(u"Timestamp")),
-)},
+), 
+            "indexes": (("id",),)},
 LocalGroupsTbl: {"identity": None,
                 "fields": (
     FieldConf(id="id",     datatype="number",    size=8,     default=0,    required=1,   readonly=1, name=_(u"Object ID")),
     FieldConf(id="userid", datatype="string",    size=35,    default="",   required=1,   readonly=1, name=_(u"User name")),
     FieldConf(id="groupid",datatype="string",    size=20,    default="",   required=1,   readonly=1, name=_(u"Group assignment")),
-)}
+), 
+                "indexes": (("id", "userid"),)},
+TreeTbl: {"identity": None,
+          "fields": (
+    FieldConf(id="ancestor",   datatype="number",    size=8,     default=0,    required=1,   readonly=1, name=_(u"Ancestor ID")),
+    FieldConf(id="descendant", datatype="number",    size=8,     default=0,    required=1,   readonly=1, name=_(u"Descendant ID")),
+    FieldConf(id="depth",      datatype="number",    size=4,     default=0,    required=1,   readonly=1, name=_(u"Depth")),
+), 
+          "indexes": (("ancestor", "depth"), ("descendant",))}
 }
 
 # select tags (pool_stag) ----------------------------------------------------------------------------
@@ -57,6 +57,17 @@ skipRender        render result flds as html element.
                   default: ``pool_type, pool_wfa, pool_wfp`` 
                   to skip all: *True*, or a list of fields  ("pool_wfa","pool_type")
 skipCount         enable or disable second query to get the number of all records. 
+totals            how the total number of records is calculated if the result is larger than
+                  *max*. Default: AppConf.searchTotals. 
+                  exact: count query. cached: count query cached until the tables are changed. 
+                  estimate: estimated by the database. more: no count, fetches max+1 records 
+                  and total is set to start+max+1 if more records exist.
+keyset            use keyset pagination instead of *start*. Records are selected after the
+                  record referenced by *continuation*. Supports a single sort field. Records 
+                  are sorted by sort field and id.
+continuation      continuation token of the previous result for keyset pagination
+files             add the file records of each item as *files* dictionary {filekey: file}.
+                  Files of all items are loaded in one query. Requires id in result.
 ================  =====================================================================
 
 
@@ -76,11 +87,14 @@ nextend        end number of next record set
 prev           start number of previous record set
 prevend        end number of previous record set
 sql            the sql statement used
+continuation   keyset pagination token for the next record set or None
 =============  ========================================================================
 
 """
 
 import time
+import json
+import base64
 
 from nive.utils.utils import ConvertToNumberList
 from nive.utils.language import LanguageExtension, CountryExtension
@@ -116,6 +130,26 @@ class Search:
         
         returns records as list
         """
+        sql, values = self._SelectSQL(pool_type, parameter, fields, operators, sort, ascending, start, max, **kw)
+        recs = self.db.Query(sql, values)
+        return recs
+
+
+    def SelectIter(self, pool_type=None, parameter={}, fields=["id"], operators={}, sort=None, ascending = 1, start=0, max=0, **kw):
+        """
+        Same as `Select()` but returns a generator. Records are read from the database in batches
+        (keyword ``batchsize``) and not loaded at once. Use for large results like exports. ::
+
+            for rec in self.root().SelectIter(parameter={"pool_type": "image"}, fields=["id"]):
+                ...
+
+        returns records as generator
+        """
+        sql, values = self._SelectSQL(pool_type, parameter, fields, operators, sort, ascending, start, max, **kw)
+        return self.db.Iterate(sql, values, batchsize=kw.get("batchsize"))
+
+
+    def _SelectSQL(self, pool_type, parameter, fields, operators, sort, ascending, start, max, **kw):
         if not fields:
             raise TypeError, "No fields specified"
         db = self.db
@@ -131,8 +165,7 @@ class Search:
             if not typeInf:
                 raise ConfigurationError, pool_type + " type not found"
             sql, values = db.FmtSQLSelect(fields, parameter, dataTable=typeInf["dbparam"], operators=operators, sort=sort, ascending=ascending, start=start, max=max, groupby=kw.get("groupby"), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"))
-        recs = db.Query(sql, values)
-        return recs
+        return sql, values
 
 
     def SelectDict(self, pool_type=None, parameter={}, fields=[u"id"], operators={}, sort=None, ascending = 1, start=0, max=0, **kw):
@@ -173,6 +206,25 @@ class Search:
         return [dict(zip(fields, r)) for r in recs]
 
 
+    def SelectDictIter(self, pool_type=None, parameter={}, fields=[u"id"], operators={}, sort=None, ascending = 1, start=0, max=0, **kw):
+        """
+        Same as `SelectDict()` but returns a generator. Records are read from the database in 
+        batches (keyword ``batchsize``) and not loaded at once.
+
+        returns records as dict generator
+        """
+        recs = self.SelectIter(pool_type, parameter, fields, operators, sort, ascending, start, max, **kw)
+        names = []
+        for name in fields:
+            if name.find(u" as ")!=-1:
+                name = name.split(u" as ")[1]
+            names.append(name)
+        for r in recs:
+            if len(names) > len(r):
+                raise TypeError, "Too many fields"
+            yield dict(zip(names, r))
+
+
     # Extended search functions ----------------------------------------------------------------------------------------------
 
     def Search(self, parameter, fields = [], operators = {}, sort = u"title", ascending = 1, start = 0, max = 100, **kw):
@@ -219,17 +271,24 @@ class Search:
             fields.append(self.app.GetFld("id"))
             removeID = True
 
+        # keyset pagination
+        sortfld, sort, seek, qstart, qmax = self._KeysetParams(fldList, fields, sort, ascending, start, max, None, kw)
+        totals = self._TotalsStrategy(kw)
+        if totals == u"more" and max:
+            qmax = max+1
+
         db = self.db
         if not db:
             raise ConnectionError, "No database connection"
 
         sql, values = db.FmtSQLSelect(fldList, parameter=parameter, operators=operators, 
-                              sort=sort, ascending=ascending, start=start, max=max, 
+                              sort=sort, ascending=ascending, start=qstart, max=qmax, 
                               groupby=kw.get("groupby"), 
                               logicalOperator=kw.get("logicalOperator"), 
                               condition=kw.get("condition"), 
-                              join=kw.get("join"))
+                              join=kw.get("join"), seek=seek)
         records = db.Query(sql, values)
+        continuation = self._KeysetToken(records, max, fldList, sortfld, ascending)
 
         # prepare field renderer
         skipRender = kw.get("skipRender", False)
@@ -269,30 +328,35 @@ class Search:
         # total records
         total = len(items)
         if total == max and kw.get("skipCount") != 1:
-            if not kw.get("groupby"):
+            if totals == u"more":
+                total = start + max + (len(records) > max and 1 or 0)
+            elif not kw.get("groupby"):
                 sql2, values =db.FmtSQLSelect([u"-count(*)"], parameter=parameter, operators=operators, 
                                       sort=sort, ascending=ascending, start=None, max=None, 
                                       logicalOperator=kw.get("logicalOperator"), 
                                       condition=kw.get("condition"), 
                                       join=kw.get("join"))
-                total = db.Query(sql2, values)[0][0]
+                total = db.GetCount(sql2, values, [db.MetaTable], totals)
             else:
                 sql2, values = db.FmtSQLSelect([u"-count(DISTINCT %s)" % (kw.get("groupby"))], parameter=parameter, operators=operators, 
                                        sort=sort, ascending=ascending, start=None, max=None, 
                                        logicalOperator=kw.get("logicalOperator"), 
                                        condition=kw.get("condition"), 
                                        join=kw.get("join"))
-                total = db.Query(sql2, values)[0][0]
+                total = db.GetCount(sql2, values, [db.MetaTable], totals)
 
         # prepare result dictionary and paging information
         result = {}
         result["criteria"] = parameter
         result["count"] = cnt
         result["total"] = total
+        if kw.get("files"):
+            self._AddFiles(items)
         result["items"] = items
         result["time"] = time.time() - t
         result["start"] = start
         result["max"] = max
+        result["continuation"] = continuation
         if debug:
             result["sql"] = sql
         
@@ -366,6 +430,12 @@ class Search:
             fields.append(self.app.GetFld("id"))
             removeID = True
 
+        # keyset pagination
+        sortfld, sort, seek, qstart, qmax = self._KeysetParams(fldList, fields, sort, ascending, start, max, pool_type, kw)
+        totals = self._TotalsStrategy(kw)
+        if totals == u"more" and max:
+            qmax = max+1
+
         #operators
         operators=kw.get("operators")
         if not operators:
@@ -379,6 +449,7 @@ class Search:
         cnt = 0
         total = 0
         sql = ""
+        continuation = None
 
         typeInf = self.app.GetObjectConf(pool_type)
         if not typeInf:
@@ -389,8 +460,9 @@ class Search:
             ct = 0
         else:
 
-            sql, values = db.FmtSQLSelect(fldList, parameter=parameter, sort=sort, ascending=ascending, dataTable=typeInf["dbparam"], start=start, max=max, operators=operators, groupby=kw.get("groupby"), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"), mapJoinFld=kw.get("mapJoinFld"))
+            sql, values = db.FmtSQLSelect(fldList, parameter=parameter, sort=sort, ascending=ascending, dataTable=typeInf["dbparam"], start=qstart, max=qmax, operators=operators, groupby=kw.get("groupby"), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"), mapJoinFld=kw.get("mapJoinFld"), seek=seek)
             aL = db.Query(sql, values)
+            continuation = self._KeysetToken(aL, max, fldList, sortfld, ascending)
             
             # render
             converter = FieldRenderer(self)
@@ -422,12 +494,14 @@ class Search:
 
             # total records
             if len(items) == max and kw.get("skipCount") != 1:
-                if not kw.get("groupby"):
+                if totals == u"more":
+                    total = start + max + (len(aL) > max and 1 or 0)
+                elif not kw.get("groupby"):
                     sql2, values = db.FmtSQLSelect([u"-count(*) as cnt"], parameter=parameter, sort=u"-cnt", ascending=ascending, dataTable=typeInf["dbparam"], start=None, max=None, operators=operators, logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"))
-                    total = db.Query(sql2, values)[0][0]
+                    total = db.GetCount(sql2, values, [db.MetaTable, typeInf["dbparam"]], totals)
                 else:
                     sql2, values = db.FmtSQLSelect([u"-count(DISTINCT %s) as cnt" % (kw.get("groupby"))], parameter=parameter, sort="-cnt", ascending=ascending, dataTable=typeInf["dbparam"], start=None, max=None, operators=operators, logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"))
-                    total = db.Query(sql2, values)[0][0]
+                    total = db.GetCount(sql2, values, [db.MetaTable, typeInf["dbparam"]], totals)
             else:
                 total = len(items) + start
 
@@ -435,11 +509,14 @@ class Search:
         result["criteria"] = parameter
         result["count"] = cnt
         result["total"] = total
+        if kw.get("files"):
+            self._AddFiles(items)
         result["items"] = items
         result["time"] = time.time() - t
         result["start"] = start
         result["max"] = max
         result["sql"] = sql
+        result["continuation"] = continuation
         
         next = start + max
         if next >= total:
@@ -505,6 +582,12 @@ class Search:
             fields.append(self.app.GetFld("id", pool_type))
             removeID = True
 
+        # keyset pagination
+        sortfld, sort, seek, qstart, qmax = self._KeysetParams(fldList, fields, sort, ascending, start, max, pool_type, kw)
+        totals = self._TotalsStrategy(kw)
+        if totals == u"more" and max:
+            qmax = max+1
+
         #operators
         operators=kw.get("operators")
         if not operators:
@@ -514,6 +597,7 @@ class Search:
         cnt = 0
         total = 0
         sql = ""
+        continuation = None
 
         typeInf = self.app.GetObjectConf(pool_type)
         if not typeInf:
@@ -523,8 +607,9 @@ class Search:
         if not db:
             ct = 0
         else:
-            sql, values = db.FmtSQLSelect(fldList, parameter=parameter, dataTable=typeInf["dbparam"], sort=sort, ascending=ascending, start=start, max=max, operators=operators, groupby=kw.get("groupby"), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), singleTable=1)
+            sql, values = db.FmtSQLSelect(fldList, parameter=parameter, dataTable=typeInf["dbparam"], sort=sort, ascending=ascending, start=qstart, max=qmax, operators=operators, groupby=kw.get("groupby"), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), singleTable=1, seek=seek)
             aL = db.Query(sql, values)
+            continuation = self._KeysetToken(aL, max, fldList, sortfld, ascending)
             
             # render
             converter = FieldRenderer(self)
@@ -556,12 +641,14 @@ class Search:
 
             # total records
             if len(items) == max and kw.get("skipCount") != 1:
-                if not kw.get("groupby"):
+                if totals == u"more":
+                    total = start + max + (len(aL) > max and 1 or 0)
+                elif not kw.get("groupby"):
                     sql2, values = db.FmtSQLSelect([u"-count(*) as cnt"], parameter=parameter, dataTable=typeInf["dbparam"], sort=u"-cnt", ascending=ascending, start=None, max=None, operators=operators, logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), singleTable=1)
-                    total = db.Query(sql2, values)[0][0]
+                    total = db.GetCount(sql2, values, [typeInf["dbparam"]], totals)
                 else:
                     sql2, values = db.FmtSQLSelect([u"-count(DISTINCT %s) as cnt" % (kw.get("groupby"))], parameter=parameter, dataTable=typeInf["dbparam"], sort="-cnt", ascending=ascending, start=None, max=None, operators=operators, logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), singleTable=1)
-                    total = db.Query(sql2, values)[0][0]
+                    total = db.GetCount(sql2, values, [typeInf["dbparam"]], totals)
             else:
                 total = len(items) + start
 
@@ -569,11 +656,14 @@ class Search:
         result["criteria"] = parameter
         result["count"] = cnt
         result["total"] = total
+        if kw.get("files"):
+            self._AddFiles(items)
         result["items"] = items
         result["time"] = time.time() - t
         result["start"] = start
         result["max"] = max
         result["sql"] = sql
+        result["continuation"] = continuation
 
         next = start + max
         if next >= total:
@@ -643,6 +733,12 @@ class Search:
             fields.append(self.app.GetFld("id"))
             removeID = True
 
+        # keyset pagination
+        sortfld, sort, seek, qstart, qmax = self._KeysetParams(fldList, fields, sort, ascending, start, max, None, kw)
+        totals = self._TotalsStrategy(kw)
+        if totals == u"more" and max:
+            qmax = max+1
+
         if phrase.find(u"*") == -1:
             phrase = u"%%%s%%" % phrase
         else:
@@ -651,12 +747,15 @@ class Search:
         items = []
         cnt = 0
         total = 0
+        sql = ""
+        continuation = None
         db = self.db
         if not db:
             ct = 0
         else:
-            sql, values = db.GetFulltextSQL(phrase, fldList, parameter, sort=sort, ascending=ascending, start=start, max=max, operators=kw.get("operators",{}), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"))
+            sql, values = db.GetFulltextSQL(phrase, fldList, parameter, sort=sort, ascending=ascending, start=qstart, max=qmax, operators=kw.get("operators",{}), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"), seek=seek)
             aL = db.Query(sql, values)
+            continuation = self._KeysetToken(aL, max, fldList, sortfld, ascending)
             
             # render
             converter = FieldRenderer(self)
@@ -684,19 +783,28 @@ class Search:
                     break
 
             # total records
-            sql2, values = db.GetFulltextSQL(phrase, [u"-count(*)"], parameter, sort=sort, ascending=ascending, start=None, max=None, operators=kw.get("operators",{}), skipRang=1, logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"))
-            total = db.Query(sql2, values)[0][0]
+            if len(items) == max and kw.get("skipCount") != 1:
+                if totals == u"more":
+                    total = start + max + (len(aL) > max and 1 or 0)
+                else:
+                    sql2, values = db.GetFulltextSQL(phrase, [u"-count(*)"], parameter, sort=sort, ascending=ascending, start=None, max=None, operators=kw.get("operators",{}), skipRang=1, logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"))
+                    total = db.GetCount(sql2, values, [db.MetaTable, db.FulltextTable], totals)
+            else:
+                total = len(items) + start
             
         result = {}
         result["phrase"] = searchFor
         result["criteria"] = parameter
         result["count"] = cnt
         result["total"] = total
+        if kw.get("files"):
+            self._AddFiles(items)
         result["items"] = items
         result["time"] = time.time() - t
         result["start"] = start
         result["max"] = max
         result["sql"] = sql
+        result["continuation"] = continuation
 
         next = start + max
         if next >= total:
@@ -772,6 +880,12 @@ class Search:
             fields.append(self.app.GetFld("id", pool_type))
             removeID = True
 
+        # keyset pagination
+        sortfld, sort, seek, qstart, qmax = self._KeysetParams(fldList, fields, sort, ascending, start, max, pool_type, kw)
+        totals = self._TotalsStrategy(kw)
+        if totals == u"more" and max:
+            qmax = max+1
+
         #operators
         operators=kw.get("operators")
         if not operators:
@@ -795,13 +909,15 @@ class Search:
         cnt = 0
         total = 0
         sql = ""
+        continuation = None
 
         db = self.db
         if not db:
             ct = 0
         else:
-            sql, values = db.GetFulltextSQL(phrase, fldList, parameter, dataTable=typeInf["dbparam"], sort=sort, ascending=ascending, start=start, max=max, operators=operators, groupby=kw.get("groupby"), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"), mapJoinFld=kw.get("mapJoinFld"))
+            sql, values = db.GetFulltextSQL(phrase, fldList, parameter, dataTable=typeInf["dbparam"], sort=sort, ascending=ascending, start=qstart, max=qmax, operators=operators, groupby=kw.get("groupby"), logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"), mapJoinFld=kw.get("mapJoinFld"), seek=seek)
             aL = db.Query(sql, values)
+            continuation = self._KeysetToken(aL, max, fldList, sortfld, ascending)
             
             # render
             converter = FieldRenderer(self)
@@ -831,12 +947,14 @@ class Search:
 
             # total records
             if len(items) == max and kw.get("skipCount") != 1:
-                if not kw.get("groupby"):
+                if totals == u"more":
+                    total = start + max + (len(aL) > max and 1 or 0)
+                elif not kw.get("groupby"):
                     sql2, values = db.GetFulltextSQL(phrase, [u"-count(*) as cnt"], parameter, dataTable=typeInf["dbparam"], ascending=ascending, start=None, max=None, operators=operators, skipRang=1, logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"))
-                    total = db.Query(sql2, values)[0][0]
+                    total = db.GetCount(sql2, values, [db.MetaTable, db.FulltextTable, typeInf["dbparam"]], totals)
                 else:
                     sql2, values = db.GetFulltextSQL(phrase, [u"-count(DISTINCT %s) as cnt" % (kw.get("groupby"))], parameter, dataTable=typeInf["dbparam"], ascending=ascending, start=None, max=None, operators=operators, skipRang=1, logicalOperator=kw.get("logicalOperator"), condition=kw.get("condition"), join=kw.get("join"))
-                    total = db.Query(sql2, values)[0][0]
+                    total = db.GetCount(sql2, values, [db.MetaTable, db.FulltextTable, typeInf["dbparam"]], totals)
             else:
                 total = len(items) + start
             
@@ -845,11 +963,14 @@ class Search:
         result["criteria"] = parameter
         result["count"] = cnt
         result["total"] = total
+        if kw.get("files"):
+            self._AddFiles(items)
         result["items"] = items
         result["time"] = time.time() - t
         result["start"] = start
         result["max"] = max
         result["sql"] = sql
+        result["continuation"] = continuation
         
         next = start + max
         if next >= total:
@@ -1284,3 +1405,71 @@ class Search:
             if fl:
                 f.append(fl)
         return f
+
+
+    def _AddFiles(self, items):
+        # adds the file records of all items as dictionary {filekey: file record}
+        files = self.db.GetFilesBatch([i[u"id"] for i in items if i.get(u"id")])
+        for item in items:
+            item[u"files"] = dict([(f[u"filekey"], f) for f in files.get(item.get(u"id"), ())])
+
+
+    def _KeysetParams(self, fldList, fields, sort, ascending, start, max, pool_type, kw):
+        """
+        Prepares the query for keyset pagination if enabled by keyword *keyset*. The sort field 
+        and id are added to the selected fields. Multiple or custom sort fields are replaced
+        by id.
+        
+        returns sort field, sort, seek, start, max
+        """
+        if not kw.get("keyset") or kw.get("groupby") or not max:
+            return None, sort, None, start, max
+        sortfld = (sort or u"id").strip()
+        if sortfld.find(u",")!=-1 or sortfld.find(u" ")!=-1 or sortfld[0] in (u"-", u"+") or not self.app.GetFld(sortfld, pool_type):
+            sortfld = u"id"
+        for f in (u"id", sortfld):
+            if not f in fldList:
+                fldList.append(f)
+                fields.append(self.app.GetFld(f, pool_type))
+        seek = None
+        token = kw.get("continuation")
+        if token:
+            try:
+                s, a, value, id = json.loads(base64.urlsafe_b64decode(str(token)))
+                if s == sortfld and a == ascending:
+                    seek = (sortfld, value, id)
+            except (ValueError, TypeError):
+                pass
+        if sortfld != u"id":
+            if ascending:
+                sort = u"%s ASC, id" % (sortfld)
+            else:
+                sort = u"%s DESC, id" % (sortfld)
+        else:
+            sort = u"id"
+        # one more record to check if there is a next record set
+        return sortfld, sort, seek, 0, max+1
+    
+
+    def _KeysetToken(self, records, max, fldList, sortfld, ascending):
+        """
+        Creates the continuation token for the next record set based on the last record.
+        Tokens are opaque strings and should not be parsed by clients.
+        """
+        if not sortfld or len(records) <= max:
+            return None
+        rec = records[max-1]
+        value = rec[fldList.index(sortfld)]
+        id = rec[fldList.index(u"id")]
+        return base64.urlsafe_b64encode(json.dumps((sortfld, ascending, value, id), default=unicode))
+
+
+    def _TotalsStrategy(self, kw):
+        """
+        Returns the totals strategy for search results. Either set by keyword *totals* or
+        application configuration *searchTotals*. Default is exact.
+        """
+        totals = kw.get("totals") or self.app.configuration.get("searchTotals") or u"exact"
+        if not totals in (u"exact", u"cached", u"estimate", u"more"):
+            raise ConfigurationError, "Unknown totals strategy (%s)" % (totals)
+        return totals
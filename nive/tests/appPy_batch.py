@@ -302,6 +302,50 @@ def test5():
 
 
 
+def _entrysize(e):
+    # approximate size of entry objects without the shared values
+    from sys import getsizeof
+    if not hasattr(e, "__dict__"):
+        # read only entry
+        return getsizeof(e) + getsizeof(e.meta) + getsizeof(e.data)
+    size = getsizeof(e) + getsizeof(e.__dict__)
+    for w in (e.meta, e.data, e.files):
+        size += getsizeof(w) + getsizeof(w.__dict__) + getsizeof(w._temp_) + getsizeof(w._entry_)
+        if w._content_ is not None:
+            size += getsizeof(w._content_)
+    return size
+
+
+def test6():
+    print "6) Comparing batch entries and read only entries"
+    a=db_app.app_db()
+    r=a.root()
+    user = User(u"test")
+    o=db_app.createObj1(r)
+    for i in range(0,500):
+        db_app.createObj1(o)
+    db = a.db
+    ids = [c["id"] for c in o.GetObjsList(fields=[u"id"])]
+
+    for readonly in (False, True):
+        t2 = time.time()
+        for i in range(0,5):
+            entries = db.GetBatch(ids, readonly=readonly)
+        t2 = (time.time() - t2) / 5
+        size = sum([_entrysize(e) for e in entries])
+        print "%.4f Loading %d entries, readonly=%s, %d bytes per entry" % (t2, len(entries), str(readonly), size/len(entries))
+        t2 = time.time()
+        for i in range(0,5):
+            objs = o.GetObjs(readonly=readonly)
+        print "%.4f Container.GetObjs, readonly=%s" % ((time.time() - t2) / 5, str(readonly))
+        objs = entries = None
+
+    r.Delete(o.id, user=user)
+    a.Close()
+    print "--------------------------------------------------------"
+
+
+
 if __name__ == '__main__':
     db_app.emptypool(db_app.app_db())
     test1()
@@ -309,4 +353,5 @@ if __name__ == '__main__':
     test3()
     test4()
     test5()
+    test6()
     db_app.emptypool(db_app.app_db())
@@ -151,9 +151,10 @@ def app_db(modules=None):
         a.Query("select id from data1 where id=1")
         a.Query("select id from data2 where id=1")
         a.Query("select id from data3 where id=1")
-        a.Query("select id from pool_files where id=1")
+        a.Query("select digest from pool_files where id=1")
         a.Query("select id from pool_sys where id=1")
         a.Query("select id from pool_groups where id=1")
+        a.Query("select ancestor from pool_tree where ancestor=1")
     except:
         a.GetTool("nive.components.tools.dbStructureUpdater")()
 
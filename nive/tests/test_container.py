@@ -137,7 +137,54 @@ class containerTest_db:
         self.assertEqual(ccc+5, a.db.GetCountEntries())
         r.Delete(newO.GetID(), user=user)
         self.assertEqual(ccc, a.db.GetCountEntries())
-        
+
+
+    def test_createmany(self):
+        a=self.app
+        r=root(a)
+        user = User(u"test")
+        ccc = a.db.GetCountEntries()
+        o1 = createObj1(r)
+        self.remove.append(o1.id)
+        datalist = []
+        for i in range(5):
+            data = data2_1.copy()
+            data[u"title"] = u"bulk %d" % (i)
+            datalist.append(data)
+        ids = o1.CreateMany(u"type2", datalist, user)
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(ccc+6, a.db.GetCountEntries())
+        objs = o1.GetObjs()
+        self.assertEqual(len(objs), 5)
+        entries = o1.GetObjs(readonly=True)
+        self.assertEqual([e.id for e in entries], [o.id for o in objs])
+        self.assertEqual(entries[2].meta.title, objs[2].meta.title)
+        self.assertEqual(entries[2].data.fstr, data2_1[u"fstr"])
+        o = o1.GetObj(ids[2])
+        self.assertEqual(o.meta.title, u"bulk 2")
+        self.assertEqual(o.meta.pool_type, u"type2")
+        self.assertEqual(o.meta.pool_createdby, u"test")
+        self.assertEqual(o.data.fstr, data2_1[u"fstr"])
+        self.assertEqual(o.GetParent().id, o1.id)
+        self.assertRaises(ConfigurationError, o1.CreateMany, u"nonexisting", [data1_1], user)
+        self.assertEqual(o1.CreateMany(u"type2", [], user), [])
+
+
+    def test_objs_files(self):
+        a=self.app
+        r=root(a)
+        o1 = createObj1(r)
+        self.remove.append(o1.id)
+        f1 = createObj2file(o1)
+        o2 = createObj2(o1)
+        objs = o1.GetObjs(files=True)
+        self.assertEqual(len(objs), 2)
+        objs = dict([(o.id, o) for o in objs])
+        self.assert_(objs[f1.id].dbEntry.files._complete_)
+        self.assertEqual(objs[f1.id].files.get(u"file2").filename, u"file1.txt")
+        self.assertEqual(objs[f1.id].files.keys(), [u"file2"])
+        self.assertEqual(objs[o2.id].files.keys(), [])
+
 
     def test_lists(self):
         #print "Testing objects and subobjects"
@@ -282,6 +282,30 @@ class FormTest_db(unittest.TestCase):
         testing.tearDown()
         pass
     
+    def test_deferred(self):
+        root = self.app.GetRoot()
+        v = Viewy()
+        user = v.User()
+        obj = root.Create("type1", data1_1.copy(), user)
+        self.remove.append(obj.id)
+        id = obj.id
+        del obj
+        structure = self.app.db.structure
+        deferred = structure.deferred
+        structure.Init(structure.structure, structure.fieldtypes, structure.stdMeta, structure.codepage, 
+                       deferred={u"data1": (u"ftext",)})
+        try:
+            obj = root.LookupObj(id)
+            self.assertFalse(obj.data.IsLoaded(u"ftext"))
+            form = ObjectForm(loadFromType="type1", context=obj, view=v, request=Request(), app=self.app)
+            form.Setup()
+            data = form.LoadObjData()
+            self.assertEqual(data[u"ftext"], data1_1[u"ftext"])
+        finally:
+            structure.Init(structure.structure, structure.fieldtypes, structure.stdMeta, structure.codepage, 
+                           deferred=deferred)
+
+
     def test_obj(self, **kw):
         root = self.app.GetRoot()
         v = Viewy()
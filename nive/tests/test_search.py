@@ -49,6 +49,85 @@ class SearchTest_db(unittest.TestCase):
         self.app.Close()
 
     
+    def test_keyset(self):
+        r = self.app.root()
+        container = r.Select(parameter={u"pool_unitref": self.ids[0]}, fields=[u"id"])[0][0]
+        parameter = {u"pool_unitref": container}
+
+        def pages(search, *args, **kw):
+            ids = []
+            token = None
+            while True:
+                result = search(*args, keyset=True, continuation=token, max=3, **kw)
+                ids += [i["id"] for i in result["items"]]
+                token = result["continuation"]
+                if not token:
+                    return ids
+
+        for rec in r.Select(parameter=parameter.copy(), fields=[u"id"]):
+            r.LookupObj(rec[0]).dbEntry.WriteFulltext(u"keyset test")
+        r.db.Commit()
+
+        for ascending in (1, 0):
+            items = r.Search(parameter.copy(), fields=[u"id",u"title"], sort=u"title", ascending=ascending, max=100)["items"]
+            ids = [i["id"] for i in sorted(items, key=lambda i: (i["title"], i["id"]), reverse=not ascending)]
+            self.assertEqual(len(ids), 10)
+            self.assertEqual(pages(r.Search, parameter.copy(), fields=[u"title"], sort=u"title", ascending=ascending), ids)
+            self.assertEqual(pages(r.SearchFulltext, u"keyset", parameter.copy(), fields=[u"id"], sort=u"title", ascending=ascending), ids)
+
+        ids = [i["id"] for i in r.SearchType(u"type1", parameter.copy(), fields=[u"id"], sort=u"id", max=100)["items"]]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(pages(r.SearchType, u"type1", parameter.copy(), fields=[u"id",u"ftext"], sort=u"ftext"), ids)
+        # invalid tokens start with the first record set
+        result = r.Search(parameter.copy(), fields=[u"id"], sort=u"id", keyset=True, continuation=u"invalid", max=3)
+        self.assertEqual(result["items"][0]["id"], min(ids))
+        self.assert_(result["continuation"])
+
+
+    def test_totals(self):
+        r = self.app.root()
+        container = r.Select(parameter={u"pool_unitref": self.ids[0]}, fields=[u"id"])[0][0]
+        parameter = {u"pool_unitref": container}
+        exact = r.Search(parameter.copy(), fields=[u"id"], max=3)
+        self.assertEqual(exact["total"], 10)
+        for totals in (u"cached", u"estimate"):
+            result = r.Search(parameter.copy(), fields=[u"id"], max=3, totals=totals)
+            self.assertEqual(result["total"], 10)
+            self.assertEqual(result["next"], exact["next"])
+        # more: total is one record larger than the current page
+        result = r.Search(parameter.copy(), fields=[u"id"], max=3, start=3, totals=u"more")
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(result["total"], 7)
+        self.assert_(result["next"])
+        # last page is the same as exact
+        result = r.Search(parameter.copy(), fields=[u"id"], max=3, start=9, totals=u"more")
+        exact = r.Search(parameter.copy(), fields=[u"id"], max=3, start=9)
+        self.assertEqual(result["count"], 1)
+        self.assertEqual(result["total"], exact["total"])
+        self.assertEqual(result["next"], exact["next"])
+        result = r.SearchType(u"type1", parameter.copy(), fields=[u"id"], max=5, totals=u"more")
+        self.assertEqual(result["total"], 5)
+        result = r.SearchType(u"type1", parameter.copy(), fields=[u"id"], max=2, totals=u"cached")
+        self.assertEqual(result["total"], 5)
+        self.assertRaises(ConfigurationError, r.Search, parameter.copy(), fields=[u"id"], max=3, totals=u"unknown")
+
+
+    def test_files(self):
+        r = self.app.root()
+        c = db_app.createObj1(r)
+        try:
+            o = db_app.createObj2file(c)
+            result = r.Search({u"id": [o.id, c.id]}, fields=[u"id", u"title"], operators={u"id": u"IN"}, files=True)
+            items = dict([(i[u"id"], i) for i in result["items"]])
+            self.assertEqual(items[o.id][u"files"].keys(), [u"file2"])
+            self.assertEqual(items[o.id][u"files"][u"file2"][u"filename"], u"file1.txt")
+            self.assertEqual(items[c.id][u"files"], {})
+            result = r.Search({u"id": o.id}, fields=[u"id"])
+            self.assertFalse(u"files" in result["items"][0])
+        finally:
+            r.Delete(c.id, user=User(u"test"))
+
+
     def test_search(self):
         r = self.app.root()
         #test_tree
@@ -77,6 +156,14 @@ class SearchTest_db(unittest.TestCase):
         self.assert_(r.Select(condition="id > 23"))
         self.assert_(r.SelectDict(condition="id > 23"))
 
+        #test_selectiter
+        recs = r.Select(pool_type="type1", fields=["id","title"], sort="id")
+        self.assertEqual(list(r.SelectIter(pool_type="type1", fields=["id","title"], sort="id", batchsize=2)), list(recs))
+        dicts = list(r.SelectDictIter(pool_type="type1", fields=["id","title as t"], sort="id", batchsize=2))
+        self.assertEqual([d["id"] for d in dicts], [rec[0] for rec in recs])
+        self.assertEqual(dicts[0]["t"], recs[0][1])
+        self.assertFalse(list(r.SelectIter(parameter={"pool_type": "type"}, operators={"pool_type": "="})))
+
         #test_codelists
         pool_type="type1"
         name_field="title"
@@ -1,5 +1,6 @@
 
 import time
+import hashlib
 import unittest
 from types import DictType
 
@@ -18,6 +19,16 @@ def getRequest():
     r.context = None
     return r
 
+class FileWrapper(object):
+    # wsgi.file_wrapper
+    def __init__(self, file, size):
+        self.file = file
+        self.size = size
+    def __iter__(self):
+        return iter(lambda: self.file.read(self.size), "")
+    def close(self):
+        self.file.close()
+
 class viewModule(object):
     mainTemplate = "nive.cms.design:templates/index.pt"
     templates = u"nive.cms.design:templates/"
@@ -112,6 +123,61 @@ class viewTest(unittest.TestCase):
         file = self.context2.GetFile("file1")
         view.SendFile(file)
 
+
+    def test_file_delivery(self):
+        view = BaseView(self.context2, self.request)
+        file = self.context2.GetFile("file1")
+        self.assert_(isinstance(view.GetFileDelivery(), FileDelivery))
+        # server file wrapper
+        self.request.environ["wsgi.file_wrapper"] = FileWrapper
+        r = view.SendFile(file)
+        self.assert_(isinstance(r.app_iter, FileWrapper))
+        self.assertEqual("".join(r.app_iter), db_app.file2_1_data)
+        self.assertEqual(r.content_length, len(db_app.file2_1_data))
+        r.app_iter.close()
+        # range requests
+        request = Request.blank("/", headers={"Range": "bytes=5-11"})
+        self.request.environ["HTTP_RANGE"] = request.environ["HTTP_RANGE"]
+        r = view.SendFile(file)
+        self.assertEqual(r.accept_ranges, "bytes")
+        r = request.get_response(r)
+        self.assertEqual(r.status_int, 206)
+        self.assertEqual(r.body, db_app.file2_1_data[5:12])
+        # front server
+        r = XSendfileDelivery()(self.request, Response(), file)
+        self.assertEqual(r.headers["X-Sendfile"], file.abspath())
+        self.assertEqual(r.body, "")
+        r = XAccelDelivery({"fileDeliveryPath": "/protected"})(self.request, Response(), file)
+        self.assertEqual(r.headers["X-Accel-Redirect"], "/protected/" + file.path.lstrip("/"))
+        self.assertEqual(r.body, "")
+
+
+    def test_file_fingerprint(self):
+        view = BaseView(self.context2, self.request)
+        file = self.context2.GetFile("file1")
+        self.assertEqual(file.digest, hashlib.sha256(db_app.file2_1_data).hexdigest())
+        self.assert_(view.FileUrl("file1").endswith(u"/file/file1.txt"))
+        self.assert_(view.FileUrl("file1", fingerprint=True).endswith(u"/file/%s/file1.txt" % file.digest[:16]))
+        # fingerprinted urls are immutable
+        self.request.subpath = [file.digest[:16], "file1.txt"]
+        r = view.File()
+        self.assertEqual(r.etag, file.digest)
+        self.assertEqual(r.cache_control.max_age, view.fingerprintExpires)
+        self.assert_(str(r.cache_control).find("immutable") != -1)
+        # outdated fingerprint
+        self.request.subpath = ["0000", "file1.txt"]
+        r = view.File()
+        self.assertEqual(r.cache_control.max_age, view.fileExpires)
+        # prefix of the fingerprint
+        self.request.subpath = [file.digest[:1], "file1.txt"]
+        r = view.File()
+        self.assertEqual(r.cache_control.max_age, view.fileExpires)
+        # etag match
+        self.request.environ["HTTP_IF_NONE_MATCH"] = '"%s"' % file.digest
+        r = view.SendFile(file)
+        self.assertEqual(r.status_int, 304)
+        self.assertEqual(r.etag, file.digest)
+
     
     def test_render(self):
         view = BaseView(self.context2, self.request)
@@ -18,7 +18,9 @@
 __doc__ = "Data Pool 2 SQL Base Module"
 
 import weakref
+import threading
 from time import time
+from collections import OrderedDict
 from datetime import datetime
 
 from nive.utils.utils import ConvertToDateTime
@@ -28,7 +30,74 @@ from nive.utils.path import DvPath
 
 from nive.definitions import ConfigurationError, OperationalError, ProgrammingError, Warning
 
-from nive.utils.dataPool2.structure import PoolStructure, DataWrapper, MetaWrapper, FileWrapper
+from nive.utils.dataPool2.structure import PoolStructure, DataWrapper, MetaWrapper, FileWrapper, ReadonlyValues
+from nive.utils.dataPool2.collector import QueryCollector
+
+
+
+class StatementCache(object):
+    """
+    Thread safe LRU cache for generated sql statements. Counts hits and misses.
+    """
+
+    def __init__(self, size=500):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached statement or None
+        """
+        self._lock.acquire()
+        try:
+            try:
+                statement = self._statements.pop(key)
+            except (KeyError, TypeError):
+                # TypeError: unhashable values in key
+                self.misses += 1
+                return None
+            # move to the end of the lru list
+            self._statements[key] = statement
+            self.hits += 1
+            return statement
+        finally:
+            self._lock.release()
+
+    def set(self, key, statement):
+        self._lock.acquire()
+        try:
+            try:
+                self._statements[key] = statement
+            except TypeError:
+                return
+            while len(self._statements) > self.size:
+                self._statements.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._statements.clear()
+            self.hits = self.misses = 0
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._statements), "size": self.size}
+
+    def statements(self):
+        """
+        Returns the sql of all cached statements
+        """
+        self._lock.acquire()
+        try:
+            return [s[0] for s in self._statements.values()]
+        finally:
+            self._lock.release()
 
 
 
@@ -58,6 +127,14 @@ class Base(object):
     version:       string. the default version
     useBackups:    bool.     store backup versions of files on replace
     useTrashcan:   bool.     moves files to trashcan rather than delete physically
+    trashcanRetention: number. seconds deleted files are kept in the trashcan. 0 = forever
+    trashcanInterval: number. seconds between two trashcan purge runs
+    trashcanQueue: bool.     move deleted files to the trashcan in a background thread
+    directoryDepth: number.  file directory levels. 0 = default layout. see FileManager
+    directoryWidth: number.  id digits per file directory level
+    contentStore:  bool.     store files once by SHA-256 digest and share them between entries
+    treeIndex:     bool.     maintain the pool_tree closure table and use it for tree lookups
+    statementCacheSize: number. maximum number of cached select statements. 0 = off
     debug:         number. turn debugging on. 0 = off, 1=on (no traceback), 2...20=on (traceback lines) 
     log:           string. log file path for debugging
 
@@ -81,7 +158,20 @@ class Base(object):
     MetaTable = u"pool_meta"
     FulltextTable = u"pool_fulltext"
     GroupsTable = u"pool_groups"
+    TreeTable = u"pool_tree"
     
+    # maximum number of parents looked up in recursive tree queries
+    MaxTreeDepth = 1000
+    # maximum number of cached select statements. 0 disables the cache.
+    StatementCacheSize = 500
+    # maximum number of values in IN lists used for batch loading
+    BatchSize = 500
+    # bind list values as separate placeholders e.g. IN (?,?,?)
+    ListPlaceholders = False
+    # maximum number of cached count results and seconds until a cached count expires
+    CountCacheSize = 200
+    CountCacheTimeout = 60
+
 
     def __init__(self, connection = None, structure = None, root = "",
                  useTrashcan = False, useBackups = False, 
@@ -93,6 +183,24 @@ class Base(object):
         self.dbCodePage = dbCodePage
         self.useBackups = useBackups
         self.useTrashcan = useTrashcan
+        # None = check database version on first use
+        self._recursiveQueries = kw.get("recursiveQueries")
+        self.useTreeIndex = kw.get("treeIndex", False)
+        self.useContentStore = kw.get("contentStore", False)
+        self.trashcanRetention = kw.get("trashcanRetention", 0)
+        self.trashcanInterval = kw.get("trashcanInterval", 3600)
+        self.trashcanQueue = kw.get("trashcanQueue", False)
+        self.directoryDepth = kw.get("directoryDepth", 0)
+        self.directoryWidth = kw.get("directoryWidth", 2)
+        size = kw.get("statementCacheSize", self.StatementCacheSize)
+        self._statementCache = None
+        if size:
+            self._statementCache = StatementCache(size)
+        self._countCache = StatementCache(self.CountCacheSize)
+        # change counter for each table. used to invalidate cached counts.
+        self._changes = {}
+        # tables changed in the current transaction of the thread
+        self._changed = threading.local()
 
         self._debug = debug
         self._log = log
@@ -112,11 +220,15 @@ class Base(object):
         elif connParam:
             self._conn = self.CreateConnection(connParam)
             self.name = connParam.get("dbName",u"")
+        if self._conn:
+            self._InitCollector(self._conn)
         
 
     def Close(self):
         if self._conn:
             self._conn.close()
+        if getattr(self, "_purger", None):
+            self._purger.Stop()
 
     def __del__(self):
          self.Close()
@@ -161,12 +273,14 @@ class Base(object):
         Rollback the changes made to the database, if supported
         """
         self.usedconnection.rollback()
+        self._TablesCommitted()
 
     def Commit(self, user=""):
         """
         Commit the changes made to the database, if supported
         """
         self.usedconnection.commit()
+        self._TablesCommitted()
 
     def GetDBDate(self, date=None):
         if not date:
@@ -214,6 +328,34 @@ class Base(object):
         groupby: add GROUP BY statement
         sort: result sort order
         ascending: result sort order ascending or descending
+        seek: keyset pagination. tuple (sort field, sort value, id) of the last record of the
+              previous page. only records after this record are selected. the statement must 
+              be sorted by the sort field and id e.g. sort="title ASC, id".
+
+        Generated statements are cached by shape (fields, parameter keys and value types, 
+        operators, tables, sort and flags). For cached statements only the list of parameter 
+        values is created.
+        """
+        if parameter==None:
+            parameter={}
+        key = None
+        if self._statementCache is not None:
+            key = self._StatementKey(flds, parameter, dataTable, start, max, kw)
+            statement = self._statementCache.get(key)
+            if statement is not None:
+                sql, extractor = statement
+                return sql, self._ExtractValues(extractor, parameter) + self._SeekValues(kw.get("seek"))
+        sql, plist, extractor = self._FmtSQLSelect(flds, parameter, dataTable, start, max, **kw)
+        if key is not None and extractor is not None:
+            self._statementCache.set(key, (sql, extractor))
+        return sql, plist + self._SeekValues(kw.get("seek"))
+
+
+    def _FmtSQLSelect(self, flds, parameter, dataTable, start, max, **kw):
+        """
+        Creates the select statement. Returns sql, parameter values and the value extractor 
+        used to create parameter values for cached statements. The extractor is None if 
+        the statement cannot be cached. Seek values are not included in parameter values.
         """
         operators = kw.get("operators",{})
         jointype = operators.get("jointype", u"INNER")
@@ -222,6 +364,8 @@ class Base(object):
         metaStructure = self.structure.get(self.MetaTable, version=version)
         mapJoinFld = kw.get("mapJoinFld")
         plist = []   # sorted list of query parameters for execute()
+        extractor = []   # (key, mode) list to create plist for cached statements
+        cacheable = True
         ph = self.placeholder   # placeholder to be used instead plist values
         fields = []
         for field in flds:
@@ -264,8 +408,6 @@ class Base(object):
         addCombi = False
         
         where = []
-        if parameter==None:
-            parameter={}
         for key in parameter.keys():
             value = parameter[key]
             paramname = key
@@ -297,6 +439,7 @@ class Base(object):
                         where.append(u" %s " % aCombi)
                     where.append(u"%s%s %s %s " % (table, paramname, operator, ph))
                     plist.append(value)
+                    extractor.append((key, self._ValueLike))
                 elif operator == u"BETWEEN":
                     if value == u"":
                         continue
@@ -304,11 +447,13 @@ class Base(object):
                         where.append(u" %s " % aCombi)
                     where.append(u"%s%s %s %s " % (table, paramname, operator, ph))
                     plist.append(value)
+                    extractor.append((key, self._Value))
                 else:
                     if addCombi:
                         where.append(u" %s " % aCombi)
                     where.append(u"%s%s %s %s " % (table, paramname, operator, ph))
                     plist.append(value)
+                    extractor.append((key, self._Value))
                 addCombi = True
 
             # fmt list values
@@ -323,6 +468,7 @@ class Base(object):
                     where.append(u"%s%s %s %s AND %s" % (table, paramname, operator, ph, ph))
                     plist.append(value[0])
                     plist.append(value[1])
+                    extractor.append((key, self._ValueRange))
                 elif len(value)==1:
                     if operator == u"IN":
                         operator = u"="
@@ -330,14 +476,22 @@ class Base(object):
                         operator = u"<>"
                     where.append(u"%s%s %s %s " % (table, paramname, operator, ph))
                     plist.append(value[0])
+                    extractor.append((key, self._ValueFirst))
+                elif self.ListPlaceholders:
+                    where.append(u"%s%s %s (%s) " % (table, paramname, operator, u",".join([ph]*len(value))))
+                    plist.extend(value)
+                    extractor.append((key, self._ValueList))
                 else:
                     v = self._FmtListForQuery(value)
                     if isinstance(v, basestring):
                         # sqlite error: cannot use placeholder
                         where.append(u"%s%s %s (%s) " % (table, paramname, operator, v))
+                        # values are part of the statement
+                        cacheable = False
                     else:
                         where.append(u"%s%s %s %s " % (table, paramname, operator, ph))
                         plist.append(value)
+                        extractor.append((key, self._Value))
                 addCombi = True
 
             # fmt number values
@@ -348,6 +502,7 @@ class Base(object):
                     operator = u"="
                 where.append(u"%s%s %s %s" % (table, paramname, operator, ph))
                 plist.append(value)
+                extractor.append((key, self._Value))
                 addCombi = True
 
         condition = kw.get("condition")
@@ -356,6 +511,14 @@ class Base(object):
                 where.append(u" %s %s" %(aCombi, condition))
             else:
                 where = [condition]
+
+        seek = kw.get("seek")
+        if seek:
+            seek = self._FmtSeek(seek, kw.get("ascending", 1), metaStructure, dataTable, singleTable)
+            if len(where):
+                where = [u"("] + where + [u") AND ", seek]
+            else:
+                where = [seek]
         where = self._FmtWhereClause(where, singleTable)
 
         order = u"ASC"
@@ -423,7 +586,125 @@ class Base(object):
         %s
         %s
         """ % (fields, table, join, joindata, customJoin, where, groupby, sort, limit)
-        return sql, plist
+        if not cacheable:
+            extractor = None
+        return sql, plist, extractor
+
+
+    def _FmtSeek(self, seek, ascending, metaStructure, dataTable, singleTable):
+        """
+        Creates the where condition for keyset pagination. Null values are sorted first. 
+        """
+        sortfld, value, id = seek
+        ph = self.placeholder
+        if singleTable:
+            table = u""
+            idfld = u"id"
+        else:
+            idfld = u"meta__.id"
+            table = u"meta__."
+            if not sortfld in metaStructure and sortfld != u"pool_stag" and dataTable != u"":
+                table = u"data__."
+        op = u">"
+        if ascending == 0:
+            op = u"<"
+        if not sortfld or sortfld == u"id":
+            return u"%s %s %s" % (idfld, op, ph)
+        sortfld = table + sortfld
+        if value is None:
+            if ascending == 0:
+                return u"(%s IS NULL AND %s < %s)" % (sortfld, idfld, ph)
+            return u"(%s IS NOT NULL OR %s > %s)" % (sortfld, idfld, ph)
+        seek = u"%s %s %s OR (%s = %s AND %s %s %s)" % (sortfld, op, ph, sortfld, ph, idfld, op, ph)
+        if ascending == 0:
+            seek += u" OR %s IS NULL" % (sortfld)
+        return u"(%s)" % (seek)
+
+    def _SeekValues(self, seek):
+        if not seek:
+            return []
+        sortfld, value, id = seek
+        if not sortfld or sortfld == u"id" or value is None:
+            return [id]
+        return [value, value, id]
+
+
+    # value extractor modes
+    _Value = 0
+    _ValueLike = 1
+    _ValueRange = 2
+    _ValueFirst = 3
+    _ValueList = 4
+
+    def _StatementKey(self, flds, parameter, dataTable, start, max, kw):
+        """
+        Creates the statement cache key. Includes parameter keys and value types but 
+        not the values.
+        """
+        shape = []
+        for key, value in parameter.iteritems():
+            if isinstance(value, basestring):
+                shape.append((key, value==u""))
+            elif isinstance(value, (tuple, list)):
+                if self.ListPlaceholders:
+                    shape.append((key, len(value)))
+                else:
+                    shape.append((key, len(value)<2 and len(value) or 2))
+            elif isinstance(value, (int, long, float)):
+                shape.append((key, -1))
+            else:
+                shape.append((key, None))
+        operators = kw.get("operators")
+        if operators:
+            operators = tuple(sorted(operators.items()))
+        version = kw.get("version")
+        return (tuple(flds), tuple(shape), operators, dataTable, start, max, version, 
+                self.structure.get(self.MetaTable, version=version),
+                kw.get("singleTable",0), kw.get("mapJoinFld"), kw.get("logicalOperator"), 
+                kw.get("condition"), kw.get("sort", u""), kw.get("ascending", 1), 
+                kw.get("join", u""), kw.get("groupby"), 
+                kw.get("seek") and (kw["seek"][0], kw["seek"][1] is None))
+
+    def _ExtractValues(self, extractor, parameter):
+        plist = []
+        for key, mode in extractor:
+            value = parameter[key]
+            if mode == self._Value:
+                plist.append(value)
+            elif mode == self._ValueLike:
+                plist.append(u"%%%s%%" % value.replace(u"*", u"%"))
+            elif mode == self._ValueRange:
+                plist.append(value[0])
+                plist.append(value[1])
+            elif mode == self._ValueList:
+                plist.extend(value)
+            else:
+                plist.append(value[0])
+        return plist
+
+    def GetStatementCacheStats(self):
+        """
+        Returns the statement cache counters as dictionary: hits, misses, entries, size.
+        """
+        if self._statementCache is None:
+            return None
+        return self._statementCache.stats()
+
+    def GetCachedStatements(self):
+        """
+        Returns the sql of all statements in the statement cache. Values are included as 
+        placeholders.
+        """
+        if self._statementCache is None:
+            return []
+        return self._statementCache.statements()
+
+    def ClearStatementCache(self):
+        """
+        Empties the statement cache. Call after the pool structure has been changed.
+        """
+        if self._statementCache is not None:
+            self._statementCache.clear()
 
 
     def _FmtListForQuery(self, value):
@@ -547,6 +828,112 @@ class Base(object):
         return result
 
 
+    def Iterate(self, sql, values = None, batchsize = None):
+        """
+        Execute a query on the database and iterate the result records. Unlike `Query()` the
+        records are fetched in batches of `batchsize` (default `BatchSize`) and not loaded at
+        once. Use for large results to keep memory usage constant.
+
+        The cursor is closed if the result is exhausted or the generator is closed. Do not
+        commit on the same connection before iteration is finished.
+        """
+        if not batchsize:
+            batchsize = self.BatchSize
+        if self._debug:
+            STACKF(0,sql+"\r\n",self._debug, self._log,name=self.name)
+        sql = self.DecodeText(sql)
+        if not values:
+            values = self._EmptyValues
+        c, conn = self._IterCursor()
+        try:
+            try:
+                c.execute(sql, values)
+            except self._OperationalError, e:
+                # map to nive.utils.dataPool2.base.OperationalError
+                raise OperationalError, e
+            except self._ProgrammingError, e:
+                # map to nive.utils.dataPool2.base.OperationalError
+                raise ProgrammingError, e
+            while True:
+                recs = c.fetchmany(batchsize)
+                if not recs:
+                    break
+                for rec in recs:
+                    yield rec
+        finally:
+            c.close()
+            if conn:
+                conn.close()
+
+
+    def _IterCursor(self):
+        # returns the cursor used by Iterate() and a private connection to be closed
+        # after iteration or None
+        return self.connection.cursor(), None
+
+
+    def GetCount(self, sql, values = None, tables = None, strategy = u"exact"):
+        """
+        Execute a count query and return the first column of the first record. ::
+
+            tables = tables used in the query. used to invalidate cached counts.
+            strategy = exact, cached or estimate
+
+        exact:    executes the query.
+        cached:   counts are cached by statement and values. Cached counts are invalidated if 
+                  one of `tables` is changed by this pool or after `CountCacheTimeout` seconds.
+                  Changes by other processes are recognized after the timeout.
+        estimate: uses the database query planner to estimate the number of records. Falls
+                  back to `cached` if not supported by the database.
+        """
+        if strategy == u"estimate":
+            count = self._EstimateCount(sql, values)
+            if count is not None:
+                return count
+            strategy = u"cached"
+        if strategy != u"cached":
+            return self.Query(sql, values)[0][0]
+        key = (sql, tuple([isinstance(v, list) and tuple(v) or v for v in values or ()]))
+        changes = tuple([self._changes.get(t, 0) for t in tables or ()])
+        cached = self._countCache.get(key)
+        if cached is not None:
+            count, c, t = cached
+            if c == changes and time() - t < self.CountCacheTimeout:
+                return count
+        count = self.Query(sql, values)[0][0]
+        self._countCache.set(key, (count, changes, time()))
+        return count
+
+
+    def TableChanged(self, table):
+        """
+        Increment the change counter of the table. Called by all write functions of the pool.
+        Call this function after changes with custom sql statements to invalidate cached counts. 
+        The counter is incremented again on commit or rollback, so counts cached by other
+        connections before the changes are visible are invalidated too.
+        """
+        self._changes[table] = self._changes.get(table, 0) + 1
+        tables = getattr(self._changed, "tables", None)
+        if tables is None:
+            tables = self._changed.tables = set()
+        tables.add(table)
+
+
+    def _TablesCommitted(self):
+        # increments the change counters of the tables changed in the finished transaction
+        tables = getattr(self._changed, "tables", None)
+        if not tables:
+            return
+        self._changed.tables = set()
+        for table in tables:
+            self._changes[table] = self._changes.get(table, 0) + 1
+
+
+    def _EstimateCount(self, sql, values):
+        # returns the estimated number of records or None if not supported
+        return None
+
+
     def SelectFields(self, table, fields, idValues, cursor = None, idColumn = None):
         """
         Select row with multiple fields in the table.
@@ -609,6 +996,7 @@ class Base(object):
             dataList.append(value)
 
         sql = u"INSERT INTO %s (%s) VALUES (%s)" % (table, u",".join(flds), u",".join(phdata))
+        self.TableChanged(table)
 
         if self._debug:
             STACKF(0,sql+"\r\n",self._debug, self._log,name=self.name)
@@ -662,6 +1050,7 @@ class Base(object):
         dataList = []
         data = self.structure.serialize(table, None, data)
         sql = [u"UPDATE %s SET " % (table)]
+        self.TableChanged(table)
         for key, value in data.items():
             dataList.append(value)
             if len(sql)>1:
@@ -692,6 +1081,46 @@ class Base(object):
         return data
 
 
+    def UpdateFieldsMany(self, table, rows, cursor = None, idColumn = u"id"):
+        """
+        Updates multiple records in the table. Rows with the same fields are updated with
+        a single `executemany` call. Like UpdateFields() changes are not committed.
+
+        rows: list of (id, data) tuples
+
+        returns the number of rows
+        """
+        if not rows:
+            return 0
+        cc = 0
+        if not cursor:
+            cc = 1
+            cursor = self.connection.cursor()
+        ph = self.placeholder
+        # group rows by fields
+        groups = OrderedDict()
+        for id, data in rows:
+            data = self.structure.serialize(table, None, data)
+            flds = tuple(sorted(data.keys()))
+            if not flds:
+                continue
+            if not flds in groups:
+                groups[flds] = []
+            groups[flds].append([data[f] for f in flds] + [id])
+
+        self.TableChanged(table)
+        try:
+            for flds, values in groups.items():
+                sql = u"UPDATE %s SET %s WHERE %s=%s" % (table, u",".join([u"%s=%s"%(f, ph) for f in flds]), idColumn, ph)
+                self._ExecuteMany(sql, values, cursor)
+        except:
+            self.Undo()
+            raise
+        if cc:
+            cursor.close()
+        return len(rows)
+
+
     def DeleteRecords(self, table, parameter, cursor=None):
         """
         Delete records referenced by parameters
@@ -705,6 +1134,7 @@ class Base(object):
             p.append(u"%s=%s"%(field, ph))
             v.append(value)
         sql = u"DELETE FROM %s WHERE %s" % (table, u" AND ".join(p))
+        self.TableChanged(table)
         if self._debug:
             STACKF(0,sql+"\r\n\r\n",self._debug, self._log,name=self.name)
         cc=False
@@ -766,13 +1196,131 @@ class Base(object):
             id, dataref = self._CreateNewID(table=self.MetaTable, dataTbl=pool_datatbl)
         if not id:
             return None
+        self.TableChanged(self.MetaTable)
+        self.TableChanged(pool_datatbl)
         kw["preload"] = u"skip"
         kw["pool_dataref"] = dataref
+        if self.useTreeIndex:
+            self.UpdateTreeIndex(id, 0)
         entry = self._GetPoolEntry(id, **kw)
         entry._InitNew(pool_datatbl, user)
         return entry
 
 
+    def CreateEntries(self, pool_datatbl, rows, user = ""):
+        """
+        Create multiple entries of the same data table at once. Rows are inserted with
+        one `executemany` call per table for each run of rows with the same fields.
+        Changes are committed at the end.
+
+        rows: list of dictionaries {"meta": {...}, "data": {...}, "fulltext": u"text"}.
+              fulltext is optional.
+
+        returns the new ids in the order of rows
+        """
+        if not pool_datatbl:
+            raise TypeError, "Missing data table."
+        if not rows:
+            return []
+        date = self.GetDBDate()
+        if user==None:
+            user=""
+        else:
+            user=str(user)
+        system = {u"pool_datatbl": pool_datatbl, u"pool_create": date, u"pool_change": date,
+                  u"pool_createdby": user, u"pool_changedby": user}
+
+        ids = []
+        cursor = self.connection.cursor()
+        try:
+            # split rows in runs with the same fields
+            runs = []
+            shape = None
+            for row in rows:
+                meta = row.get("meta") or {}
+                data = row.get("data") or {}
+                s = (tuple(sorted(meta.keys())), tuple(sorted(data.keys())), bool(row.get("fulltext")))
+                if s != shape:
+                    runs.append([])
+                    shape = s
+                runs[-1].append((meta, data, row.get("fulltext")))
+
+            for run in runs:
+                ids += self._InsertEntries(pool_datatbl, run, system, cursor)
+            self.Commit()
+        except:
+            self.Undo()
+            raise
+        cursor.close()
+        return ids
+
+
+    def _InsertEntries(self, pool_datatbl, rows, system, cursor):
+        """
+        Inserts data, meta and fulltext records for rows with the same fields.
+        """
+        ph = self.placeholder
+        count = len(rows)
+        self.TableChanged(pool_datatbl)
+        self.TableChanged(self.MetaTable)
+
+        # data records
+        flds = sorted(rows[0][1].keys())
+        if flds:
+            values = []
+            for meta, data, text in rows:
+                data = self.structure.serialize(pool_datatbl, None, data)
+                values.append([data[f] for f in flds])
+        else:
+            flds = [u"id"]
+            values = [[None]] * count
+        sql = u"INSERT INTO %s (%s) VALUES (%s)" % (pool_datatbl, u",".join(flds), u",".join([ph]*len(flds)))
+        datarefs = self._InsertMany(sql, values, cursor)
+
+        # meta records
+        flds = [f for f in sorted(rows[0][0].keys()) if not f in system and not f in (u"id", u"pool_dataref")]
+        sysflds = sorted(system.keys())
+        values = []
+        for (meta, data, text), dataref in zip(rows, datarefs):
+            meta = self.structure.serialize(self.MetaTable, None, meta)
+            values.append([meta[f] for f in flds] + [system[f] for f in sysflds] + [dataref])
+        flds = flds + sysflds + [u"pool_dataref"]
+        sql = u"INSERT INTO %s (%s) VALUES (%s)" % (self.MetaTable, u",".join(flds), u",".join([ph]*len(flds)))
+        ids = self._InsertMany(sql, values, cursor)
+
+        # fulltext records
+        if rows[0][2]:
+            values = [(id, self.DecodeText(text), u"") for id, (meta, data, text) in zip(ids, rows)]
+            sql = u"INSERT INTO %s (id, text, files) VALUES (%s, %s, %s)" % (self.FulltextTable, ph, ph, ph)
+            self.TableChanged(self.FulltextTable)
+            self._ExecuteMany(sql, values, cursor)
+
+        if self.useTreeIndex:
+            for id, (meta, data, text) in zip(ids, rows):
+                self.UpdateTreeIndex(id, meta.get(u"pool_unitref", 0), cursor)
+        return ids
+
+
+    def _InsertMany(self, sql, values, cursor):
+        """
+        Inserts the rows and returns the new ids in the order of values. 
+        """
+        self._ExecuteMany(sql, values, cursor)
+        return self._GetInsertIDValues(cursor, len(values))
+
+
+    def _ExecuteMany(self, sql, values, cursor):
+        if self._debug:
+            STACKF(0,sql+"\r\n",self._debug, self._log,name=self.name)
+        try:
+            cursor.executemany(sql, values)
+        except self._Warning:
+            pass
+        except self._OperationalError, e:
+            # map to nive.utils.dataPool2.base.OperationalError
+            raise OperationalError, e
+
+
     def GetEntry(self, id, **kw):
         """
         Get entry from db by ID
@@ -806,6 +1354,9 @@ class Base(object):
         for table in tables:
             self.DeleteRecords(table, parameter={"id":id})
         self.DeleteRecords(datatbl, parameter={"id":dataref})
+        if self.useTreeIndex:
+            self.DeleteRecords(self.TreeTable, parameter={"descendant":id}, cursor=cursor)
+            self.DeleteRecords(self.TreeTable, parameter={"ancestor":id}, cursor=cursor)
 
         cursor.close()
         return 1
@@ -829,91 +1380,118 @@ class Base(object):
         """
         Get all entries as objects at once. returns a list.
         supports preload: all, skip, meta
+
+        Entries are returned in the order of `ids`. Ids not found are skipped.
+        Large lists are loaded in chunks of `BatchSize` ids.
         
         kw: 
-        - meta: list of meta pool_datatbl for faster lookup
+        - meta: list of meta dictionaries including id and pool_datatbl for faster lookup
+        - readonly: return `ReadonlyEntry` rows instead of entries. Read only entries only 
+          contain the values loaded by the batch and cannot be changed. Use for listings.
+          Supports preload all and meta.
+        - files: load the file records of all entries in one query and set the entries 
+          file wrappers. Not supported for read only entries.
         """
         preload = kw.get("preload", u"all")
         entries = []
         version = kw.get("version")
-        sort = kw.get("sort")
+        readonly = kw.get("readonly")
         if len(ids) == 0:
             return entries
+        if readonly and preload == u"skip":
+            preload = u"meta"
 
         if preload == u"skip":
             for id in ids:
                 e = self._GetPoolEntry(id, preload=u"skip", version=version)
                 entries.append(e)
+            if kw.get("files"):
+                self._PrefetchFiles(entries)
             return entries
 
+        fldsm = self.structure.get(self.MetaTable, version=version)
+        if not fldsm:
+            raise ConfigurationError, "Meta layer is empty."
+        loaded = {}
+
+        decodem = self.structure.decoder(self.MetaTable, fldsm)
         if preload == u"meta":
-            flds = self.structure.get(self.MetaTable, version=version)
-            if not flds:
-                raise ConfigurationError, "Meta layer is empty."
-            parameter = {"id": ids}
-            operators = {"id": u"IN"}
-            sql, values = self.FmtSQLSelect(flds, parameter=parameter, dataTable=self.MetaTable, max=len(ids), sort=sort, operators=operators, singleTable=1)
-            recs = self.Query(sql, values)
-            for r in recs:
-                meta = self.ConvertRecToDict(r, flds)
-                e = self._GetPoolEntry(meta[u"id"], pool_dataref=meta[u"pool_dataref"], pool_datatbl=meta[u"pool_datatbl"], preload=u"skip")
-                e._UpdateCache(meta = meta, data = None)
-                entries.append(e)
-            return entries
+            for chunk in self._Chunks(ids):
+                parameter = {u"id": chunk}
+                operators = {u"id": u"IN"}
+                sql, values = self.FmtSQLSelect(fldsm, parameter=parameter, dataTable=self.MetaTable, operators=operators, singleTable=1)
+                for r in self.Query(sql, values):
+                    meta = decodem(r)
+                    if readonly:
+                        loaded[meta[u"id"]] = ReadonlyEntry(meta[u"id"], meta, None, version)
+                        continue
+                    e = self._GetPoolEntry(meta[u"id"], pool_dataref=meta[u"pool_dataref"], pool_datatbl=meta[u"pool_datatbl"], preload=u"skip")
+                    e._UpdateCache(meta = meta, data = None)
+                    loaded[e.id] = e
+            return [loaded[id] for id in ids if id in loaded]
 
+        # group ids by data table
+        tables = {}
         if "meta" in kw and kw["meta"] and "pool_datatbl" in kw["meta"][0]:
             # use meta pool_datatbl passed in kw[meta]
-            tables = []
             for r in kw["meta"]:
-                if not r["pool_datatbl"] in tables:
-                    tables.append(r["pool_datatbl"])
+                tables.setdefault(r["pool_datatbl"], []).append(r["id"])
         else:
             # select data tables for ids
-            flds = [u"pool_datatbl"]
-            parameter = {"id": ids}
-            operators = {"id": u"IN"}
-            # select list of datatbls
-            sql, values = self.FmtSQLSelect(flds, parameter=parameter, dataTable=self.MetaTable, sort=sort, groupby=u"pool_datatbl", operators=operators, singleTable=1)
-            tables = []
-            for r in self.Query(sql, values):
-                if not r["pool_datatbl"] in tables:
-                    tables.append(r[0])
-        t = u""
-        fldsm = self.structure.get(self.MetaTable, version=version)
-        if not fldsm:
-            raise ConfigurationError, "Meta layer is empty."
-        unsorted = []
-        for table in tables:
+            for chunk in self._Chunks(ids):
+                parameter = {u"id": chunk}
+                operators = {u"id": u"IN"}
+                sql, values = self.FmtSQLSelect([u"id", u"pool_datatbl"], parameter=parameter, dataTable=self.MetaTable, operators=operators, singleTable=1)
+                for r in self.Query(sql, values):
+                    tables.setdefault(r[1], []).append(r[0])
+
+        for table, tableids in tables.items():
             structure = self.structure.get(table, version=version)
             if not structure:
                 continue
-            fldsd = list(structure)
+            # read only entries are decoded completely. deferred fields are skipped in both cases.
+            fldsd = list(self.structure.preloaded(table, version=version))
             flds = list(fldsm) + fldsd
-            parameter = {u"id": ids, u"pool_datatbl": table}
-            operators = {u"id": u"IN", u"pool_datatbl": u"="}
-            # select type data
-            sql, values = self.FmtSQLSelect(flds, parameter=parameter, dataTable=table, sort=sort, operators=operators)
-            typeData = self.Query(sql, values)
-            for r2 in typeData:
-                meta = self.ConvertRecToDict(r2[:len(fldsm)], fldsm)
-                data = self.ConvertRecToDict(r2[len(fldsm):], fldsd)
-                e = self._GetPoolEntry(meta[u"id"], pool_dataref=meta[u"pool_dataref"], pool_datatbl=meta[u"pool_datatbl"], preload=u"skip")
-                meta = self.structure.deserialize(self.MetaTable, None, meta)
-                data = self.structure.deserialize(table, None, data)
-                e._UpdateCache(meta = meta, data = data)
-                unsorted.append(e)
+            decoded = self.structure.decoder(table, fldsd, lazy=not readonly)
+            for chunk in self._Chunks(tableids):
+                parameter = {u"id": chunk, u"pool_datatbl": table}
+                operators = {u"id": u"IN", u"pool_datatbl": u"="}
+                # select type data
+                sql, values = self.FmtSQLSelect(flds, parameter=parameter, dataTable=table, operators=operators)
+                for r2 in self.Query(sql, values):
+                    meta = decodem(r2[:len(fldsm)])
+                    data = decoded(r2[len(fldsm):])
+                    if readonly:
+                        loaded[meta[u"id"]] = ReadonlyEntry(meta[u"id"], meta, data, version)
+                        continue
+                    e = self._GetPoolEntry(meta[u"id"], pool_dataref=meta[u"pool_dataref"], pool_datatbl=meta[u"pool_datatbl"], preload=u"skip")
+                    e._UpdateCache(meta = meta, data = data, lazy = True)
+                    loaded[e.id] = e
         # sort entries
-        for id in ids:
-            for o in unsorted:
-                if o.id==id:
-                    entries.append(o)
-                    break
+        entries = [loaded[id] for id in ids if id in loaded]
+        if kw.get("files") and not readonly:
+            self._PrefetchFiles(entries)
         return entries
 
+
+    def _Chunks(self, values, size=None):
+        """
+        Splits values in lists of maximum `size` (default BatchSize) items.
+        """
+        if not size:
+            size = self.BatchSize
+        for i in xrange(0, len(values), size):
+            yield values[i:i+size]
+
     def _GetInsertIDValue(self, cursor):
         #("assert", "subclass")
         return 0
 
+    def _GetInsertIDValues(self, cursor, count):
+        # ids of the records inserted by the last executemany call
+        #("assert", "subclass")
+        return []
+
     def _CreateNewID(self, table = ""):
         #("assert", "subclass")
         return 0
@@ -929,11 +1507,55 @@ class Base(object):
 
     # Tree structure --------------------------------------------------------------
 
+    def SupportsRecursiveQueries(self):
+        """
+        Returns True if the database supports recursive common table expressions
+        (WITH RECURSIVE). If supported all tree functions select subtrees and parents
+        of any depth in a single query. Otherwise the tree functions fall back to
+        joined subselects limited to 10 levels.
+
+        The check is performed once and cached. Pass `recursiveQueries=False` to the
+        pool to disable recursive queries.
+        """
+        if self._recursiveQueries is None:
+            try:
+                self._recursiveQueries = self._CheckRecursiveQueries()
+            except self._OperationalError:
+                return False
+        return self._recursiveQueries
+
+
     def GetContainedIDs(self, base=0, sort=u"title", parameter=u""):
         """
         Search subtree and returns a list of all contained ids.
         id needs to be first field, pool_unitref second
-        """
+
+        If the tree index is enabled ids are sorted by level and `sort`.
+        """
+        if self.useTreeIndex and base > 0:
+            if parameter:
+                parameter = u"AND (%s)" % parameter
+            if sort:
+                sort = u", %s" % sort
+            sql = u"""
+            SELECT %(meta)s.id FROM %(tree)s INNER JOIN %(meta)s ON (%(meta)s.id = %(tree)s.descendant)
+            WHERE %(tree)s.ancestor = %(ph)s AND %(tree)s.depth > 0 %(param)s
+            ORDER BY %(tree)s.depth%(sort)s
+            """ % {"meta": self.MetaTable, "tree": self.TreeTable, "ph": self.placeholder,
+                   "param": parameter or u"", "sort": sort or u""}
+            return [r[0] for r in self.Query(sql, [base])]
+
+        if self.SupportsRecursiveQueries():
+            tree = self._SelectTreeRecursive([u"id"], sort, base, parameter)
+            # depth first, siblings in sort order
+            ids = []
+            stack = list(reversed(tree[u"items"]))
+            while stack:
+                item = stack.pop()
+                ids.append(item[u"id"])
+                stack.extend(reversed(item[u"items"]))
+            return ids
+
         refs = u"""
         pool_unitref as ref1,
         (select pool_unitref from %(meta)s where id = ref1) as ref2,
@@ -979,7 +1601,14 @@ class Base(object):
         {"id": 123, "items": [{"id": 124, "items": [], "data": "q", ....}, ...], "data": "q", ....}
         
         id needs to be first field, pool_unitref second
+
+        If recursive queries are supported the returned dictionary has the format
+        {"id": base, "items": [{"id": 124, "items": [], "data": "q", ....}, ...]}
+        and includes all levels.
         """
+        if self.SupportsRecursiveQueries():
+            return self._SelectTreeRecursive(flds, sort, base, parameter)
+
         refs = u"""
         pool_unitref as ref1,
         (select pool_unitref from %(meta)s where id = ref1) as ref2,
@@ -1058,10 +1687,15 @@ class Base(object):
     def GetParentPath(self, id):
         """
         Returns id references of parents for the given id.
-        Maximum 10 parents
+        Maximum 10 parents if recursive queries are not supported.
         """
         if id <= 0:
             return []
+        if self.useTreeIndex:
+            return [r[0] for r in self._SelectParentsTreeIndex(id, u"id")]
+        if self.SupportsRecursiveQueries():
+            return [r[0] for r in self._SelectParentsRecursive(id, u"id")]
+
         sql = u"""
         SELECT t1.pool_unitref AS ref1, 
          t2.pool_unitref as ref2, 
@@ -1108,10 +1742,15 @@ class Base(object):
     def GetParentTitles(self, id):
         """
         Returns titles of parents for the given id.
-        maximum 10 parents
+        maximum 10 parents if recursive queries are not supported.
         """
         if id <= 0:
             return []
+        if self.useTreeIndex:
+            return [self.EncodeText(r[0]) for r in self._SelectParentsTreeIndex(id, u"title")]
+        if self.SupportsRecursiveQueries():
+            return [self.EncodeText(r[0]) for r in self._SelectParentsRecursive(id, u"title")]
+
         aC = self.connection.cursor()
         sql = u"""
         SELECT t1.pool_unitref AS ref1, t1.title AS title1, 
@@ -1153,6 +1792,200 @@ class Base(object):
         return parents
 
 
+    def IsContained(self, id, base):
+        """
+        Returns True if `id` is located somewhere in the subtree of `base`.
+        """
+        if id <= 0:
+            return False
+        if base <= 0:
+            return self.IsIDUsed(id)
+        if self.useTreeIndex:
+            sql = u"SELECT depth FROM %s WHERE ancestor = %s AND descendant = %s AND depth > 0" % (self.TreeTable, self.placeholder, self.placeholder)
+            return len(self.Query(sql, [base, id])) > 0
+        return base in self.GetParentPath(id)
+
+
+    def _CheckRecursiveQueries(self):
+        # subclassed
+        return False
+
+
+    def _SelectTreeRecursive(self, flds, sort, base, parameter):
+        """
+        Selects the subtree of `base` in a single recursive query and converts the records
+        to a nested dictionary. Sub entries are sorted by `sort` on each level.
+        `parameter` is a custom sql condition applied on each level. Entries not matching
+        the condition are skipped including their subtree.
+        """
+        if parameter:
+            parameter = u"AND (%s)" % parameter
+        else:
+            parameter = u""
+        if sort:
+            sort = u"ORDER BY %s" % sort
+        else:
+            sort = u""
+        sql = u"""
+        WITH RECURSIVE tree__(ref) AS (
+          SELECT id FROM %(meta)s WHERE pool_unitref = %(ph)s %(param)s
+          UNION
+          SELECT %(meta)s.id FROM %(meta)s, tree__ WHERE %(meta)s.pool_unitref = tree__.ref %(param)s
+        )
+        SELECT %(meta)s.id, %(meta)s.pool_unitref, %(flds)s
+        FROM tree__ INNER JOIN %(meta)s ON (%(meta)s.id = tree__.ref)
+        %(sort)s
+        """ % {"meta": self.MetaTable, "ph": self.placeholder, "param": parameter,
+               "flds": u", ".join(flds), "sort": sort}
+        recs = self.Query(sql, [base])
+
+        # records are sorted. subentries are added in the same order.
+        children = {}
+        for rec in recs:
+            id = rec[0]
+            if id == base:
+                continue
+            data = self.ConvertRecToDict(rec[2:], flds)
+            data[u"id"] = id
+            data[u"items"] = children.setdefault(id, [])
+            children.setdefault(rec[1], []).append(data)
+        return {u"id": base, u"items": children.get(base, [])}
+
+
+    def _SelectParentsRecursive(self, id, fld):
+        """
+        Selects the meta field `fld` of all parents of `id` in a single recursive query.
+        Records are returned in tree order starting with the top most parent.
+        """
+        sql = u"""
+        WITH RECURSIVE parents__(ref, lvl) AS (
+          SELECT pool_unitref, 1 FROM %(meta)s WHERE id = %(ph)s
+          UNION ALL
+          SELECT %(meta)s.pool_unitref, parents__.lvl+1 FROM %(meta)s, parents__
+          WHERE %(meta)s.id = parents__.ref AND parents__.lvl < %(depth)d
+        )
+        SELECT %(meta)s.%(fld)s
+        FROM parents__ INNER JOIN %(meta)s ON (%(meta)s.id = parents__.ref)
+        ORDER BY parents__.lvl DESC
+        """ % {"meta": self.MetaTable, "ph": self.placeholder, "fld": fld, "depth": self.MaxTreeDepth}
+        return self.Query(sql, [id])
+
+
+    def _SelectParentsTreeIndex(self, id, fld):
+        """
+        Selects the meta field `fld` of all parents of `id` based on the tree index.
+        Records are returned in tree order starting with the top most parent.
+        """
+        sql = u"""
+        SELECT %(meta)s.%(fld)s
+        FROM %(tree)s INNER JOIN %(meta)s ON (%(meta)s.id = %(tree)s.ancestor)
+        WHERE %(tree)s.descendant = %(ph)s AND %(tree)s.depth > 0
+        ORDER BY %(tree)s.depth DESC
+        """ % {"meta": self.MetaTable, "tree": self.TreeTable, "ph": self.placeholder, "fld": fld}
+        return self.Query(sql, [id])
+
+
+    # Tree index -----------------------------------------------------------------------
+    # The tree index (pool_tree) is a closure table storing one record for each
+    # ancestor/descendant pair including the entry itself (depth 0).
+
+    def UpdateTreeIndex(self, id, parent, cursor=None):
+        """
+        Updates the tree index after the parent reference (pool_unitref) of `id` changed.
+        The records of all contained entries are updated as well. Changes are not committed.
+        """
+        cc = False
+        if not cursor:
+            cc = True
+            cursor = self.connection.cursor()
+        ph = self.placeholder
+        tree = self.TreeTable
+        if not parent:
+            parent = 0
+
+        # current subtree including the entry itself
+        self.Execute(u"SELECT descendant, depth FROM %s WHERE ancestor = %s" % (tree, ph), [id], cursor=cursor)
+        subtree = list(cursor.fetchall())
+        self.Execute(u"SELECT ancestor FROM %s WHERE descendant = %s AND depth > 0 ORDER BY depth" % (tree, ph), [id], cursor=cursor)
+        ancestors = [r[0] for r in cursor.fetchall()]
+        if not subtree:
+            subtree = [(id, 0)]
+            self.Execute(u"INSERT INTO %s (ancestor, descendant, depth) VALUES (%s, %s, %s)" % (tree, ph, ph, ph), [id, id, 0], cursor=cursor)
+        elif (ancestors and ancestors[0] == parent) or (not ancestors and not parent):
+            # not changed
+            if cc:
+                cursor.close()
+            return
+
+        # remove the old ancestors from the subtree
+        if ancestors:
+            descendants = [r[0] for r in subtree]
+            while descendants:
+                chunk = descendants[:500]
+                descendants = descendants[500:]
+                sql = u"DELETE FROM %s WHERE descendant IN (%s) AND ancestor IN (%s)" % (tree,
+                                                                                        u",".join([ph]*len(chunk)),
+                                                                                        u",".join([ph]*len(ancestors)))
+                self.Execute(sql, chunk+ancestors, cursor=cursor)
+
+        # link the subtree to the new ancestors
+        if parent > 0:
+            self.Execute(u"SELECT ancestor, depth FROM %s WHERE descendant = %s" % (tree, ph), [parent], cursor=cursor)
+            parents = list(cursor.fetchall())
+            if not parents:
+                parents = [(parent, 0)]
+            values = []
+            for ancestor, adepth in parents:
+                for descendant, ddepth in subtree:
+                    values.append((ancestor, descendant, adepth+ddepth+1))
+            sql = u"INSERT INTO %s (ancestor, descendant, depth) VALUES (%s, %s, %s)" % (tree, ph, ph, ph)
+            if self._debug:
+                STACKF(0,sql+"\r\n",self._debug, self._log,name=self.name)
+            try:
+                cursor.executemany(sql, values)
+            except self._OperationalError, e:
+                # map to nive.utils.dataPool2.base.OperationalError
+                raise OperationalError, e
+        if cc:
+            cursor.close()
+
+
+    def RebuildTreeIndex(self):
+        """
+        Regenerates the tree index from pool_meta.pool_unitref references and commits
+        the changes. Use this function to initialize the index for existing databases.
+
+        returns the number of index records
+        """
+        cursor = self.connection.cursor()
+        self.Execute(u"SELECT id, pool_unitref FROM %s" % (self.MetaTable), cursor=cursor)
+        parents = dict(cursor.fetchall())
+
+        values = []
+        for id in parents:
+            values.append((id, id, 0))
+            ref = parents[id]
+            depth = 1
+            while ref and ref in parents and depth <= self.MaxTreeDepth:
+                values.append((ref, id, depth))
+                ref = parents[ref]
+                depth += 1
+
+        ph = self.placeholder
+        sql = u"INSERT INTO %s (ancestor, descendant, depth) VALUES (%s, %s, %s)" % (self.TreeTable, ph, ph, ph)
+        try:
+            self.Execute(u"DELETE FROM %s" % (self.TreeTable), cursor=cursor)
+            if self._debug:
+                STACKF(0,sql+"\r\n",self._debug, self._log,name=self.name)
+            cursor.executemany(sql, values)
+        except:
+            self.Undo()
+            raise
+        self.Commit()
+        cursor.close()
+        return len(values)
+
+
     # Files and directories ---------------------------------------------------------------------
 
     def InitFileStorage(self, root, connectionParam):
@@ -1194,6 +2027,27 @@ class Base(object):
         return r
 
 
+    def GetInheritedGroups(self, id, userid=None):
+        """
+        Get local group assignments for userid including all parents of id in a single query.
+        Requires the tree index. Returns None if the index is not used.
+        
+        returns a group assignment list [["userid", "groupid", "id"], ...]
+        """
+        if not self.useTreeIndex:
+            return None
+        ph = self.placeholder
+        sql = u"""
+        SELECT %(groups)s.userid, %(groups)s.groupid, %(groups)s.id
+        FROM %(tree)s INNER JOIN %(groups)s ON (%(groups)s.id = %(tree)s.ancestor)
+        WHERE %(tree)s.descendant = %(ph)s""" % {"groups": self.GroupsTable, "tree": self.TreeTable, "ph": ph}
+        values = [id]
+        if userid:
+            sql += u" AND %s.userid = %s" % (self.GroupsTable, ph)
+            values.append(userid)
+        return self.Query(sql, values)
+
+
     def AddGroup(self, id, userid, group):
         """
         Add a local group assignment for userid.
@@ -1258,11 +2112,19 @@ class Base(object):
 
     def SetConnection(self, conn):
         self._conn = conn
+        self._InitCollector(conn)
 
     def CreateConnection(self, connParam):
         return self._DefaultConnection(connParam)
 
     
+    def _InitCollector(self, conn):
+        # attach the query collector if enabled in the configuration
+        conf = conn.configuration
+        if conf and conf.get("queryCollector") and not conn.collector:
+            conn.collector = QueryCollector(self.name, conf.get("queryRepeat", 5), conf.get("queryHistory", 500))
+
+
     # internal subclassing -------------------------------------------
     
     def _GetDefaultPoolStructure(self):
@@ -1381,7 +2243,10 @@ class Entry(object):
             cursor = self.pool.connection.cursor()
             # meta
             if self.meta.HasTemp():
-                self.pool.UpdateFields(self.pool.MetaTable, self.id, self.meta.GetTemp(), cursor)
+                temp = self.meta.GetTemp()
+                self.pool.UpdateFields(self.pool.MetaTable, self.id, temp, cursor)
+                if self.pool.useTreeIndex and u"pool_unitref" in temp:
+                    self.pool.UpdateTreeIndex(self.id, temp[u"pool_unitref"], cursor)
             # data
             if self.data.HasTemp():
                 self.pool.UpdateFields(self.GetDataTbl(), self.GetDataRef(), self.data.GetTemp(), cursor)
@@ -1474,6 +2339,7 @@ class Entry(object):
         Read data layer and return as dictionary
         """
         if self.cacheRec and not self.data.IsEmpty():
+            self._LoadDeferred()
             return self.data
 
         tbl = self.GetDataTbl()
@@ -1496,6 +2362,8 @@ class Entry(object):
         Commits changes immediately to database without calling touch.
         """
         temp = self.pool.UpdateFields(self.pool.MetaTable, self.id, {fld:data})
+        if self.pool.useTreeIndex and fld == u"pool_unitref":
+            self.pool.UpdateTreeIndex(self.id, data)
         self.pool.Commit()
         if cache:
             self._UpdateCache(temp)
@@ -1717,6 +2585,7 @@ class Entry(object):
         """
         ph = self.pool.placeholder
         sql = u"DELETE FROM %s WHERE id = %s"%(self.pool.FulltextTable, ph)
+        self.pool.TableChanged(self.pool.FulltextTable)
         if self.pool._debug:
             STACKF(0,sql+"\r\n\r\n",self.pool._debug, self.pool._log,name=self.pool.name)
         aCursor = self.pool.connection.cursor()
@@ -1834,13 +2703,13 @@ class Entry(object):
         dataTbl = self.GetDataTbl()
         c = self.pool.connection.cursor()
         meta, data = self._SQLSelectAll(self.pool.structure.get(self.pool.MetaTable, version=self.version),
-                                        self.pool.structure.get(dataTbl, version=self.version), c)
+                                        self.pool.structure.preloaded(dataTbl, version=self.version), c)
         c.close()
         if not meta:
             return False
         meta = self.pool.structure.deserialize(self.pool.MetaTable, None, meta)
-        data = self.pool.structure.deserialize(dataTbl, None, data)
-        self._UpdateCache(meta, data)
+        data = self.pool.structure.deserialize(dataTbl, None, data, lazy=True)
+        self._UpdateCache(meta, data, lazy=True)
         return True
 
 
@@ -1862,13 +2731,13 @@ class Entry(object):
             return True
         c = self.pool.connection.cursor()
         dataTbl = self.GetDataTbl()
-        data = self._SQLSelect(self.pool.structure.get(dataTbl, version=self.version), c, dataTbl)
+        data = self._SQLSelect(self.pool.structure.preloaded(dataTbl, version=self.version), c, dataTbl)
         # load local roles, security
         c.close()
         if not data:
             return False
-        data = self.pool.structure.deserialize(dataTbl, None, data)
-        self._UpdateCache(None, data)
+        data = self.pool.structure.deserialize(dataTbl, None, data, lazy=True)
+        self._UpdateCache(None, data, lazy=True)
         return True
 
 
@@ -1890,16 +2759,48 @@ class Entry(object):
             return True
         dataTbl = self.GetDataTbl()
         c = self.pool.connection.cursor()
-        meta, data = self._SQLSelectAll(self.pool.structure.stdMeta, self.pool.structure.get(dataTbl, version=self.version), c)
+        meta, data = self._SQLSelectAll(self.pool.structure.stdMeta, self.pool.structure.preloaded(dataTbl, version=self.version), c)
         c.close()
         if not meta:
             return False
         meta = self.pool.structure.deserialize(self.pool.MetaTable, None, meta)
-        data = self.pool.structure.deserialize(dataTbl, None, data)
-        self._UpdateCache(meta, data)
+        data = self.pool.structure.deserialize(dataTbl, None, data, lazy=True)
+        self._UpdateCache(meta, data, lazy=True)
         return True
 
 
+    def _LoadDeferred(self, fld=None):
+        """
+        Loads deferred data fields not loaded yet. If fld is set only the field is 
+        loaded and the value returned.
+        """
+        if self.virtual:
+            return None
+        tbl = self.GetDataTbl()
+        deferred = self.pool.structure.deferred.get(tbl)
+        if not deferred or (fld and not fld in deferred):
+            return None
+        if self.data.IsEmpty():
+            self._PreloadData()
+        if fld:
+            if self.data.IsLoaded(fld):
+                return self.data[fld]
+            flds = [fld]
+        else:
+            flds = [f for f in deferred if not self.data.IsLoaded(f)]
+            if not flds:
+                return None
+        data = self._SQLSelect(flds, table=tbl)
+        if not data:
+            # not stored yet. skip loading next time.
+            data = dict([(f, None) for f in flds])
+        data = self.pool.structure.deserialize(tbl, None, data, lazy=True)
+        self._UpdateCache(None, data, lazy=True)
+        if fld:
+            return self.data[fld]
+        return None
+
+
     # Internal -------------------------------------------------------------------------------------------
 
     def _InitNew(self, dataTable = None, user = ""):
@@ -1923,16 +2824,73 @@ class Entry(object):
         self.meta.update(aMeta, force=True)
 
 
-    def _UpdateCache(self, meta = None, data = None, files = None):
+    def _UpdateCache(self, meta = None, data = None, files = None, lazy = False):
+        # if lazy is True json and list values are stored serialized
         if meta:
             self.meta.SetContent(meta)
         if data:
-            self.data.SetContent(data)
+            self.data.SetContent(data, lazy and self.pool.structure.lazy(self.GetDataTbl()))
         if files:
             self.files.SetContent(files)
 
 
 
+class ReadonlyEntry(object):
+    """
+    Lightweight read only entry returned by `GetBatch(ids, readonly=True)`. Contains 
+    the meta and data values loaded by the batch. Read only entries are not connected 
+    to the pool: no change tracking, no files and no lazy loading of missing fields.
+    
+    Meta and data values can be accessed as dictionary or attribute e.g. entry.meta.title.
+    """
+    __slots__ = ("id", "meta", "data", "version")
+
+    def __init__(self, id, meta, data=None, version=None):
+        self.id = id
+        self.meta = ReadonlyValues(meta)
+        self.data = ReadonlyValues(data or ())
+        self.version = version
+
+    def __repr__(self):
+        return "<ReadonlyEntry %s>" % str(self.id)
+
+    def Close(self):
+        pass
+
+    def Exists(self):
+        return True
+
+    def IsValid(self):
+        return self.id > 0
+
+    def GetID(self):
+        return self.id
+
+    def GetDataTbl(self):
+        return self.meta[u"pool_datatbl"]
+
+    def GetDataRef(self):
+        return self.meta[u"pool_dataref"]
+
+    def GetVersion(self):
+        return self.version
+
+    def GetMetaField(self, fld, fromDB=False):
+        if fld == u"id":
+            return self.id
+        return self.meta[fld]
+
+    def GetDataField(self, fld, fromDB=False):
+        return self.data[fld]
+
+    def GetMeta(self):
+        return self.meta.copy()
+
+    def GetData(self):
+        return self.data
+
+
+
 class NotFound(Exception):
     """ raised if entry not found """
 
@@ -0,0 +1,333 @@
+#----------------------------------------------------------------------
+# Copyright 2012, 2013 Arndt Droullier, Nive GmbH. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#----------------------------------------------------------------------
+
+__doc__ = """
+Query collector
+---------------
+Records all statements executed by a database connection during a request. Enable the
+collector in the database configuration ::
+
+    DatabaseConf(queryCollector=True, queryRepeat=5)
+
+For each statement the sql shape (literals replaced by ?), number of parameters, duration,
+number of rows and the calling function outside the data pool are recorded. Statements with
+the same shape executed `queryRepeat` times or more in one request are reported as repeated
+(e.g. N+1 patterns like loading users or files row by row).
+
+At the end of each request a summary is logged as `nive.queries` and added to the response
+as `X-Nive-Queries` header. Use `collector.Records()` and `collector.Summary()` to access
+the statements of the current request or thread. Outside of requests only the last 
+`QueryCollector.localSize` records of each thread are kept.
+
+Across requests the collector counts executions and time of up to `queryHistory` different 
+statement shapes. Use `collector.History()` to access the list.
+"""
+
+import os
+import re
+import sys
+import logging
+import threading
+from time import time
+from collections import deque
+
+# The collector stores records as request values. if pyramid is not available the thread
+# local stack is used as fallback
+try:
+    from pyramid.threadlocal import get_current_request
+except:
+    def get_current_request():
+        return None
+
+
+_strings = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_numbers = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_lists = re.compile(r"\?(?:\s*,\s*\?)+")
+_spaces = re.compile(r"\s+")
+_poolDir = os.path.dirname(os.path.abspath(__file__))
+
+
+def SqlShape(sql):
+    """
+    Returns the statement with all literals replaced by ? and whitespace normalized.
+    Lists of values in IN clauses are replaced by a single ?.
+    """
+    sql = _strings.sub(u"?", sql)
+    sql = _numbers.sub(u"?", sql)
+    sql = sql.replace(u"%s", u"?")
+    sql = _lists.sub(u"?", sql)
+    return _spaces.sub(u" ", sql).strip()
+
+
+class QueryCollector(object):
+    """
+    Collects the statements executed in the current request. Records are stored as request
+    values and the thread local stack as fallback (e.g. testing). The thread local stack
+    keeps the last `localSize` records.
+    """
+    localSize = 1000
+
+    def __init__(self, name=u"", repeated=5, history=500):
+        self.name = name
+        self.repeated = repeated
+        self.historySize = history
+        self.local = threading.local()
+        self._history = {}
+        self._lock = threading.Lock()
+
+
+    def Add(self, sql, values=None, many=False):
+        """
+        Adds a new statement record and returns it. Call `Finish()` after execution. ::
+
+            shape    = sql shape
+            params   = number of parameters
+            duration = execution time in seconds
+            rows     = number of affected or fetched rows
+            caller   = calling function outside the data pool (file:line function)
+        """
+        if many:
+            values = values and values[0]
+        rec = dict(shape=SqlShape(sql),
+                   params=len(values or ()),
+                   duration=0.0,
+                   rows=0,
+                   caller=self._Caller(),
+                   start=time())
+        self._Records(True).append(rec)
+        return rec
+
+
+    def Finish(self, rec, rowcount):
+        """ Sets duration and number of affected rows """
+        rec["duration"] = time() - rec.pop("start")
+        if rowcount > 0:
+            rec["rows"] = rowcount
+        self._AddHistory(rec)
+
+
+    def Records(self):
+        """ Returns the statement records of the current request or thread """
+        return list(self._Records(False) or ())
+
+
+    def Reset(self):
+        """ Removes all records of the current request or thread """
+        records = self._Records(False)
+        if records:
+            records.clear()
+
+
+    def History(self):
+        """
+        Returns the statement shapes executed since the collector was created or reset
+        sorted by number of executions. ::
+
+            shape    = sql shape
+            count    = number of executions
+            duration = total execution time in seconds
+        """
+        self._lock.acquire()
+        try:
+            history = [dict(h) for h in self._history.values()]
+        finally:
+            self._lock.release()
+        history.sort(key=lambda h: h["count"], reverse=True)
+        return history
+
+
+    def ResetHistory(self):
+        """ Removes all statement shapes from the history """
+        self._lock.acquire()
+        try:
+            self._history.clear()
+        finally:
+            self._lock.release()
+
+
+    def Summary(self, records=None):
+        """
+        Returns a summary of the records as dictionary ::
+
+            count    = number of statements
+            duration = total execution time in seconds
+            shapes   = number of different statements
+            repeated = list of repeated statements (shape, count, duration, callers)
+        """
+        if records is None:
+            records = self.Records()
+        shapes = {}
+        duration = 0.0
+        for rec in records:
+            duration += rec["duration"]
+            s = shapes.get(rec["shape"])
+            if not s:
+                s = shapes[rec["shape"]] = dict(shape=rec["shape"], count=0, duration=0.0, callers=[])
+            s["count"] += 1
+            s["duration"] += rec["duration"]
+            if not rec["caller"] in s["callers"]:
+                s["callers"].append(rec["caller"])
+        repeated = [s for s in shapes.values() if s["count"] >= self.repeated]
+        repeated.sort(key=lambda s: s["count"], reverse=True)
+        return dict(count=len(records), duration=duration, shapes=len(shapes), repeated=repeated)
+
+
+    def FormatSummary(self, summary=None):
+        """ Returns the summary as single line """
+        if summary is None:
+            summary = self.Summary()
+        return u"%s; queries=%d; time=%.1fms; shapes=%d; repeated=%d" % (self.name,
+                                                                      summary["count"],
+                                                                      summary["duration"]*1000,
+                                                                      summary["shapes"],
+                                                                      len(summary["repeated"]))
+
+
+    def Log(self, records=None):
+        """ Logs the summary and repeated statements """
+        summary = self.Summary(records)
+        log = logging.getLogger("nive.queries")
+        log.info(self.FormatSummary(summary))
+        for s in summary["repeated"]:
+            log.warning(u"Repeated query (%d times, %.1fms): %s (%s)", s["count"], s["duration"]*1000, s["shape"], u", ".join(s["callers"]))
+        return summary
+
+
+    def _Finished(self, request, response):
+        # response callback
+        try:
+            records = request.__nive_queries__.pop(self.name)
+        except (AttributeError, KeyError):
+            return
+        summary = self.Log(records)
+        response.headers.add("X-Nive-Queries", self.FormatSummary(summary).encode("utf-8"))
+
+
+    def _AddHistory(self, rec):
+        self._lock.acquire()
+        try:
+            h = self._history.get(rec["shape"])
+            if not h:
+                # new shapes are skipped if the history is full
+                if len(self._history) >= self.historySize:
+                    return
+                h = self._history[rec["shape"]] = dict(shape=rec["shape"], count=0, duration=0.0)
+            h["count"] += 1
+            h["duration"] += rec["duration"]
+        finally:
+            self._lock.release()
+
+
+    def _Records(self, create):
+        req = get_current_request()
+        if not req:
+            # use thread local stack as fallback
+            if not hasattr(self.local, "records"):
+                if not create:
+                    return None
+                # threads outside of requests are never finished
+                self.local.records = deque(maxlen=self.localSize)
+            return self.local.records
+        if not hasattr(req, "__nive_queries__"):
+            if not create:
+                return None
+            req.__nive_queries__ = {}
+        records = req.__nive_queries__.get(self.name)
+        if records is None and create:
+            records = req.__nive_queries__[self.name] = deque()
+            req.add_response_callback(self._Finished)
+        return records
+
+
+    def _Caller(self):
+        # first frame outside the data pool
+        f = sys._getframe(2)
+        while f and os.path.dirname(os.path.abspath(f.f_code.co_filename)) == _poolDir:
+            f = f.f_back
+        if not f:
+            return u""
+        return u"%s:%d %s" % (f.f_code.co_filename, f.f_lineno, f.f_code.co_name)
+
+
+
+class CollectorCursor(object):
+    """
+    Cursor wrapper recording all statements in the query collector.
+    """
+
+    def __init__(self, cursor, collector):
+        self.cursor = cursor
+        self.collector = collector
+        self._rec = None
+        self._count = False
+
+    def execute(self, sql, *values):
+        self._rec = self.collector.Add(sql, values and values[0])
+        try:
+            return self.cursor.execute(sql, *values)
+        finally:
+            self._finish()
+
+    def executemany(self, sql, values):
+        self._rec = self.collector.Add(sql, values, many=True)
+        try:
+            return self.cursor.executemany(sql, values)
+        finally:
+            self._finish()
+
+    def fetchone(self):
+        r = self.cursor.fetchone()
+        if r is not None and self._count:
+            self._rec["rows"] += 1
+        return r
+
+    def fetchmany(self, *size):
+        r = self.cursor.fetchmany(*size)
+        if self._count:
+            self._rec["rows"] += len(r)
+        return r
+
+    def fetchall(self):
+        r = self.cursor.fetchall()
+        if self._count:
+            self._rec["rows"] += len(r)
+        return r
+
+    def close(self):
+        self.cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    def _finish(self):
+        rowcount = self.cursor.rowcount
+        self.collector.Finish(self._rec, rowcount)
+        # count fetched rows if the database does not return the number of selected rows
+        self._count = rowcount < 0
+
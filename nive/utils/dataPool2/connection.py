@@ -16,6 +16,8 @@
 #----------------------------------------------------------------------
 
 import threading
+import re
+from itertools import count
 from time import time
 
 # The following is used in *ConnectionRequest* classes to cahed the current db connection
@@ -28,6 +30,7 @@ except:
         return None
 
 from nive.definitions import OperationalError
+from nive.utils.dataPool2.collector import CollectorCursor
 
 
 
@@ -44,6 +47,7 @@ class Connection(object):
     """
     
     placeholder = u"%s"
+    collector = None
 
     def __init__(self, config = None, connectNow = True):
         self.configuration=config
@@ -61,6 +65,8 @@ class Connection(object):
         db = self._get()
         if not db:
             raise OperationalError, "Database is closed"
+        if self.collector:
+            return CollectorCursor(db.cursor(), self.collector)
         return db.cursor()
     
     def begin(self):
@@ -284,3 +290,546 @@ class ConnectionRequest(Connection):
     def _setvtime(self):
         self.local._vtime = time()
 
+
+
+class ConnectionPool(object):
+    """
+    Thread safe and bounded pool of raw dbapi connections shared by all threads. ::
+
+        factory = function to open a new dbapi connection
+        maxsize = maximum number of open connections (idle and in use)
+        minsize = number of connections kept open even if idle
+        timeout = seconds to wait for a free connection if all connections are in use
+        idle = idle connections are closed after `idle` seconds
+        validate = function(conn) returning False if the connection is not usable anymore
+        validateInterval = idle connections are validated by a background thread every
+                           `validateInterval` seconds. If 0 connections are validated on checkout.
+
+    Connections are rolled back when returned to the pool.
+    """
+
+    def __init__(self, factory, maxsize=10, minsize=0, timeout=10, idle=300, validate=None, validateInterval=60):
+        self.factory = factory
+        self.maxsize = maxsize
+        self.minsize = min(minsize, maxsize)
+        self.timeout = timeout
+        self.idle = idle
+        self.validate = validate
+        self.validateInterval = validateInterval
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._validator = None
+        self._stop = threading.Event()
+        self._stats = dict(created=0, closed=0, checkouts=0, waits=0, timeouts=0, evicted=0, invalid=0)
+
+
+    def checkout(self):
+        """
+        Returns an idle connection or opens a new one. Waits `timeout` seconds if the
+        pool is exhausted and raises OperationalError if no connection gets available.
+        """
+        if self.validate and self.validateInterval > 0 and not self._validator:
+            self._startValidator()
+        while True:
+            conn = self._take()
+            if conn is None:
+                # open the new connection outside the lock
+                try:
+                    conn = self.factory()
+                except:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["created"] += 1
+                    self._stats["checkouts"] += 1
+                return conn
+            if self.validate and self.validateInterval <= 0 and not self.validate(conn):
+                with self._cond:
+                    self._stats["invalid"] += 1
+                    self._discard(conn)
+                    self._cond.notify()
+                continue
+            return conn
+
+
+    def checkin(self, conn, broken=False):
+        """
+        Returns the connection to the pool. Broken connections are closed.
+        """
+        if not broken:
+            try:
+                conn.rollback()
+            except:
+                broken = True
+        with self._cond:
+            if broken or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time()))
+            self._cond.notify()
+
+
+    def fill(self):
+        """
+        Opens connections until `minsize` connections are available.
+        """
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.minsize:
+                    return
+                self._size += 1
+            try:
+                conn = self.factory()
+            except:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+                self._idle.append((conn, time()))
+                self._cond.notify()
+
+
+    def close(self):
+        """
+        Closes all idle connections and the pool. Connections in use are closed on checkin.
+        """
+        self._stop.set()
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+            self._cond.notify_all()
+
+
+    def validateIdle(self):
+        """
+        Validates connections idle for `validateInterval` seconds or longer and closes broken 
+        or expired connections. Connections are validated one at a time, so the other idle
+        connections can be checked out meanwhile. Called by the background thread.
+        """
+        limit = time() - self.validateInterval
+        checked = set()
+        while True:
+            with self._cond:
+                self._evict()
+                item = None
+                # idle connections are sorted by checkin time
+                for i, (conn, t) in enumerate(self._idle):
+                    if t > limit:
+                        break
+                    if id(conn) not in checked:
+                        item = self._idle.pop(i)
+                        break
+                if item is None:
+                    return
+            conn, t = item
+            checked.add(id(conn))
+            valid = self.validate(conn)
+            with self._cond:
+                if not valid:
+                    self._stats["invalid"] += 1
+                    self._discard(conn)
+                elif self._closed:
+                    self._discard(conn)
+                else:
+                    self._idle.append(item)
+                    self._idle.sort(key=lambda c: c[1])
+                self._cond.notify()
+
+
+    def stats(self):
+        """
+        Returns pool statistics as dictionary ::
+
+            size, idle, inuse, maxsize, created, closed, checkouts, waits, timeouts, evicted, invalid
+        """
+        with self._cond:
+            s = self._stats.copy()
+            s["size"] = self._size
+            s["idle"] = len(self._idle)
+            s["inuse"] = self._size - len(self._idle)
+            s["maxsize"] = self.maxsize
+        return s
+
+
+    def _take(self):
+        # returns an idle connection or None if a new connection can be opened.
+        # waits if the pool is exhausted.
+        deadline = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise OperationalError, "Connection pool is closed"
+                self._evict()
+                if self._idle:
+                    self._stats["checkouts"] += 1
+                    return self._idle.pop()[0]
+                if self._size < self.maxsize:
+                    self._size += 1
+                    return None
+                if deadline is None:
+                    deadline = time() + self.timeout
+                    self._stats["waits"] += 1
+                remaining = deadline - time()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise OperationalError, "Connection pool exhausted (%d connections)" % (self.maxsize)
+                self._cond.wait(remaining)
+
+    def _evict(self):
+        # close connections idle for longer than `idle` seconds. oldest connections first.
+        # has to be called with lock.
+        if not self.idle:
+            return
+        limit = time() - self.idle
+        while self._idle and self._idle[0][1] < limit and self._size > self.minsize:
+            self._stats["evicted"] += 1
+            self._discard(self._idle.pop(0)[0])
+
+    def _discard(self, conn):
+        # has to be called with lock
+        self._size -= 1
+        self._stats["closed"] += 1
+        try:
+            conn.close()
+        except:
+            pass
+
+    def _startValidator(self):
+        with self._cond:
+            if self._validator:
+                return
+            self._validator = threading.Thread(target=self._validateLoop, name="nive.ConnectionPool")
+            self._validator.daemon = True
+        self._validator.start()
+
+    def _validateLoop(self):
+        while not self._stop.wait(self.validateInterval):
+            try:
+                self.validateIdle()
+            except:
+                pass
+
+
+class ConnectionPooled(Connection):
+    """
+    Checks out database connections from a bounded connection pool shared by all threads.
+    Connections are bound to the current request and returned to the pool when the request 
+    is finished. Uses thread local stack as fallback (e.g testing). Call close() to return
+    the connection of the current thread.
+    
+    Pool settings are taken from the database configuration: poolSize, poolMinSize, poolTimeout, 
+    poolIdle, poolValidate. Use `pool.stats()` to get pool statistics.
+    
+    Subclasses have to provide `PrivateConnection()` or `_PoolConnection()` to open new 
+    connections and have to be listed before the database specific connection class.
+    """
+
+    def __init__(self, config = None, connectNow = True):
+        self.local = threading.local()
+        Connection.__init__(self, config, False)
+        validate = None
+        if config.get("verifyConnection") or config.get("poolValidate", 60) > 0:
+            validate = self._validate
+        self.pool = ConnectionPool(self._PoolConnection, 
+                                   maxsize=config.get("poolSize", 10), 
+                                   minsize=config.get("poolMinSize", 0), 
+                                   timeout=config.get("poolTimeout", 10), 
+                                   idle=config.get("poolIdle", 300), 
+                                   validate=validate,
+                                   validateInterval=config.get("poolValidate", 60))
+        if connectNow:
+            self.pool.fill()
+
+    def __del__(self):
+        # connections are closed by the pool
+        pass
+
+    def connect(self):
+        """ Check out a connection from the pool. A previously used connection is closed. """
+        db = self._get(False)
+        if db:
+            self._release(True)
+        db = self.pool.checkout()
+        self._set(db)
+        return db
+
+    def close(self):
+        """ Return the connection to the pool """
+        self._release(False)
+
+    def VerifyConnection(self):
+        """ 
+        Checks out a connection if none is used. Idle connections are validated by the 
+        connection pool.
+        """
+        if not self._get(False):
+            self.connect()
+        return True
+
+    def GetPoolStats(self):
+        """ returns the connection pool statistics """
+        return self.pool.stats()
+
+    def _PoolConnection(self):
+        # opens a new connection for the pool
+        return self.PrivateConnection()
+
+    def _validate(self, conn):
+        try:
+            c = conn.cursor()
+            c.execute(u"SELECT 1")
+            c.close()
+            conn.rollback()
+            return True
+        except:
+            return False
+
+    def _get(self, connect=True):
+        # get stored database connection
+        req = get_current_request()
+        if not req:
+            # use thread local stack as fallback
+            db = getattr(self.local, "db", None)
+        else:
+            try:
+                db = req.__nive_dbpool__.get(self.configuration.dbName)
+            except AttributeError:
+                db = None
+        if not db and connect:
+            return self.connect()
+        return db
+
+    def _set(self, dbconn):
+        # store database connection
+        req = get_current_request()
+        if not req:
+            self.local.db = dbconn
+            return
+        if not hasattr(req, "__nive_dbpool__"):
+            req.__nive_dbpool__ = {}
+        if not req.__nive_dbpool__.get(self.configuration.dbName):
+            req.add_finished_callback(self._finished)
+        req.__nive_dbpool__[self.configuration.dbName] = dbconn
+
+    def _release(self, broken):
+        db = self._get(False)
+        if not db:
+            return
+        req = get_current_request()
+        if not req:
+            self.local.db = None
+        else:
+            req.__nive_dbpool__[self.configuration.dbName] = None
+        self.pool.checkin(db, broken)
+
+    def _finished(self, request):
+        try:
+            db = request.__nive_dbpool__.get(self.configuration.dbName)
+        except AttributeError:
+            return
+        if db:
+            request.__nive_dbpool__[self.configuration.dbName] = None
+            self.pool.checkin(db)
+
+
+
+class ConnectionReplicated(Connection):
+    """
+    Routes read only statements to replica databases. The primary connection is handled by 
+    the database specific connection class this class is combined with. Replicas are
+    configured as list of connection values in `DatabaseConf.replicas` e.g. ::
+    
+        replicas = [{"host": "replica1"}, {"host": "replica2", "port": 3307}]
+    
+    Values not set are taken from the primary configuration. Each request uses one replica
+    checked out from a connection pool per replica (see `ConnectionPooled` for pool settings).
+    After the first write statement all statements of the request are executed by the
+    primary, so the request reads its own writes even after commit. Without request the
+    primary is used until close() is called. If no replica is available the primary is used.
+    
+    Subclasses have to set `ReplicaConnection` to the database specific connection class and 
+    call `InitReplicas()` in `__init__`.
+    """
+    ReplicaConnection = None
+    _next = count()
+
+    def InitReplicas(self):
+        config = self.configuration
+        self.replicas = []
+        for values in config.get("replicas") or []:
+            rconf = config.copy(**values)
+            rconf.replicas = []
+            conn = self.ReplicaConnection(rconf, False)
+            self.replicas.append(ConnectionPool(conn.PrivateConnection, 
+                                                maxsize=rconf.get("poolSize", 10), 
+                                                minsize=0, 
+                                                timeout=rconf.get("poolTimeout", 10), 
+                                                idle=rconf.get("poolIdle", 300), 
+                                                validate=self._validateReplica,
+                                                validateInterval=0))
+            
+    # dbapi like functions --------------------------------------------------------------
+
+    def cursor(self):
+        if self.collector:
+            return CollectorCursor(RoutingCursor(self), self.collector)
+        return RoutingCursor(self)
+
+    def commit(self):
+        """ Calls commit on the primary if used """
+        if self._state().sticky:
+            super(ConnectionReplicated, self).commit()
+
+    def rollback(self):
+        """ Calls rollback on the primary if used """
+        if self._state().sticky:
+            super(ConnectionReplicated, self).rollback()
+
+    def close(self):
+        """ Close the primary database connection and return the replica to the pool """
+        self._releaseReplica(self._state())
+        self._state().sticky = False
+        super(ConnectionReplicated, self).close()
+
+    # routing ---------------------------------------------------------------------------
+
+    def _route(self, sql):
+        # returns the dbapi connection to execute the statement
+        state = self._state()
+        if not state.sticky and self.replicas and IsReadStatement(sql):
+            db = self._replica(state)
+            if db:
+                return db
+        if not IsReadStatement(sql):
+            state.sticky = True
+        return self._get() or self.connect()
+
+    def _replica(self, state):
+        if state.replica:
+            return state.replica[1]
+        pool = self.replicas[self._next.next() % len(self.replicas)]
+        try:
+            db = pool.checkout()
+        except:
+            # use the primary if the replica is not available
+            return None
+        state.replica = (pool, db)
+        return db
+
+    def _releaseReplica(self, state):
+        if state.replica:
+            pool, db = state.replica
+            state.replica = None
+            pool.checkin(db)
+
+    def _state(self):
+        # routing state of the current request or thread
+        req = get_current_request()
+        if not req:
+            # use thread local stack as fallback
+            if not hasattr(self.local, "route"):
+                self.local.route = RoutingState()
+            return self.local.route
+        if not hasattr(req, "__nive_route__"):
+            req.__nive_route__ = {}
+        state = req.__nive_route__.get(self.configuration.dbName)
+        if not state:
+            state = req.__nive_route__[self.configuration.dbName] = RoutingState()
+            req.add_finished_callback(lambda request: self._releaseReplica(state))
+        return state
+
+    def _validateReplica(self, conn):
+        try:
+            c = conn.cursor()
+            c.execute(u"SELECT 1")
+            c.close()
+            conn.rollback()
+            return True
+        except:
+            return False
+
+
+class RoutingState(object):
+    """
+    Replica and primary usage of a request
+    """
+    def __init__(self):
+        self.sticky = False
+        self.replica = None
+
+
+class RoutingCursor(object):
+    """
+    Cursor routing each statement to the dbapi connection returned by `connection._route(sql)`.
+    Used to split read and write statements.
+    """
+    
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = None
+        self._db = None
+
+    def execute(self, sql, *values):
+        return self._get(sql).execute(sql, *values)
+
+    def executemany(self, sql, values):
+        return self._get(sql).executemany(sql, values)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, *size):
+        return self._cursor.fetchmany(*size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        if self._cursor:
+            self._cursor.close()
+            self._cursor = None
+            self._db = None
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def _get(self, sql):
+        db = self.connection._route(sql)
+        if db is not self._db:
+            if self._cursor:
+                self._cursor.close()
+            self._cursor = db.cursor()
+            self._db = db
+        return self._cursor
+
+
+readStatements = (u"SELECT", u"WITH", u"EXPLAIN")
+_statement = re.compile(r"\s*(\w*)")
+
+def IsReadStatement(sql):
+    """
+    Returns True for statements not changing the database. Locking selects are handled as
+    write statements.
+    """
+    if not _statement.match(sql).group(1).upper() in readStatements:
+        return False
+    sql = sql.upper()
+    return sql.find(u"FOR UPDATE")==-1 and sql.find(u"LOCK IN SHARE MODE")==-1
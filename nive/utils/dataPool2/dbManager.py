@@ -43,6 +43,12 @@ except:
     #print "MySQLdb not imported!"
 
 
+# placeholders and limit values in statements passed to Explain()
+_placeholders = re.compile(r"\?|%s")
+_limits = re.compile(r"\b(LIMIT|OFFSET)\s+(?:\?|%s)(\s*,\s*(?:\?|%s))?", re.I)
+_planStep = re.compile(r"(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS (\w+))?")
+_planIndex = re.compile(r"USING (?:AUTOMATIC )?(?:COVERING )?INDEX (\w+)")
+
 
 class MySQLManager(object):
     """
@@ -443,6 +449,145 @@ class MySQLManager(object):
         return True
 
 
+    # Indexes --------------------------------------------------------------
+
+    def ConvertConfToIndexes(self, tableName, fields, indexes=None):
+        """
+        Converts index settings to a list of index definitions {id, fields, unique}. ::
+        
+            fields = list of FieldConf. Fields are indexed if `FieldConf.index` is True or 
+                     "unique". ID references (datatype unit) are indexed by default.
+            indexes = list of composite indexes. Either a list of field ids or a dictionary 
+                     e.g. {"fields": ("pool_unitref", "pool_sort"), "unique": False, "id": ""}.
+        
+        Index ids default to tablename_field1_field2.
+        """
+        result = []
+        for f in fields or ():
+            index = f.get("index")
+            if index is None:
+                index = f.get("datatype") == "unit"
+            if not index:
+                continue
+            result.append(self._IndexDef(tableName, {"fields": (f["id"],), "unique": index==u"unique"}))
+        for index in indexes or ():
+            if isinstance(index, (list, tuple)):
+                index = {"fields": index}
+            result.append(self._IndexDef(tableName, index))
+        return result
+
+
+    def UpdateIndexes(self, tableName, indexes, modify=False):
+        """
+        Creates missing indexes. If modify is True indexes with different settings are 
+        dropped and created again. Existing indexes not included in `indexes` are not changed.
+        
+        returns list of created index ids
+        """
+        if not self.IsDB():
+            return []
+        existing = self.GetIndexes(tableName)
+        created = []
+        for index in indexes:
+            current = existing.get(index["id"])
+            if current:
+                if current["fields"] == index["fields"] and current["unique"] == index["unique"]:
+                    continue
+                if not modify:
+                    continue
+                self.DropIndex(tableName, index["id"])
+            self.CreateIndex(tableName, index["id"], index["fields"], index["unique"])
+            created.append(index["id"])
+        return created
+
+
+    def GetIndexes(self, tableName):
+        """
+        returns a dict of indexes except the primary key {id: {id, fields, unique}}
+        """
+        if not self.IsDB():
+            return {}
+        self.db.execute(u"show index from %s" % (tableName))
+        indexes = {}
+        # Table, Non_unique, Key_name, Seq_in_index, Column_name
+        for c in self.db.fetchall():
+            if c[2] == u"PRIMARY":
+                continue
+            if not c[2] in indexes:
+                indexes[c[2]] = {"id": c[2], "fields": [], "unique": not c[1]}
+            indexes[c[2]]["fields"].append((c[3], c[4]))
+        for index in indexes.values():
+            index["fields"] = tuple([f[1] for f in sorted(index["fields"])])
+        return indexes
+
+
+    def CreateIndex(self, tableName, indexName, fields, unique=False):
+        if not self.IsDB():
+            return False
+        unique = unique and u"UNIQUE " or u""
+        self.db.execute(u"create %sindex %s on %s (%s)" % (unique, indexName, tableName, u",".join(fields)))
+        return True
+
+
+    def DropIndex(self, tableName, indexName):
+        if not self.IsDB():
+            return False
+        self.db.execute(u"drop index %s on %s" % (indexName, tableName))
+        return True
+
+
+    def _IndexDef(self, tableName, index):
+        fields = tuple(index["fields"])
+        name = index.get("id") or (u"%s_%s" % (tableName, u"_".join(fields)))[:64]
+        return {"id": name, "fields": fields, "unique": bool(index.get("unique"))}
+
+
+    # Query plans --------------------------------------------------------------
+
+    def Explain(self, sql, values=None):
+        """
+        Runs EXPLAIN for the select statement and returns the query plan as list of 
+        steps {table, index, scan, temp, filesort, detail}. ::
+        
+            table    = table name or alias
+            index    = name of the used index
+            scan     = all rows of the table are read
+            temp     = a temporary table is used
+            filesort = the result is sorted in an extra step
+            detail   = database specific description of the step
+        
+        Placeholders can be ? or %s. If values is None placeholders and limits are 
+        replaced by dummy values.
+        """
+        if not self.IsDB():
+            return []
+        sql, values = self._ExplainValues(sql, values, u"%s")
+        self.db.execute(u"EXPLAIN " + sql, values)
+        names = [d[0].lower() for d in self.db.description]
+        plan = []
+        for r in self.db.fetchall():
+            r = dict(zip(names, r))
+            extra = r.get("extra") or u""
+            plan.append({"table": r.get("table"), 
+                         "index": r.get("key"), 
+                         "scan": r.get("type") == u"ALL", 
+                         "temp": extra.find(u"Using temporary") != -1,
+                         "filesort": extra.find(u"Using filesort") != -1,
+                         "detail": u"type=%s key=%s rows=%s %s" % (r.get("type"), r.get("key"), r.get("rows"), extra)})
+        return plan
+
+
+    def _ExplainValues(self, sql, values, placeholder):
+        if values is None:
+            def limit(m):
+                if m.group(2):
+                    return u"%s 0, 1" % m.group(1)
+                return u"%s 1" % m.group(1)
+            sql = _limits.sub(limit, sql)
+            values = [u"1"] * len(_placeholders.findall(sql))
+        return _placeholders.sub(placeholder, sql), tuple(values)
+
+
     # physical database structure ----------------------------------------------------------------
 
     def GetDatabases(self):
@@ -780,6 +925,67 @@ class Sqlite3Manager(MySQLManager):
         return self.CreateColumn(tableName, columnName, u"INTEGER PRIMARY KEY AUTOINCREMENT")
 
 
+    # Indexes --------------------------------------------------------------
+
+    def GetIndexes(self, tableName):
+        """
+        returns a dict of indexes except automatic indexes {id: {id, fields, unique}}
+        """
+        if not self.IsDB():
+            return {}
+        self.db.execute(u"PRAGMA index_list(%s)" % (tableName))
+        indexes = {}
+        # seq, name, unique
+        for c in self.db.fetchall():
+            if c[1].startswith(u"sqlite_autoindex"):
+                continue
+            indexes[c[1]] = {"id": c[1], "fields": None, "unique": bool(c[2])}
+        for index in indexes.values():
+            self.db.execute(u"PRAGMA index_info(%s)" % (index["id"]))
+            # seqno, cid, name
+            index["fields"] = tuple([c[2] for c in sorted(self.db.fetchall())])
+        return indexes
+
+
+    def DropIndex(self, tableName, indexName):
+        if not self.IsDB():
+            return False
+        self.db.execute(u"drop index %s" % (indexName))
+        return True
+
+
+    # Query plans --------------------------------------------------------------
+
+    def Explain(self, sql, values=None):
+        """
+        Runs EXPLAIN QUERY PLAN for the select statement. See MySQLManager.Explain().
+        Automatic indexes created by sqlite for the query are reported as temp.
+        """
+        if not self.IsDB():
+            return []
+        sql, values = self._ExplainValues(sql, values, u"?")
+        self.db.execute(u"EXPLAIN QUERY PLAN " + sql, values)
+        plan = []
+        for r in self.db.fetchall():
+            detail = r[-1]
+            step = {"table": None, "index": None, "scan": False, "temp": False, "filesort": False, "detail": detail}
+            m = _planStep.match(detail)
+            if m:
+                step["table"] = m.group(3) or m.group(2)
+                index = _planIndex.search(detail)
+                if index:
+                    step["index"] = index.group(1)
+                step["scan"] = m.group(1) == u"SCAN" and detail.find(u" USING ") == -1
+                step["temp"] = detail.find(u"AUTOMATIC") != -1
+            elif detail.startswith(u"USE TEMP B-TREE"):
+                if detail.find(u"ORDER BY") != -1:
+                    step["filesort"] = True
+                else:
+                    step["temp"] = True
+            plan.append(step)
+        return plan
+
+
     # Database Options ------------------------------------------------------------
 
     def IsDatabase(self, databaseName):
@@ -17,13 +17,19 @@
 
 import weakref
 import os
+import threading
 import uuid
+import shutil
+import hashlib
 from StringIO import StringIO
 
 from zope.interface import implements
 
 from nive.utils.path import DvPath
-from nive.definitions import IFileStorage
+from nive.definitions import IFileStorage, ConfigurationError
+from nive.utils.dataPool2.trashcan import TrashcanPurger
+
+_purgerLock = threading.Lock()
 
 # FileManager Constants ---------------------------------------------------------------------------
 
@@ -36,6 +42,9 @@ class File(object):
     - BlobFile: Files stored as Blob files in filesystem
     - TempFile: Temp files to be stored
     
+    `digest` is the SHA-256 digest of the file data and set when the file is written.
+    If the pool uses the content store, files are stored once by digest. 
+    
     Pass a dictionry to set all attributes as filemeta
     """
     implements(IFileStorage)
@@ -51,7 +60,8 @@ class File(object):
                  uid="", 
                  tempfile=False, 
                  filedict=None, 
-                 fileentry=None):
+                 fileentry=None,
+                 digest=""):
         self.filekey = filekey
         self.filename = filename
         self.file = file
@@ -61,6 +71,7 @@ class File(object):
         self.path = path
         self.extension = extension
         self.tempfile = tempfile
+        self.digest = digest
         if fileentry:
             self.fileentry = weakref.ref(fileentry)
         else:
@@ -144,6 +155,12 @@ class File(object):
     def isTempFile(self):
         return self.tempfile
     
+    def isBlob(self):
+        """
+        True if the file is stored in the content store and may be shared by other entries
+        """
+        return (self.path or u"").lstrip(u"/").startswith(FileManager.BlobDirectory+u"/")
+    
     def exists(self):
         """
         check if the file physically exists
@@ -186,6 +203,9 @@ class File(object):
         if self.size and self.size > maxFileSize:
             raise IOError, "File too big"
 
+        if fileentry.pool.useContentStore:
+            return self._commitBlob(fileentry)
+
         # create temp path for current
         backupPath = None
         originalPath = DvPath(self._Path())
@@ -198,26 +218,8 @@ class File(object):
         if tempPath.Exists():
             tempPath.Delete()
         tempPath.CreateDirectories()
-        size = 0
-        try:
-            out = open(tempPath.GetStr(), "wb")
-            data = self.read(10000)
-            while data:
-                size += len(data)
-                if maxFileSize and size > maxFileSize:
-                    raise IOError, "File too big"
-                out.write(data)
-                data = self.read(10000)
-            out.close()
-            #file.close()
-        except Exception, e:
-            try:    self.file.close()
-            except: pass
-            try:    out.close()
-            except: pass
-            # reset old file
-            tempPath.Delete()
-            raise Exception, e
+        hash = hashlib.sha256()
+        size = self._write(tempPath, maxFileSize, hash)
 
         # store path for cleanup on success
         if str(originalPath) and originalPath.Exists():
@@ -235,6 +237,7 @@ class File(object):
             # update meta properties
             self.path = fileentry._RelativePath(str(newPath))
             self.size = size
+            self.digest = hash.hexdigest()
             return True
         except:
             tempPath.Delete()
@@ -245,6 +248,9 @@ class File(object):
     def delete(self):
         if not self.path:
             return True
+        if self.isBlob():
+            # content store files are removed with the last file record. see FileManager.ReleaseBlob()
+            return True
         originalPath = DvPath(self._Path())
         if not originalPath.IsFile():
             #not a file
@@ -255,6 +261,82 @@ class File(object):
         return True
 
     
+    def _commitBlob(self, fileentry):
+        """
+        Writes the file to the content store. The path is created from the SHA-256 
+        digest of the file data. If the same data is already stored the existing file is
+        referenced. The new file is kept as `file.blobTemp` until the record is committed
+        in case the existing one is released in the meantime (see `restoreBlob()`).
+        """
+        pool = fileentry.pool
+        tempPath = pool._GetBlobDirectory()
+        tempPath.SetName(u"_temp_" + unicode(uuid.uuid4()))
+        tempPath.CreateDirectories()
+        hash = hashlib.sha256()
+        size = self._write(tempPath, fileentry.maxFileSize, hash)
+        digest = hash.hexdigest()
+        newPath = DvPath(pool._GetBlobPath(digest))
+        try:
+            if newPath.IsFile():
+                # already stored
+                self.blobTemp = str(tempPath)
+            else:
+                os.renames(str(tempPath), str(newPath))
+        except:
+            tempPath.Delete()
+            raise
+        # update meta properties
+        self.path = fileentry._RelativePath(str(newPath))
+        self.size = size
+        self.digest = digest
+        return True
+
+
+    def restoreBlob(self):
+        """
+        Moves the kept file data to the content store path if the stored file has been 
+        released by another entry after it was referenced by this file. 
+        """
+        temp = getattr(self, "blobTemp", None)
+        if not temp or not os.path.isfile(temp):
+            return False
+        path = self.fileentry().pool._GetBlobPath(self.digest)
+        if os.path.isfile(path):
+            return False
+        os.renames(temp, path)
+        return True
+
+
+    def _write(self, path, maxFileSize, hash=None):
+        """
+        Writes the file data to path and returns the number of bytes written.
+        Data is added to the hash object if set.
+        """
+        size = 0
+        try:
+            out = open(path.GetStr(), "wb")
+            data = self.read(10000)
+            while data:
+                size += len(data)
+                if maxFileSize and size > maxFileSize:
+                    raise IOError, "File too big"
+                if hash:
+                    hash.update(data)
+                out.write(data)
+                data = self.read(10000)
+            out.close()
+            #file.close()
+        except Exception, e:
+            try:    self.file.close()
+            except: pass
+            try:    out.close()
+            except: pass
+            # reset old file
+            path.Delete()
+            raise Exception, e
+        return size
+
+
     # file class dictionary support ---------------------------------------
 
     def __iter__(self):
@@ -329,13 +411,42 @@ class FileManager(object):
     id_filekey_version
 
     directory structure:
-    root/id[-4:-2]00/id_filekey_version.ext
+    root/id[-4:-2]00/id[-2:]/id_filekey_version.ext
+
+    If the pool option `directoryDepth` is set, files are stored in `directoryDepth` levels
+    of directories named by `directoryWidth` digits of the id starting with the last digits.
+    E.g. depth 3 and width 2:
+    root/id[-2:]/id[-4:-2]/id[-6:-4]/id_filekey_version.ext
+
+    The path is stored in the file record. Existing files keep their location until moved 
+    with `RelocateFiles()`.
+
+    Content store (pool option `contentStore`):
+    Files are stored once by SHA-256 digest of the file data. Identical uploads and 
+    duplicated entries reference the same file. The digest is stored in `pool_files.digest`
+    and the number of records with the same digest is used as reference count. The file
+    is removed (or moved to the trashcan) if the last record is deleted. Replaced and 
+    deleted files are released after the transaction is committed (see `Commit()`).
+    
+    directory structure:
+    root/_blobs/digest[:2]/digest[2:4]/digest
+
+    Trashcan (pool option `useTrashcan`):
+    Deleted files are moved to root/_trashcan. Files older than `trashcanRetention` seconds
+    are removed by the trashcan purger. If `trashcanQueue` is set, moves are processed in 
+    the background. See `GetTrashcanPurger()`.
     """
 
     DirectoryCnt = -4                 # directory id range limit
     FileTable = u"pool_files"    # file table name
     FileTableFields = (u"id", u"fileid", u"filekey", u"path", u"filename", u"size", u"extension", u"version")
     Trashcan = u"_trashcan"
+    BlobDirectory = u"_blobs"    # content store directory
+    directoryDepth = 0           # directory levels. 0 = id[-4:-2]00/id[-2:]
+    directoryWidth = 2           # id digits per directory level
+    _purger = None
+    _released = None             # thread local list of files to release on commit
+    _fileDigests = None          # None = check the file table on first use
     
     def GetFileClass(self):
         """
@@ -347,12 +458,16 @@ class FileManager(object):
         """
         Set the local root path for files
         """
+        self._released = threading.local()
         self.root = DvPath()
         self.root.SetStr(root)
         if root == u"":
             return
         self.root.AppendSeperator()
         self.root.CreateDirectoriesExcp()
+        if self.useTrashcan and self.trashcanRetention:
+            # starts the background purger
+            self.GetTrashcanPurger()
 
 
     def SearchFilename(self, filename):
@@ -366,7 +481,7 @@ class FileManager(object):
         """
         search files
         """
-        flds = self.FileTableFields
+        flds = self.GetFileFields()
         kw["singleTable"] = 1
         sql, values = self.FmtSQLSelect(flds, parameter, dataTable=self.FileTable, sort = sort, start=start, max=max, ascending = ascending, **kw)
         files = self.Query(sql, values)
@@ -384,33 +499,324 @@ class FileManager(object):
         if not files:
             return True
         entry = self.GetEntry(id, version=version)
+        blobs = []
         for f in files:
             file = self.GetFileClass()(filedict=f,fileentry=entry)
+            if file.isBlob():
+                blobs.append(file.digest)
             file.delete()
         if len(files):
             sql = u"delete from %s where id = %d" % (self.FileTable, id)
             self.Query(sql, cursor=cursor, getResult=False)
+        for digest in blobs:
+            self.ReleaseOnCommit(id, digest=digest)
         return True
 
 
+    def GetFilesBatch(self, ids):
+        """
+        Loads the file records of multiple entries in as few queries as possible. 
+        Returns a dictionary {id: [file records]}. 
+        """
+        result = {}
+        flds = self.GetFileFields()
+        for chunk in self._Chunks(ids):
+            parameter = {u"id": chunk}
+            operators = {u"id": u"IN"}
+            sql, values = self.FmtSQLSelect(flds, parameter=parameter, dataTable=self.FileTable, operators=operators, singleTable=1)
+            for r in self.Query(sql, values):
+                f = self.ConvertRecToDict(r, flds)
+                result.setdefault(f[u"id"], []).append(f)
+        return result
+
+
+    def GetFileFields(self):
+        """
+        Returns the file table fields. `digest` is included if the column exists. 
+        """
+        if self.SupportsFileDigests():
+            return self.FileTableFields + (u"digest",)
+        return self.FileTableFields
+
+
+    def SupportsFileDigests(self):
+        """
+        Returns True if the file table has the `digest` column. Databases created before 
+        file digests were added have to be updated with dbStructureUpdater to store digests
+        and use the content store. The check is performed once and cached.
+        """
+        if self._fileDigests is None:
+            cursor = self.connection.cursor()
+            try:
+                try:
+                    cursor.execute(u"select digest from %s where fileid=0" % (self.FileTable))
+                    cursor.fetchall()
+                    self._fileDigests = True
+                except (self._OperationalError, self._ProgrammingError):
+                    self._fileDigests = False
+            finally:
+                cursor.close()
+        if not self._fileDigests and self.useContentStore:
+            raise ConfigurationError, "Content store requires the column %s.digest. Update the database structure with dbStructureUpdater." % (self.FileTable)
+        return self._fileDigests
+
+
+    def FileReferences(self, digest, cursor=None):
+        """
+        Returns the number of file records referencing the content store file
+        """
+        sql = u"select count(*) from %s where digest = %s" % (self.FileTable, self.placeholder)
+        return self.Query(sql, [digest], cursor=cursor)[0][0]
+
+
+    def GetTrashcanPurger(self):
+        """
+        Returns the trashcan purger. The purger is created on first use and the background
+        thread started if files are queued or a retention is set. See `trashcan.TrashcanPurger`.
+        """
+        if self._purger:
+            return self._purger
+        _purgerLock.acquire()
+        try:
+            if not self._purger:
+                aP = DvPath()
+                aP.SetStr(str(self.root))
+                aP.AppendSeperator()
+                aP.AppendDirectory(self.Trashcan)
+                self._purger = TrashcanPurger(aP.GetStr(), 
+                                              retention=self.trashcanRetention, 
+                                              interval=self.trashcanInterval)
+                if self.trashcanQueue or self.trashcanRetention:
+                    self._purger.Start()
+        finally:
+            _purgerLock.release()
+        return self._purger
+
+
+    def RelocateFiles(self, start=0, batchSize=100):
+        """
+        Moves the files of up to `batchSize` file records with fileid > `start` to the 
+        directory layout currently configured and updates `pool_files.path`. New files are
+        linked (or copied) first and the old files removed after the changed records are 
+        committed. Records changed in the meantime are skipped. Content store files are not 
+        moved. Returns a dictionary ::
+
+            files  = number of processed file records
+            moved  = number of relocated files
+            errors = number of files which could not be relocated
+            last   = last processed fileid. Pass as `start` to process the next batch. 0 if done.
+        """
+        result = dict(files=0, moved=0, errors=0, last=0)
+        sql = u"select fileid, id, path from %s where fileid > %d order by fileid limit %d" % (self.FileTable, start, batchSize)
+        records = self.Query(sql)
+        if not records:
+            return result
+        result["files"] = len(records)
+        result["last"] = records[-1][0]
+        root = str(self.root)
+        relocated = []
+        for fileid, id, path in records:
+            if not path or File(path=path).isBlob():
+                continue
+            old = DvPath(path)
+            if path[:len(root)] != root:
+                old = DvPath(root)
+                old.AppendSeperator()
+                old.Append(path)
+            new = DvPath(root)
+            new.AppendSeperator()
+            new.AppendDirectory(self._GetDirectory(id))
+            new.AppendSeperator()
+            new.SetNameExtension(old.GetNameExtension())
+            if str(old) == str(new) or not old.IsFile():
+                continue
+            try:
+                if new.Exists():
+                    new.Delete()
+                new.CreateDirectories()
+                self._LinkFile(str(old), str(new))
+            except (IOError, OSError):
+                result["errors"] += 1
+                continue
+            relocated.append((fileid, path, old, new))
+        if not relocated:
+            return result
+
+        # update the records and remove the old files after commit
+        cursor = self.connection.cursor()
+        ph = self.placeholder
+        sql = u"update %s set path=%s where fileid=%s and path=%s" % (self.FileTable, ph, ph, ph)
+        changed = []
+        try:
+            for fileid, path, old, new in relocated:
+                cursor.execute(sql, (str(new)[len(root):].replace(u"\\", u"/"), fileid, path))
+                if cursor.rowcount == 0:
+                    # changed in the meantime
+                    new.Delete()
+                    continue
+                changed.append((old, new))
+            self.Commit()
+        except:
+            self.Undo()
+            for fileid, path, old, new in relocated:
+                new.Delete()
+            raise
+        finally:
+            cursor.close()
+        for old, new in changed:
+            old.Delete()
+            self._RemoveEmptyDirectories(os.path.dirname(str(old)))
+        result["moved"] = len(changed)
+        return result
+
+
+    def Commit(self, user=""):
+        """
+        Commit the changes made to the database and release the files replaced or deleted
+        in the transaction. See `ReleaseOnCommit()`.
+        """
+        super(FileManager, self).Commit(user)
+        released = getattr(self._released, "files", None)
+        if not released:
+            return
+        self._released.files = []
+        for id, digest, path in released:
+            self.ReleaseFile(id, digest, path)
+
+    def Undo(self):
+        """
+        Rollback the changes made to the database. Files to be released are kept.
+        """
+        if self._released is not None:
+            self._released.files = []
+        super(FileManager, self).Undo()
+
+
+    def ReleaseOnCommit(self, id, digest=None, path=None):
+        """
+        Releases the content store file `digest` or moves the file `path` to the trashcan
+        after the current transaction is committed. Nothing is changed if the transaction is
+        rolled back.
+        """
+        if not hasattr(self._released, "files"):
+            self._released.files = []
+        self._released.files.append((id, digest, path))
+
+
+    def ReleaseFile(self, id, digest=None, path=None):
+        """
+        Releases the content store file `digest` or moves the file `path` to the trashcan 
+        of `id`. Call after the file record is committed.
+        """
+        if digest:
+            return self.ReleaseBlob(digest, id)
+        if path:
+            path = DvPath(path)
+            if path.IsFile():
+                return self._MoveToTrashcan(path, id)
+        return False
+
+
+    def ReleaseBlob(self, digest, id, cursor=None):
+        """
+        Removes the content store file if no longer referenced. Call after the deleted or 
+        changed file record is committed. If the trashcan is used, the file is moved to the 
+        trashcan directory of `id`.
+        """
+        if not digest or self.FileReferences(digest, cursor=cursor):
+            return False
+        path = DvPath(self._GetBlobPath(digest))
+        if not path.IsFile():
+            return False
+        # rename and check again. new files may reference the blob in the meantime.
+        staged = DvPath(str(path))
+        staged.SetName(u"_del_" + unicode(uuid.uuid4()))
+        if not path.Rename(str(staged)):
+            return False
+        if self.FileReferences(digest, cursor=cursor):
+            staged.Rename(str(path))
+            return False
+        return self._MoveToTrashcan(staged, id, name=digest)
+
+
     # Internal --------------------------------------------------------------
 
     def _GetDirectory(self, id):
         """
         construct directory path without root
         """
-        return (u"%06d" % (id))[self.DirectoryCnt:-2] + u"00/" + (u"%06d" % (id))[self.DirectoryCnt+2:]
+        depth = self.directoryDepth
+        if not depth:
+            return (u"%06d" % (id))[self.DirectoryCnt:-2] + u"00/" + (u"%06d" % (id))[self.DirectoryCnt+2:]
+        width = self.directoryWidth
+        digits = u"%0*d" % (depth*width, id)
+        end = len(digits)
+        return u"/".join([digits[end-(i+1)*width:end-i*width] for i in range(depth)])
+
+
+    def _LinkFile(self, source, target):
+        # hard links keep the file readable at both paths during relocation
+        try:
+            os.link(source, target)
+        except (AttributeError, OSError):
+            shutil.copy2(source, target)
+
 
+    def _RemoveEmptyDirectories(self, directory):
+        root = os.path.normpath(str(self.root))
+        directory = os.path.normpath(directory)
+        while directory.startswith(root) and directory != root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+
+    def _PrefetchFiles(self, entries):
+        """
+        Loads the files of all entries at once and sets the entries file wrapper 
+        """
+        files = self.GetFilesBatch([e.id for e in entries])
+        fileclass = self.GetFileClass()
+        for e in entries:
+            e.files.SetContent([fileclass(f[u"filekey"], filedict=f, fileentry=e) for f in files.get(e.id, ())], complete=True)
 
-    def _MoveToTrashcan(self, path, id):
+
+    def _GetBlobPath(self, digest):
+        aP = self._GetBlobDirectory()
+        aP.AppendDirectory(digest[:2])
+        aP.AppendSeperator()
+        aP.AppendDirectory(digest[2:4])
+        aP.AppendSeperator()
+        aP.SetName(digest)
+        return aP.GetStr()
+
+
+    def _GetBlobDirectory(self):
+        aP = DvPath()
+        aP.SetStr(str(self.root))
+        aP.AppendSeperator()
+        aP.AppendDirectory(self.BlobDirectory)
+        aP.AppendSeperator()
+        return aP
+
+
+    def _MoveToTrashcan(self, path, id, name=None):
         if not self.useTrashcan:
             return path.Delete()
 
         aP = self._GetTrashcanDirectory(id)
-        aP.SetNameExtension(path.GetNameExtension())
+        aP.SetNameExtension(name or path.GetNameExtension())
+        if self.trashcanQueue:
+            return self.GetTrashcanPurger().Enqueue(str(path), str(aP))
         if aP.Exists():
             aP.Delete()
-        return path.Rename(str(aP))
+        if not path.Rename(str(aP)):
+            return False
+        # the retention starts with the deletion
+        os.utime(str(aP), None)
+        return True
 
 
     def _GetTrashcanDirectory(self, id):
@@ -445,7 +851,8 @@ class FileEntry(object):
             parameter = {}
         parameter[u"id"] = self.id
         operators={u"filekey":u"=", "filename": u"="}
-        sql, values = self.pool.FmtSQLSelect(self.pool.FileTableFields, 
+        flds = self.pool.GetFileFields()
+        sql, values = self.pool.FmtSQLSelect(flds, 
                                              parameter, 
                                              dataTable=self.pool.FileTable, 
                                              operators=operators, 
@@ -455,7 +862,7 @@ class FileEntry(object):
             return []
         files = []
         for f in recs:
-            d = self.pool.ConvertRecToDict(f, self.pool.FileTableFields)
+            d = self.pool.ConvertRecToDict(f, flds)
             file = File(d["filekey"], filedict=d, fileentry=self)
             files.append(file)
         return files
@@ -493,14 +900,25 @@ class FileEntry(object):
         """
         Commit multiple files in a row
         """
-        for key in files:
-            files[key] = self.CommitFile(key, files[key], cursor=cursor)
+        try:
+            for key in files:
+                files[key] = self.CommitFile(key, files[key], cursor=cursor, cleanup=False)
+        except:
+            # the transaction is rolled back. remove content store temp files.
+            for file in files.values():
+                if hasattr(file, "blobTemp"):
+                    DvPath(file.blobTemp).Delete()
+                    del file.blobTemp
+            raise
 
 
-    def CommitFile(self, key, file, cursor=None):
+    def CommitFile(self, key, file, cursor=None, cleanup=True):
         """
         Store the file under key. File can either be a path, dictionary with file informations 
         or a File object.
+        If `cleanup` is False temporary content store files are kept and replaced files
+        released when `Cleanup()` is called after commit. Otherwise replaced files are released
+        by the next `pool.Commit()`.
         """
         if key in (u"", None):
             raise IOError("File key invalid")
@@ -522,10 +940,31 @@ class FileEntry(object):
             file.fileid = fileid
         else:
             fileid = file.fileid
+        # file currently stored for the record
+        replaced = None
+        if fileid:
+            replaced = self._LookupFile(fileid, cursor)
         
         # update file records
         file.commitTemp(self)
         self._UpdateMeta(file, cursor=cursor)
+        if file.isBlob():
+            # the referenced blob may have been released before the record was stored
+            file.restoreBlob()
+            if cleanup:
+                self._CleanupBlob(file)
+        if replaced and replaced.path != file.path:
+            release = None
+            if replaced.isBlob():
+                release = (replaced.digest, None)
+            elif file.isBlob():
+                # file stored before the content store was enabled 
+                release = (None, replaced.abspath())
+            if release:
+                # the replaced file is kept until the record is committed
+                file.releaseOnSuccess = release
+                if cleanup:
+                    self.pool.ReleaseOnCommit(self.id, *release)
         return file
 
 
@@ -536,6 +975,10 @@ class FileEntry(object):
         if not isinstance(files, dict):
             files = {"":files}
         for key, file in files.items():
+            self._CleanupBlob(file)
+            if hasattr(file, "releaseOnSuccess"):
+                self.pool.ReleaseFile(self.id, *file.releaseOnSuccess)
+                del file.releaseOnSuccess
             if not hasattr(file, "deleteOnSuccess"):
                 continue
             path = DvPath(file.deleteOnSuccess)
@@ -558,6 +1001,12 @@ class FileEntry(object):
             if not file.exists():
                 result = False
                 continue
+            if file.isBlob():
+                # content store files are not copied. the new record references the same file.
+                newFile = self.pool.GetFileClass()(filename=file.filename, size=file.size, path=file.path, 
+                                                   extension=file.extension, digest=file.digest, fileentry=newEntry)
+                newEntry.CommitFile(file.filekey, newFile)
+                continue
             newFile = self.pool.GetFileClass()(file=file, filename=file.filename, size=file.size, tempfile=True, fileentry=newEntry)
             try:
                 newEntry.CommitFile(file.filekey, newFile)
@@ -579,6 +1028,8 @@ class FileEntry(object):
             return False
         sql = u"delete from %s where fileid = %d" % (self.pool.FileTable, file.fileid)
         self.pool.Query(sql, getResult=False)
+        if file.isBlob():
+            self.pool.ReleaseOnCommit(self.id, digest=file.digest)
         return True
 
 
@@ -607,6 +1058,8 @@ class FileEntry(object):
             "extension": file.extension,
             "size": file.size
         }
+        if self.pool.SupportsFileDigests():
+            data["digest"] = file.digest
         if file.fileid:
             file.fileid = self.pool.UpdateFields(self.pool.FileTable, file.fileid, data, cursor=cursor, idColumn=u"fileid")
         else:
@@ -623,6 +1076,33 @@ class FileEntry(object):
         if len(f)==0:
             return 0
         return f[0]["fileid"]
+
+
+    def _CleanupBlob(self, file):
+        # removes the content store temp file kept by File._commitBlob()
+        if not hasattr(file, "blobTemp"):
+            return
+        try:
+            file.restoreBlob()
+            DvPath(file.blobTemp).Delete()
+        except:
+            pass
+        del file.blobTemp
+
+
+    def _LookupFile(self, fileid, cursor=None):
+        """
+        lookup path and digest of the file record. returns a File object or None.
+        """
+        flds = u"path"
+        if self.pool.SupportsFileDigests():
+            flds = u"path, digest"
+        sql = u"select %s from %s where fileid = %d" % (flds, self.pool.FileTable, fileid)
+        r = self.pool.Query(sql, cursor=cursor)
+        if not r or not r[0][0]:
+            return None
+        digest = len(r[0]) > 1 and r[0][1] or u""
+        return File(path=r[0][0], digest=digest, fileentry=self)
          
          
     def _GetTrashcanDirectory(self):
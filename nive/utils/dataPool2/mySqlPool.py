@@ -28,6 +28,7 @@ from time import time, localtime
 
 try:
     import MySQLdb
+    import MySQLdb.cursors
 except ImportError:
     # make tests pass without mysql package
     class MySQLdb(object):
@@ -41,8 +42,9 @@ except ImportError:
 from nive.utils.utils import STACKF
 
 from nive.utils.dataPool2.base import Base, Entry
-from nive.utils.dataPool2.base import NotFound
-from nive.utils.dataPool2.connection import Connection, ConnectionThreadLocal, ConnectionRequest
+from nive.utils.dataPool2.base import NotFound, OperationalError
+from nive.utils.dataPool2.connection import Connection, ConnectionThreadLocal, ConnectionRequest, ConnectionPooled
+from nive.utils.dataPool2.connection import ConnectionReplicated
 
 from nive.utils.dataPool2.dbManager import MySQLManager
 from nive.utils.dataPool2.files import FileManager, FileEntry
@@ -152,6 +154,46 @@ class MySqlConnRequest(MySqlConnection, ConnectionRequest):
         MySqlConnection.__init__(self, config, connectNow)
 
 
+class MySqlConnPool(ConnectionPooled, MySqlConnection):
+    """
+    Checks out connections from a bounded connection pool shared by all requests and threads.
+    Connections are returned to the pool when the request is finished. Use 
+    `DatabaseConf.connection = "nive.utils.dataPool2.mySqlPool.MySqlConnPool"` to enable 
+    the pool. See `ConnectionPooled` for settings.
+    """
+
+    def __init__(self, config = None, connectNow = True):
+        ConnectionPooled.__init__(self, config, connectNow)
+
+    def _validate(self, conn):
+        try:
+            conn.ping()
+            return True
+        except:
+            return False
+
+
+class MySqlConnReplicated(ConnectionReplicated, MySqlConnRequest):
+    """
+    Routes read only statements to replicas configured in `DatabaseConf.replicas`. The primary
+    connection is cached as request value like `MySqlConnRequest`. Use 
+    `DatabaseConf.connection = "nive.utils.dataPool2.mySqlPool.MySqlConnReplicated"` to enable 
+    replicas. See `ConnectionReplicated`.
+    """
+    ReplicaConnection = MySqlConnection
+
+    def __init__(self, config = None, connectNow = True):
+        MySqlConnRequest.__init__(self, config, connectNow)
+        self.InitReplicas()
+
+    def _validateReplica(self, conn):
+        try:
+            conn.ping()
+            return True
+        except:
+            return False
+
+
 
 class MySql(FileManager, Base):
     """
@@ -161,12 +203,104 @@ class MySql(FileManager, Base):
     _ProgrammingError = MySQLdb.ProgrammingError
     _Warning = MySQLdb.Warning
     _DefaultConnection = MySqlConnRequest
+    # innodb_autoinc_lock_mode and auto_increment_increment. None = not checked yet
+    _autoincMode = None
+    _autoincStep = 1
+
+
+    def _CheckRecursiveQueries(self):
+        # WITH RECURSIVE is supported since MySql 8.0 and MariaDB 10.2.2
+        aC = self.connection.cursor()
+        aC.execute(u"SELECT VERSION()")
+        version = aC.fetchone()[0]
+        aC.close()
+        mariadb = version.lower().find(u"mariadb") != -1
+        version = tuple([int(v) for v in re.findall(r"\d+", version.split(u"-")[0])[:3]])
+        if mariadb:
+            return version >= (10, 2, 2)
+        return version >= (8, 0, 0)
 
 
     def _GetInsertIDValue(self, cursor):
         cursor.execute(u"SELECT LAST_INSERT_ID()")
         return cursor.fetchone()[0]
 
+    def _EstimateCount(self, sql, values):
+        # uses the row estimates of the query plan
+        c = self.Execute(u"EXPLAIN " + sql, values)
+        names = [d[0].lower() for d in c.description]
+        recs = c.fetchall()
+        c.close()
+        count = None
+        for rec in recs:
+            rows = rec[names.index(u"rows")]
+            if rows is None:
+                # e.g. select tables optimized away
+                continue
+            if u"filtered" in names and rec[names.index(u"filtered")] is not None:
+                rows = rows * float(rec[names.index(u"filtered")]) / 100
+            if count is None:
+                count = rows
+            else:
+                count *= rows
+        if count is None:
+            return None
+        return int(count)
+
+    def _IterCursor(self):
+        # unbuffered server side cursor. Uses a private connection so other queries can
+        # be executed while the result is read.
+        conn = self.connection.PrivateConnection()
+        return conn.cursor(MySQLdb.cursors.SSCursor), conn
+
+    def _InsertMany(self, sql, values, cursor):
+        """
+        Inserts the rows in multi row statements of `BatchSize` rows and returns the new ids.
+        executemany() may split the rows in several statements and LAST_INSERT_ID() only 
+        returns the first id of the last one. So each statement is built and executed here.
+        Ids of one statement are only predictable if innodb_autoinc_lock_mode is 0 or 1 and
+        are `auto_increment_increment` apart. In interleaved mode (2, MySQL 8 default) rows 
+        are inserted one by one.
+        """
+        if self._debug:
+            STACKF(0,sql+"\r\n",self._debug, self._log,name=self.name)
+        ids = []
+        mode, step = self._AutoIncrement(cursor)
+        if mode == 2:
+            for row in values:
+                self._ExecuteInsert(sql, row, cursor)
+                ids.append(cursor.lastrowid)
+            return ids
+        head, row = sql.rsplit(u" VALUES ", 1)
+        for chunk in self._Chunks(values):
+            stmt = u"%s VALUES %s" % (head, u",".join([row]*len(chunk)))
+            self._ExecuteInsert(stmt, [v for r in chunk for v in r], cursor)
+            # the id of the first row of the statement
+            first = cursor.lastrowid
+            ids += range(first, first+len(chunk)*step, step)
+        return ids
+
+    def _ExecuteInsert(self, sql, values, cursor):
+        try:
+            cursor.execute(sql, values)
+        except self._Warning:
+            pass
+        except self._OperationalError, e:
+            # map to nive.utils.dataPool2.base.OperationalError
+            raise OperationalError, e
+
+    def _AutoIncrement(self, cursor):
+        # reads the auto increment lock mode and increment once. returns (mode, step)
+        if self._autoincMode is None:
+            try:
+                cursor.execute(u"SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+                mode, step = cursor.fetchone()
+                self._autoincStep = int(step)
+                self._autoincMode = int(mode)
+            except (self._OperationalError, self._ProgrammingError):
+                self._autoincMode = 2
+        return self._autoincMode, self._autoincStep
+
                
     def _CreateNewID(self, table = u"", dataTbl = None):
         #
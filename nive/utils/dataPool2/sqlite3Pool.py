@@ -22,18 +22,22 @@ Data Pool Sqlite Module
 
 import threading
 import sqlite3
+from Queue import Queue, Empty
 from time import time
 
 from nive.utils.utils import STACKF
+from nive.utils.utils import ConvertListToStr
 
 from nive.utils.dataPool2.base import Base, Entry
 from nive.utils.dataPool2.base import NotFound
-from nive.utils.dataPool2.connection import Connection, ConnectionThreadLocal, ConnectionRequest
+from nive.utils.dataPool2.connection import Connection, ConnectionThreadLocal, ConnectionRequest, ConnectionPooled
+from nive.utils.dataPool2.connection import RoutingCursor, IsReadStatement
+from nive.utils.dataPool2.collector import CollectorCursor
 
 from nive.utils.dataPool2.files import FileManager, FileEntry
 from nive.utils.dataPool2.dbManager import Sqlite3Manager
 
-from nive.definitions import OperationalError
+from nive.definitions import OperationalError, ConfigurationError
 
 
 
@@ -50,7 +54,16 @@ class Sqlite3Connection(Connection):
     port = unused - port server
 
     timeout is set to 3.
+
+    pragma settings:
+    journalMode = sqlite journal mode. default TRUNCATE
+    synchronous = sqlite synchronous level. default OFF
+    cacheSize = page cache size. positive values in pages, negative values in KiB
+    mmapSize = memory mapped i/o size in bytes
+    busyTimeout = seconds to wait if the database is locked
     """
+    journalModes = (u"DELETE", u"TRUNCATE", u"PERSIST", u"MEMORY", u"WAL", u"OFF")
+    synchronousLevels = (u"OFF", u"NORMAL", u"FULL", u"EXTRA", u"0", u"1", u"2", u"3")
 
     def __init__(self, config = None, connectNow = True):
         self.db = None
@@ -73,15 +86,10 @@ class Sqlite3Connection(Connection):
         conf = self.configuration
         if not conf.dbName:
             raise OperationalError, "Connection failed. Database name is empty." 
-        db = sqlite3.connect(conf.dbName, check_same_thread=self.check_same_thread)
+        db = self._Open()
         if not db:
             raise OperationalError, "Cannot connect to database '%s'" % (conf.dbName)
-        c = db.cursor()
-        c.execute("PRAGMA journal_mode = TRUNCATE")
-        #c.execute("PRAGMA secure_delete = 0")
-        #c.execute("PRAGMA temp_store = MEMORY")
-        c.execute("PRAGMA synchronous = OFF")
-        c.close()
+        self._SetPragmas(db)
         self._set(db)
         #print "connect:", time() - t
         return db
@@ -118,10 +126,35 @@ class Sqlite3Connection(Connection):
         conf = self.configuration
         if not conf.dbName:
             raise OperationalError, "Connection failed. Database name is empty." 
-        db = sqlite3.connect(conf.dbName, check_same_thread=self.check_same_thread)
+        db = self._Open()
         return db
 
 
+    def _Open(self):
+        # opens a new dbapi connection
+        conf = self.configuration
+        return sqlite3.connect(conf.dbName, timeout=conf.get("busyTimeout", 5), check_same_thread=self.check_same_thread)
+
+
+    def _SetPragmas(self, db, journalMode=None):
+        # applies the pragma settings of the database configuration
+        conf = self.configuration
+        journalMode = (journalMode or conf.get("journalMode") or u"TRUNCATE").upper()
+        synchronous = unicode(conf.get("synchronous") or u"OFF").upper()
+        if not journalMode in self.journalModes:
+            raise ConfigurationError, "Invalid sqlite journal mode (%s)" % (journalMode)
+        if not synchronous in self.synchronousLevels:
+            raise ConfigurationError, "Invalid sqlite synchronous level (%s)" % (synchronous)
+        c = db.cursor()
+        c.execute(u"PRAGMA journal_mode = %s" % (journalMode))
+        c.execute(u"PRAGMA synchronous = %s" % (synchronous))
+        if conf.get("cacheSize"):
+            c.execute(u"PRAGMA cache_size = %d" % (int(conf.cacheSize)))
+        if conf.get("mmapSize"):
+            c.execute(u"PRAGMA mmap_size = %d" % (int(conf.mmapSize)))
+        c.close()
+
+
 
 class Sqlite3ConnThreadLocal(Sqlite3Connection, ConnectionThreadLocal):
     """
@@ -149,6 +182,176 @@ class Sqlite3ConnRequest(Sqlite3Connection, ConnectionRequest):
             self.connect()
     
 
+_memoryDatabases = {}
+_memoryLock = threading.Lock()
+
+class Sqlite3ConnMemory(Sqlite3ConnRequest):
+    """
+    Connects to a shared in-memory database. All connections using the same `dbName` in one 
+    process use the same database. No file is created for the database. The database is kept 
+    until the process exits or `Drop()` is called.
+    
+    Requires sqlite with uri filename support.
+    """
+
+    def Drop(self):
+        """ Releases the database. All data is removed as soon as all connections are closed. """
+        self.close()
+        with _memoryLock:
+            db = _memoryDatabases.pop(self.configuration.dbName, None)
+        if db:
+            db.close()
+
+    def _Open(self):
+        conf = self.configuration
+        uri = u"file:%s?mode=memory&cache=shared" % (conf.dbName)
+        with _memoryLock:
+            if not conf.dbName in _memoryDatabases:
+                # keeps the database alive if no other connection is open
+                db = sqlite3.connect(uri, check_same_thread=False)
+                if db.execute(u"PRAGMA database_list").fetchone()[2]:
+                    db.close()
+                    raise OperationalError, "Sqlite uri filenames not supported. Cannot create memory database."
+                _memoryDatabases[conf.dbName] = db
+        return sqlite3.connect(uri, timeout=conf.get("busyTimeout", 5), check_same_thread=self.check_same_thread)
+
+    
+
+class Sqlite3ConnWAL(ConnectionPooled, Sqlite3Connection):
+    """
+    Uses sqlite in WAL mode with a bounded pool of read only connections and a single writer
+    connection. Readers do not block the writer and the writer does not block readers.
+    
+    Select statements are executed by read only connections checked out from the pool. The
+    first write statement of a transaction waits in a queue for the writer connection. The 
+    writer is used for all statements until commit(), rollback() or close() and is passed on
+    to the next waiting thread afterwards. Requests release the writer when finished. Waiting 
+    longer than `poolTimeout` raises OperationalError. A writer held by a thread which ended 
+    without releasing it is rolled back and passed on.
+    
+    Use `DatabaseConf.connection = "nive.utils.dataPool2.sqlite3Pool.Sqlite3ConnWAL"` to 
+    enable WAL mode. See `ConnectionPooled` and `Sqlite3Connection` for settings. 
+    """
+    def __init__(self, config = None, connectNow = True):
+        self.placeholder = u"?"
+        self.check_same_thread = False
+        self._writer = Queue(1)
+        self._writer.put(None)
+        self._writerOwner = None    # (thread, connection, checkout time)
+        self._writerLock = threading.Lock()
+        ConnectionPooled.__init__(self, config, connectNow)
+        # local database files do not need to be validated
+        self.pool.validate = None
+
+    # dbapi like functions --------------------------------------------------------------
+
+    def cursor(self):
+        # binds a reader to the current request and registers the finished callback
+        self._get()
+        if self.collector:
+            return CollectorCursor(RoutingCursor(self), self.collector)
+        return RoutingCursor(self)
+
+    def commit(self):
+        """ Commits the current write transaction and releases the writer """
+        db = getattr(self.local, "writer", None)
+        if db:
+            try:
+                db.commit()
+            finally:
+                self._releaseWriter(db)
+
+    def rollback(self):
+        """ Rolls back the current write transaction and releases the writer """
+        db = getattr(self.local, "writer", None)
+        if db:
+            try:
+                db.rollback()
+            finally:
+                self._releaseWriter(db)
+
+    def close(self):
+        """ Return the connections to the pool. Uncommitted changes are rolled back. """
+        self.rollback()
+        ConnectionPooled.close(self)
+
+    # writer ----------------------------------------------------------------------------
+
+    def _route(self, sql):
+        # returns the writer if used by the current thread or a read only connection 
+        db = getattr(self.local, "writer", None)
+        if db:
+            return db
+        if IsReadStatement(sql):
+            return self._get()
+        return self._acquireWriter()
+
+    def _acquireWriter(self):
+        # waits for the writer connection
+        db = getattr(self.local, "writer", None)
+        if db:
+            return db
+        db = self._reclaimWriter()
+        if db is None:
+            try:
+                db = self._writer.get(True, self.pool.timeout)
+            except Empty:
+                db = self._reclaimWriter()
+                if db is None:
+                    owner = self._writerOwner
+                    if owner:
+                        raise OperationalError, "Timeout: Sqlite writer connection held by thread %s for %.1f seconds" % (owner[0].name, time()-owner[2])
+                    raise OperationalError, "Timeout: Sqlite writer connection not available"
+        if db is None:
+            try:
+                db = self.PrivateConnection()
+                self._SetPragmas(db, u"WAL")
+            except:
+                self._writer.put(None)
+                raise
+        self.local.writer = db
+        self._writerOwner = (threading.current_thread(), db, time())
+        return db
+
+    def _releaseWriter(self, db):
+        self.local.writer = None
+        self._writerOwner = None
+        self._writer.put(db)
+
+    def _reclaimWriter(self):
+        # takes over the writer if the owning thread ended without releasing it
+        self._writerLock.acquire()
+        try:
+            owner = self._writerOwner
+            if not owner or owner[0].is_alive():
+                return None
+            self._writerOwner = None
+        finally:
+            self._writerLock.release()
+        db = owner[1]
+        try:
+            db.rollback()
+        except sqlite3.Error:
+            # broken connection. a new writer is opened.
+            try:
+                db.close()
+            except sqlite3.Error:
+                pass
+            db = None
+        return db
+
+    def _finished(self, request):
+        ConnectionPooled._finished(self, request)
+        self.rollback()
+
+    def _PoolConnection(self):
+        # read only connection
+        db = self.PrivateConnection()
+        self._SetPragmas(db, u"WAL")
+        c = db.cursor()
+        c.execute(u"PRAGMA query_only = 1")
+        c.close()
+        return db
 
 
 class Sqlite3(FileManager, Base):
@@ -158,6 +361,8 @@ class Sqlite3(FileManager, Base):
     _OperationalError = sqlite3.OperationalError
     _DefaultConnection = Sqlite3ConnRequest
     _EmptyValues = []
+    # sqlite cannot bind lists to a single placeholder
+    ListPlaceholders = True
 
 
     def GetContainedIDs(self, base=0, sort=u"title", parameter=u""):
@@ -165,6 +370,9 @@ class Sqlite3(FileManager, Base):
         select list of all entries
         id needs to be first field, pool_unitref second
         """
+        if self.useTreeIndex or self.SupportsRecursiveQueries():
+            return Base.GetContainedIDs(self, base=base, sort=sort, parameter=parameter)
+
         def _SelectIDs(base, ids, sql, cursor):
             cursor.execute(sql%(base))
             entries = cursor.fetchall()
@@ -172,6 +380,8 @@ class Sqlite3(FileManager, Base):
                 ids.append(e[0])
                 ids = _SelectIDs(e[0], ids, sql, cursor)
             return ids
+        if parameter != u"":
+            parameter = u"and " + parameter
         parameter = u"where pool_unitref=%d " + parameter
         sql = u"""select id from %s %s order by %s""" % (self.MetaTable, parameter, sort)
         cursor = self.connection.cursor()
@@ -185,6 +395,9 @@ class Sqlite3(FileManager, Base):
         select list of all entries
         id needs to be first field if flds
         """
+        if self.SupportsRecursiveQueries():
+            return Base.GetTree(self, flds=flds, sort=sort, base=base, parameter=parameter)
+
         def _Select(base, tree, flds, sql, cursor):
             cursor.execute(sql%(base))
             entries = cursor.fetchall()
@@ -206,10 +419,21 @@ class Sqlite3(FileManager, Base):
         return tree
 
 
+    def _CheckRecursiveQueries(self):
+        # WITH RECURSIVE is supported since sqlite 3.8.3
+        return sqlite3.sqlite_version_info >= (3, 8, 3)
+
+
     def _GetInsertIDValue(self, cursor):
         cursor.execute(u"SELECT last_insert_rowid()")
         return cursor.fetchone()[0]
 
+    def _GetInsertIDValues(self, cursor, count):
+        # rows inserted in one transaction get consecutive ids. last_insert_rowid() is the last one.
+        cursor.execute(u"SELECT last_insert_rowid()")
+        last = cursor.fetchone()[0]
+        return range(last-count+1, last+1)
+
                
     def _CreateNewID(self, table = u"", dataTbl = None):
         #
@@ -283,10 +507,6 @@ class Sqlite3(FileManager, Base):
 
     # types/classes -------------------------------------------------------------------
 
-    def _FmtListForQuery(self, values):
-        FmtParam = self.connection.FmtParam
-        return u",".join([FmtParam(v) for v in values])
-
     def _GetPoolEntry(self, id, **kw):
         try:
             return Sqlite3Entry(self, id, **kw)
@@ -295,6 +515,15 @@ class Sqlite3(FileManager, Base):
 
 
 
+class Sqlite3Memory(Sqlite3):
+    """
+    Data Pool Sqlite3 implementation storing all data in memory. Files are stored in `fileRoot`.
+    Mainly useful for tests and benchmarks. Use `DatabaseConf.context = "Memory"`.
+    """
+    _DefaultConnection = Sqlite3ConnMemory
+
+
+
 class Sqlite3Entry(FileEntry, Entry):
     """
     Data Pool Entry Sqlite3 implementation
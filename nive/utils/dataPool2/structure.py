@@ -30,6 +30,9 @@ class Wrapper(object):
     Wrappers are mapping objects for data, files and meta. Content can be accessed as
     dictionary field.
     Changes are stored temporarily in memory.
+    
+    Loaded json and list values can be stored serialized and are deserialized on first 
+    access (see `SetContent(content, lazy)`).
     """
 
     __wrapper__ = 1
@@ -39,6 +42,7 @@ class Wrapper(object):
         self._entry_ = entry
         self._temp_ = {}
         self._content_ = None
+        self._lazy_ = None
         
     def __repr__(self):
         return str(type(self)) 
@@ -54,9 +58,9 @@ class Wrapper(object):
     def __getitem__(self, key):
         if self._temp_.has_key(key):
             return self._temp_[key]
-        if not self._content_:
+        if self._Empty():
             self._Load()
-        return self._content_.get(key)
+        return self._Value(key)
 
 
     def __getattr__(self, key):
@@ -64,15 +68,16 @@ class Wrapper(object):
             return self.__dict__[key]
         if self._temp_.has_key(key):
             return self._temp_[key]
-        if not self._content_:
+        if self._Empty():
             self._Load()
-        return self._content_.get(key)
+        return self._Value(key)
 
 
     def close(self):
         self._entry_ = None
         self._temp_.clear()
         self._content_ = None
+        self._lazy_ = None
 
 
     def clear(self):
@@ -86,8 +91,10 @@ class Wrapper(object):
         """
         Returns a copy of current content
         """
-        if not self._content_:
+        if self._Empty():
             self._Load()
+        for key in list(self._lazy_ or ()):
+            self._Value(key)
         c = self._content_.copy()
         c.update(self._temp_)
         return c
@@ -127,7 +134,7 @@ class Wrapper(object):
 
 
     def keys(self):
-        if not self._content_:
+        if self._Empty():
             self._Load()
         t = self._content_.keys()
         t += self._temp_.keys()
@@ -143,15 +150,47 @@ class Wrapper(object):
 
     def GetEntry(self):                return self._entry_()
 
-    def SetContent(self, content):
+    def IsLoaded(self, key):
+        return self._content_ is not None and key in self._content_
+
+    def SetContent(self, content, lazy=None):
+        """
+        Updates the content. `lazy` is a list of fields in content stored serialized. 
+        These are deserialized on first access.
+        """
         if not self._content_:
             self._content_ = content
         else:
             self._content_.update(content)
+        if self._lazy_:
+            self._lazy_.difference_update(content.keys())
+        if lazy:
+            lazy = [key for key in lazy if key in content]
+            if self._lazy_ is None:
+                self._lazy_ = set(lazy)
+            else:
+                self._lazy_.update(lazy)
 
     def EmptyTemp(self):
         self._temp_.clear()
 
+    def _Value(self, key):
+        try:
+            value = self._content_[key]
+        except KeyError:
+            return self._Missing(key)
+        if self._lazy_ and key in self._lazy_:
+            self._lazy_.discard(key)
+            value = self._content_[key] = self._entry_().DeserializeValue(key, value, self.meta)
+        return value
+
+    def _Missing(self, key):
+        return None
+
+    def _Empty(self):
+        # content not loaded
+        return not self._content_
+
     def _Load(self):
         self._content_ = {}
         pass
@@ -174,6 +213,28 @@ class DataWrapper(Wrapper):
     wrapper class for data content
     """
 
+    def copy(self):
+        """
+        Returns a copy of current content including deferred fields
+        """
+        self._entry_()._LoadDeferred()
+        return Wrapper.copy(self)
+
+    def keys(self):
+        """
+        Returns the loaded keys including deferred fields not loaded yet
+        """
+        keys = Wrapper.keys(self)
+        entry = self._entry_()
+        deferred = entry.pool.structure.deferred.get(entry.GetDataTbl())
+        if deferred:
+            keys += [f for f in deferred if not f in keys]
+        return keys
+
+    def _Missing(self, key):
+        # deferred fields are loaded on first access
+        return self._entry_()._LoadDeferred(key)
+
     def _Load(self):
         self._content_ = {}
         self._entry_()._PreloadData()
@@ -208,12 +269,20 @@ class FileWrapper(Wrapper):
         self._temp_[key] = filedata
 
 
+    # all files of the entry are loaded. used to skip loading if the entry has no files.
+    _complete_ = False
+
     def set(self, key, filedata):
         self[key] = filedata
 
 
-    def SetContent(self, files):
+    def SetContent(self, files, complete=False):
+        """
+        Sets the files. Set complete to True if files contains all files of the 
+        entry (e.g. prefetched by `GetBatch(files=True)`).
+        """
         self._content_ = {}
+        self._complete_ = complete
         if isinstance(files, dict):
             for f in files:
                 self._content_[f] = files[f]
@@ -222,9 +291,15 @@ class FileWrapper(Wrapper):
             self._content_[f["filekey"]] = f
 
 
+    def _Empty(self):
+        if self._content_ is None:
+            return True
+        return not self._content_ and not self._complete_
+
     def _Load(self):
         files = self._entry_().Files()
         self._content_ = {}
+        self._complete_ = True
         for f in files:
             self._content_[f["filekey"]] = f
         return self._content_.keys()
@@ -233,6 +308,29 @@ class FileWrapper(Wrapper):
 #  Pool Structure ---------------------------------------------------------------------------
 
 
+class ReadonlyValues(dict):
+    """
+    Read only mapping for meta and data values of read only entries. Values can be
+    accessed as dictionary field or attribute. Missing fields return None.
+    """
+    __slots__ = ()
+
+    def __missing__(self, key):
+        return None
+
+    def __getattr__(self, key):
+        return self.get(key)
+
+    def _readonly(self, *args, **kw):
+        raise TypeError, "Read only values cannot be changed"
+
+    __setitem__ = __delitem__ = update = setdefault = pop = popitem = clear = _readonly
+
+    def copy(self):
+        return dict(self)
+
+
+
 class PoolStructure(object):
     """
     Data Pool 2 Structure handling. Defines a table field mapping. If field types are available serializing 
@@ -256,6 +354,14 @@ class PoolStructure(object):
             
         stdMeta = (field1, field2)
 
+        deferred = 
+            {
+             type1_table: (field6,),
+            }
+
+    Deferred fields are not loaded with the other fields of an entry but on first access. 
+    Use for large text or json fields not required in listings. 
+
     Deserialization datatypes ::
     
         string, htext, text, list, code, radio, email, password, url -> unicode
@@ -282,6 +388,9 @@ class PoolStructure(object):
         
     If fieldtype (`fieldtypes`) information is not given json data is stored with `_json_`
     prefix.
+    
+    Converters for each table and field are compiled on `Init()`. Use `decoder()` to 
+    deserialize multiple database records.
 
     """
     MetaTable = u"pool_meta"
@@ -291,8 +400,11 @@ class PoolStructure(object):
         self.stdMeta = ()
         self.structure = {}
         self.fieldtypes = {}
-        self.serializeCallbacks = {}
-        self.deserializeCallbacks = {}
+        self.deferred = {}
+        self._preload = {}
+        self._codecs = {}
+        self._serializeCallbacks = {}
+        self._deserializeCallbacks = {}
         if structure:
             self.Init(structure, fieldtypes, stdMeta, codepage, **kw)
         
@@ -317,6 +429,19 @@ class PoolStructure(object):
         if stdMeta:
             self.stdMeta = tuple(stdMeta)
 
+        # fields loaded with the entry
+        self.deferred = {}
+        self._preload = {}
+        deferred = kw.get("deferred") or {}
+        for table, fields in s.items():
+            d = tuple([f for f in deferred.get(table, ()) if f in fields])
+            if d:
+                self.deferred[table] = d
+                self._preload[table] = tuple([f for f in fields if not f in d])
+            else:
+                self._preload[table] = fields
+        self.Compile()
+
 
     def IsEmpty(self):
         return self.structure=={}
@@ -333,180 +458,332 @@ class PoolStructure(object):
 
     def keys(self, version=None):
         return self.structure.keys()
+
+    def preloaded(self, key, default=None, version=None):
+        """
+        Returns the table fields except deferred fields
+        """
+        return self._preload.get(key, default)
     
     
+    # Codecs --------------------------------------------------------------------------------
+
+    @property
+    def serializeCallbacks(self):
+        return self._serializeCallbacks
+
+    @serializeCallbacks.setter
+    def serializeCallbacks(self, callbacks):
+        self._serializeCallbacks = callbacks
+        self._codecs = {}
+
+    @property
+    def deserializeCallbacks(self):
+        return self._deserializeCallbacks
+
+    @deserializeCallbacks.setter
+    def deserializeCallbacks(self, callbacks):
+        self._deserializeCallbacks = callbacks
+        self._codecs = {}
+
+
+    def Compile(self, table=None):
+        """
+        Compiles the serialize and deserialize converters for all tables or a single table.
+        Converters are compiled on Init() and on first use for unknown tables. Call 
+        Compile() if field types or callbacks are changed in place.
+        """
+        if table is None:
+            self._codecs = {}
+            for table in self.structure.keys():
+                self._codecs[table] = self._Compile(table)
+            return
+        self._codecs[table] = self._Compile(table)
+
+
+    def codec(self, table):
+        """
+        Returns the compiled converters of the table as tuple (serializers, deserializers, lazy).
+        Serializers and deserializers are dictionaries {field: converter}. Converters take the 
+        value as single parameter. The converter is None if no conversion is required.
+        Lazy is the set of json and list fields which can be deserialized on first access.
+        """
+        try:
+            return self._codecs[table]
+        except KeyError:
+            codec = self._codecs[table] = self._Compile(table)
+            return codec
+
+
+    def lazy(self, table):
+        """
+        Returns the set of json and list fields deserialized on first access.
+        """
+        return self.codec(table)[2]
+
+
+    def decoder(self, table, flds=None, lazy=False):
+        """
+        Returns a function converting database records to deserialized dictionaries.
+        Records are tuples of values in `flds` order. flds defaults to the table structure.
+        Use for multiple records with the same fields. ::
+        
+            decode = structure.decoder(table, flds)
+            data = [decode(rec) for rec in records]
+            
+        If lazy is True json and list fields are not deserialized.
+        """
+        if flds is None:
+            flds = self.structure.get(table, ())
+        flds = tuple(flds)
+        deserializers, skip = self.codec(table)[1:]
+        if not lazy:
+            skip = ()
+        # only columns requiring conversion
+        converters = [(f, deserializers.get(f, self._de_notype)) for f in flds if not f in skip]
+        converters = tuple([c for c in converters if c[1] is not None])
+        def decode(rec):
+            values = dict(zip(flds, rec))
+            for f, c in converters:
+                values[f] = c(values[f])
+            return values
+        return decode
+
+
     def serialize(self, table, field, value):
         # if field==None and value is a dictionary multiple values are serialized
+        serializers = self.codec(table)[0]
         if field==None and isinstance(value, dict):
             newdict = {}
+            notype = self._se_notype
             for field, v in value.items():
-                try:        t = self.fieldtypes[table][field]
-                except:     t = None
-                newdict[field] = self._se(v, t, field)
+                c = serializers.get(field, notype)
+                newdict[field] = v if c is None else c(v)
             return newdict
-        else:
-            try:        t = self.fieldtypes[table][field]
-            except:     t = None
-            value = self._se(value, t, field)
-        return value
+        c = serializers.get(field, self._se_notype)
+        if c is None:
+            return value
+        return c(value)
         
 
-    def deserialize(self, table, field, value):
+    def deserialize(self, table, field, value, lazy=False):
         # if field==None and value is a dictionary multiple values are deserialized
+        # if lazy is True json and list fields are not deserialized
+        deserializers, skip = self.codec(table)[1:]
         if field==None and isinstance(value, dict):
             newdict = {}
+            notype = self._de_notype
             for field, v in value.items():
-                try:        t = self.fieldtypes[table][field]
-                except:     t = None
-                newdict[field] = self._de(v, t, field)
+                if lazy and field in skip:
+                    newdict[field] = v
+                    continue
+                c = deserializers.get(field, notype)
+                newdict[field] = v if c is None else c(v)
             return newdict
-        else:
-            try:        t = self.fieldtypes[table][field]
-            except:     t = None
-            value = self._de(value, t, field)
+        c = deserializers.get(field, self._de_notype)
+        if c is None:
+            return value
+        return c(value)
+
+
+    # converter method names by datatype. not listed datatypes are handled as text.
+    # None = no conversion
+    _serializers = {
+        "number": "_se_number",
+        "float": "_se_float",
+        "date": "_se_date",
+        "datetime": "_se_date",
+        "timestamp": "_se_timestamp",
+        "list": "_se_list",
+        "radio": "_se_list",
+        "mselection": "_se_mlist",
+        "mcheckboxes": "_se_mlist",
+        "urllist": "_se_mlist",
+        "unitlist": "_se_mlist",
+        "bool": "_se_bool",
+        "json": "_se_json",
+        "file": None,
+    }
+    _deserializers = {
+        "date": "_de_date",
+        "datetime": "_de_date",
+        "timestamp": "_de_timestamp",
+        "mselection": "_de_mlist",
+        "mcheckboxes": "_de_mlist",
+        "urllist": "_de_mlist",
+        "unitlist": "_de_unitlist",
+        "json": "_de_json",
+    }
+
+    # datatypes deserialized on first access
+    lazyTypes = ("json", "mselection", "mcheckboxes", "urllist", "unitlist")
+
+    def _Compile(self, table):
+        serializers = {}
+        deserializers = {}
+        lazy = set()
+        for field, fieldtype in (self.fieldtypes.get(table) or {}).items():
+            if isinstance(fieldtype, dict):
+                # empty datatype settings are handled as text
+                fieldtype = fieldtype[u"datatype"] or u"text"
+            serializers[field] = self._Converter(field, fieldtype, self._serializeCallbacks, self._serializers, "_se_text", "_se_notype")
+            deserializers[field] = self._Converter(field, fieldtype, self._deserializeCallbacks, self._deserializers, None, "_de_notype")
+            if fieldtype in self.lazyTypes and deserializers[field] is not None:
+                lazy.add(field)
+        return serializers, deserializers, frozenset(lazy)
+
+
+    def _Converter(self, field, fieldtype, callbacks, converters, default, notype):
+        if not fieldtype:
+            # no datatype information set
+            return getattr(self, notype)
+        if fieldtype in callbacks:
+            callback = callbacks[fieldtype]
+            return lambda value: callback(value, field)
+        name = converters.get(fieldtype, default)
+        if name is None:
+            return None
+        return getattr(self, name)
+
+
+    # serialize converters
+
+    def _se_notype(self, value):
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        elif isinstance(value, (list, tuple)):
+            if isinstance(value[0], bytes):
+                # list of strings:
+                value = [unicode(v, self.codepage) for v in value]
+            value = u"_json_"+json.dumps(value)
+        elif isinstance(value, bytes):
+            value = unicode(value, self.codepage)
         return value
 
+    def _se_text(self, value):
+        # assure unicode except filedata
+        if isinstance(value, bytes):
+            value = unicode(value, self.codepage)
+        return value
 
-    def _se(self, value, fieldtype, field):
-        if not fieldtype:
-            # no datatype information set
-            if isinstance(value, datetime):
-                return value.strftime("%Y-%m-%d %H:%M:%S")
-            elif isinstance(value, (list, tuple)):
-                if isinstance(value[0], bytes):
-                    # list of strings:
-                    value = [unicode(v, self.codepage) for v in value]
-                value = u"_json_"+json.dumps(value)
-            elif isinstance(value, bytes):
-                value = unicode(value, self.codepage)
-            return value
-        
-        if isinstance(fieldtype, dict):
-            fieldtype = fieldtype[u"datatype"]
-            
-        # call serialize callback function
-        if fieldtype in self.serializeCallbacks:
-            return self.serializeCallbacks[fieldtype](value, field)
-            
-        if fieldtype == "number":
-            if isinstance(value, basestring):
-                value = long(value)
-            elif isinstance(value, float):
-                value = long(value)
-        
-        elif fieldtype == "float":
-            if isinstance(value, basestring):
-                value = float(value)
+    def _se_number(self, value):
+        if isinstance(value, basestring):
+            value = long(value)
+        elif isinstance(value, float):
+            value = long(value)
+        return value
 
-        elif fieldtype in ("date", "datetime"):
-            if isinstance(value, (float,int,long)):
-                value = unicode(datetime.fromtimestamp(value))
-            elif not isinstance(value, unicode):
-                value = unicode(value)
-        
-        elif fieldtype == "timestamp":
-            if not isinstance(value, basestring):
-                value = unicode(value)
-        
-        elif fieldtype in ("list","radio"):
-            # to single item string
-            if isinstance(value, (list, tuple)):
-                if value:
-                    value = value[0]
-                else:
-                    value = u""
+    def _se_float(self, value):
+        if isinstance(value, basestring):
+            value = float(value)
+        return value
 
-        elif fieldtype in ("mselection", "mcheckboxes", "urllist", "unitlist"):
-            # to json formatted list
-            if not value:
-                value = u""
-            elif isinstance(value, basestring):
-                value = [value]
-            if isinstance(value, (list, tuple)):
-                if isinstance(value[0], bytes):
-                    # list of strings:
-                    value = [unicode(v, self.codepage) for v in value]
-                value = json.dumps(value)
-
-        elif fieldtype in ("bool"):
-            if isinstance(value, basestring):
-                if value.lower()==u"true":
-                    value = 1
-                elif value.lower()==u"false":
-                    value = 0
-            else:
-                try:
-                    value = int(value)
-                except:
-                    value = 0
+    def _se_date(self, value):
+        if isinstance(value, (float,int,long)):
+            value = unicode(datetime.fromtimestamp(value))
+        elif not isinstance(value, unicode):
+            value = unicode(value)
+        return value
 
-        elif fieldtype == "json":
-            if not value:
+    def _se_timestamp(self, value):
+        if not isinstance(value, basestring):
+            value = unicode(value)
+        return self._se_text(value)
+
+    def _se_list(self, value):
+        # to single item string
+        if isinstance(value, (list, tuple)):
+            if value:
+                value = value[0]
+            else:
                 value = u""
-            elif not isinstance(value, basestring):
-                value = json.dumps(value)
-            
-        # assure unicode except filedata
-        if isinstance(value, bytes) and fieldtype!="file":
+        return self._se_text(value)
+
+    def _se_mlist(self, value):
+        # to json formatted list
+        if not value:
+            value = u""
+        elif isinstance(value, basestring):
+            value = [value]
+        if isinstance(value, (list, tuple)):
+            if isinstance(value[0], bytes):
+                # list of strings:
+                value = [unicode(v, self.codepage) for v in value]
+            value = json.dumps(value)
+        return self._se_text(value)
+
+    def _se_bool(self, value):
+        if isinstance(value, basestring):
+            if value.lower()==u"true":
+                value = 1
+            elif value.lower()==u"false":
+                value = 0
+            return self._se_text(value)
+        try:
+            return int(value)
+        except:
+            return 0
+
+    def _se_json(self, value):
+        if not value:
+            value = u""
+        elif not isinstance(value, basestring):
+            value = json.dumps(value)
+        return self._se_text(value)
+
+
+    # deserialize converters
+
+    def _de_notype(self, value):
+        if isinstance(value, basestring) and value.startswith(u"_json_"):
+            value = json.loads(value[len(u"_json_"):])
+        if isinstance(value, bytes):
             value = unicode(value, self.codepage)
-        
         return value
 
+    def _de_date(self, value):
+        # -> to datatime
+        if isinstance(value, basestring):
+            value = ConvertToDateTime(value)
+        elif isinstance(value, (float,int,long)):
+            value = datetime.fromtimestamp(value)
+        return value
 
-    def _de(self, value, fieldtype, field):
-        if not fieldtype:
-            # no datatype information set
-            if isinstance(value, basestring) and value.startswith(u"_json_"):
-                value = json.loads(value[len(u"_json_"):])
-            if isinstance(value, bytes):
-                value = unicode(value, self.codepage)
-            return value
+    def _de_timestamp(self, value):
+        if isinstance(value, basestring):
+            value = float(value)
+        return value
 
-        if isinstance(fieldtype, dict):
-            fieldtype = fieldtype[u"datatype"]
+    def _de_mlist(self, value, unitlist=False):
+        # -> to string tuple
+        # unitlist -> to number tuple
+        if not value:
+            value = u""
+        elif value[0]!="[":
+            # bw 0.9.5b: changed storage format to json. Previous versions used lines 
+            # with \n for entries.
+            if isinstance(value, basestring):
+                if value.startswith(u"_json_"):
+                    value = json.loads(value[len(u"_json_"):])
+                else:
+                    value = tuple(value.split(u"\n"))
+            elif isinstance(value, list):
+                value = tuple(value)
+            if unitlist:
+                value = [long(v) for v in value]
+        else:
+            value = json.loads(value)
+        return value
 
-        # call serialize callback function
-        if fieldtype in self.deserializeCallbacks:
-            return self.deserializeCallbacks[fieldtype](value, field)
+    def _de_unitlist(self, value):
+        return self._de_mlist(value, unitlist=True)
 
-        if fieldtype in ("date", "datetime"):
-            # -> to datatime
-            if isinstance(value, basestring):
-                value = ConvertToDateTime(value)
-            elif isinstance(value, (float,int,long)):
-                value = datetime.fromtimestamp(value)
-                    
-        elif fieldtype == "timestamp":
-            if isinstance(value, basestring):
-                value = float(value)
-                    
-        elif fieldtype in ("mselection", "mcheckboxes", "urllist", "unitlist"):
-            # -> to string tuple
-            # unitlist -> to number tuple
-            if not value:
-                value = u""
-            elif value[0]!="[":
-                # bw 0.9.5b: changed storage format to json. Previous versions used lines 
-                # with \n for entries.
-                if isinstance(value, basestring):
-                    if value.startswith(u"_json_"):
-                        value = json.loads(value[len(u"_json_"):])
-                    else:
-                        value = tuple(value.split(u"\n"))
-                elif isinstance(value, list):
-                    value = tuple(value)
-                if fieldtype == "unitlist":
-                    value = [long(v) for v in value]
-            else:
-                 value = json.loads(value)
-            
-        elif fieldtype == "json":
-            # -> to python type
-            if not value:
-                value = None
-            elif isinstance(value, basestring):
-                value = json.loads(value)
-            
+    def _de_json(self, value):
+        # -> to python type
+        if not value:
+            value = None
+        elif isinstance(value, basestring):
+            value = json.loads(value)
         return value
     
     
\ No newline at end of file
@@ -0,0 +1,76 @@
+import time
+
+from nive.tests.test_mysql import ENABLE_MYSQL_TESTS
+from nive.tests.db_app import app_db
+from nive.utils.dataPool2.sqlite3Pool import Sqlite3
+
+import test_db
+from test_Base import conf, struct, data2_1, meta1
+
+"""
+Benchmark: creating entries one by one with CreateEntry() compared to CreateEntries().
+CreateEntries() is also run with rows inserted one by one as done by MySql if the server
+uses innodb_autoinc_lock_mode=2 (MySQL 8 default).
+
+Run as script: python bulkinsert_benchmark.py
+"""
+
+
+def rows(n):
+    return [{"meta": dict(meta1, title=u"entry %d" % i), "data": data2_1} for i in xrange(n)]
+
+
+def loop(pool, n):
+    for row in rows(n):
+        e = pool.CreateEntry(u"data2", user=u"benchmark")
+        e.meta.update(row["meta"])
+        e.data.update(row["data"])
+        e.Commit(user=u"benchmark")
+        yield e.GetID()
+
+
+def measure(name, pool, create, n):
+    t = time.time()
+    ids = list(create(n))
+    print "%-36s %d entries  %.3fs" % (name, n, time.time()-t)
+    for id in ids:
+        pool.DeleteEntry(id)
+    pool.Commit()
+
+
+def insertRows(sql, values, cursor):
+    # replaces Base._InsertMany. one statement per row.
+    ids = []
+    for row in values:
+        cursor.execute(sql, row)
+        ids.append(cursor.lastrowid)
+    return ids
+
+
+def run(pool, name, n=1000):
+    measure(name+u" CreateEntry", pool, lambda n: loop(pool, n), n)
+    measure(name+u" CreateEntries", pool, lambda n: pool.CreateEntries(u"data2", rows(n), user=u"benchmark"), n)
+    if hasattr(pool, "_AutoIncrement"):
+        mode, step = pool._AutoIncrement(pool.connection.cursor())
+        pool._autoincMode = 2
+    else:
+        pool._InsertMany = insertRows
+    measure(name+u" CreateEntries (row by row)", pool, lambda n: pool.CreateEntries(u"data2", rows(n), user=u"benchmark"), n)
+    if hasattr(pool, "_AutoIncrement"):
+        pool._autoincMode = mode
+    else:
+        del pool._InsertMany
+
+
+if __name__ == '__main__':
+    app_db()
+    pool = Sqlite3(connParam=test_db.conn, **conf)
+    pool.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+    run(pool, u"Sqlite3")
+    pool.Close()
+    if ENABLE_MYSQL_TESTS:
+        import test_MySql
+        test_MySql.myapp()
+        pool = test_MySql.getPool()
+        run(pool, u"MySql")
+        pool.Close()
@@ -0,0 +1,249 @@
+
+import time
+from datetime import datetime
+
+from nive.definitions import SystemFlds
+from nive.utils.utils import ConvertToDateTime
+from nive.utils.dataPool2.structure import *
+
+"""
+Micro benchmark: row decoding and serializing with compiled codecs compared to the 
+previous per value field type lookup and datatype if-chain (LegacyStructure).
+
+Run as script: python codecs_benchmark.py
+"""
+
+class LegacyStructure(PoolStructure):
+    """
+    Previous implementation: field type lookup and datatype if-chain for every value.
+    """
+
+    def serialize(self, table, field, value):
+        # if field==None and value is a dictionary multiple values are serialized
+        if field==None and isinstance(value, dict):
+            newdict = {}
+            for field, v in value.items():
+                try:        t = self.fieldtypes[table][field]
+                except:     t = None
+                newdict[field] = self._se(v, t, field)
+            return newdict
+        else:
+            try:        t = self.fieldtypes[table][field]
+            except:     t = None
+            value = self._se(value, t, field)
+        return value
+        
+
+    def deserialize(self, table, field, value):
+        # if field==None and value is a dictionary multiple values are deserialized
+        if field==None and isinstance(value, dict):
+            newdict = {}
+            for field, v in value.items():
+                try:        t = self.fieldtypes[table][field]
+                except:     t = None
+                newdict[field] = self._de(v, t, field)
+            return newdict
+        else:
+            try:        t = self.fieldtypes[table][field]
+            except:     t = None
+            value = self._de(value, t, field)
+        return value
+
+
+    def _se(self, value, fieldtype, field):
+        if not fieldtype:
+            # no datatype information set
+            if isinstance(value, datetime):
+                return value.strftime("%Y-%m-%d %H:%M:%S")
+            elif isinstance(value, (list, tuple)):
+                if isinstance(value[0], bytes):
+                    # list of strings:
+                    value = [unicode(v, self.codepage) for v in value]
+                value = u"_json_"+json.dumps(value)
+            elif isinstance(value, bytes):
+                value = unicode(value, self.codepage)
+            return value
+        
+        if isinstance(fieldtype, dict):
+            fieldtype = fieldtype[u"datatype"]
+            
+        # call serialize callback function
+        if fieldtype in self.serializeCallbacks:
+            return self.serializeCallbacks[fieldtype](value, field)
+            
+        if fieldtype == "number":
+            if isinstance(value, basestring):
+                value = long(value)
+            elif isinstance(value, float):
+                value = long(value)
+        
+        elif fieldtype == "float":
+            if isinstance(value, basestring):
+                value = float(value)
+
+        elif fieldtype in ("date", "datetime"):
+            if isinstance(value, (float,int,long)):
+                value = unicode(datetime.fromtimestamp(value))
+            elif not isinstance(value, unicode):
+                value = unicode(value)
+        
+        elif fieldtype == "timestamp":
+            if not isinstance(value, basestring):
+                value = unicode(value)
+        
+        elif fieldtype in ("list","radio"):
+            # to single item string
+            if isinstance(value, (list, tuple)):
+                if value:
+                    value = value[0]
+                else:
+                    value = u""
+
+        elif fieldtype in ("mselection", "mcheckboxes", "urllist", "unitlist"):
+            # to json formatted list
+            if not value:
+                value = u""
+            elif isinstance(value, basestring):
+                value = [value]
+            if isinstance(value, (list, tuple)):
+                if isinstance(value[0], bytes):
+                    # list of strings:
+                    value = [unicode(v, self.codepage) for v in value]
+                value = json.dumps(value)
+
+        elif fieldtype in ("bool"):
+            if isinstance(value, basestring):
+                if value.lower()==u"true":
+                    value = 1
+                elif value.lower()==u"false":
+                    value = 0
+            else:
+                try:
+                    value = int(value)
+                except:
+                    value = 0
+
+        elif fieldtype == "json":
+            if not value:
+                value = u""
+            elif not isinstance(value, basestring):
+                value = json.dumps(value)
+            
+        # assure unicode except filedata
+        if isinstance(value, bytes) and fieldtype!="file":
+            value = unicode(value, self.codepage)
+        
+        return value
+
+
+    def _de(self, value, fieldtype, field):
+        if not fieldtype:
+            # no datatype information set
+            if isinstance(value, basestring) and value.startswith(u"_json_"):
+                value = json.loads(value[len(u"_json_"):])
+            if isinstance(value, bytes):
+                value = unicode(value, self.codepage)
+            return value
+
+        if isinstance(fieldtype, dict):
+            fieldtype = fieldtype[u"datatype"]
+
+        # call serialize callback function
+        if fieldtype in self.deserializeCallbacks:
+            return self.deserializeCallbacks[fieldtype](value, field)
+
+        if fieldtype in ("date", "datetime"):
+            # -> to datatime
+            if isinstance(value, basestring):
+                value = ConvertToDateTime(value)
+            elif isinstance(value, (float,int,long)):
+                value = datetime.fromtimestamp(value)
+                    
+        elif fieldtype == "timestamp":
+            if isinstance(value, basestring):
+                value = float(value)
+                    
+        elif fieldtype in ("mselection", "mcheckboxes", "urllist", "unitlist"):
+            # -> to string tuple
+            # unitlist -> to number tuple
+            if not value:
+                value = u""
+            elif value[0]!="[":
+                # bw 0.9.5b: changed storage format to json. Previous versions used lines 
+                # with \n for entries.
+                if isinstance(value, basestring):
+                    if value.startswith(u"_json_"):
+                        value = json.loads(value[len(u"_json_"):])
+                    else:
+                        value = tuple(value.split(u"\n"))
+                elif isinstance(value, list):
+                    value = tuple(value)
+                if fieldtype == "unitlist":
+                    value = [long(v) for v in value]
+            else:
+                 value = json.loads(value)
+            
+        elif fieldtype == "json":
+            # -> to python type
+            if not value:
+                value = None
+            elif isinstance(value, basestring):
+                value = json.loads(value)
+            
+
+
+meta = [f["id"] for f in SystemFlds]
+data = (u"ftext", u"fnumber", u"fdate", u"fmselect", u"fjson", u"fbool")
+structure = {u"pool_meta": meta, u"data1": data}
+fieldtypes = {u"pool_meta": dict([(f["id"], f["datatype"]) for f in SystemFlds]),
+              u"data1": {u"ftext": "text", u"fnumber": "number", u"fdate": "datetime", 
+                         u"fmselect": "mselection", u"fjson": "json", u"fbool": "bool"}}
+
+def records(n, dates=True):
+    # dates=False: date columns are empty. Datetime parsing takes most of the time if set.
+    now = dates and unicode(datetime.now()) or None
+    m = []
+    for f in SystemFlds:
+        if f["datatype"] in ("number", "float"):
+            m.append(1)
+        elif f["datatype"] == "datetime":
+            m.append(now)
+        else:
+            m.append(u"value")
+    m += [0, u"data1"]
+    d = [u"text", 123, now, u'["a", "b"]', u'{"a": 1}', 1]
+    return [(tuple(m), tuple(d))] * n
+
+
+def run(n=20000, dates=True):
+    print "%d records, %d meta and %d data columns, dates=%s" % (n, len(meta)+2, len(data), str(dates))
+    recs = records(n, dates)
+    for cls in (LegacyStructure, PoolStructure):
+        s = cls(structure=structure, fieldtypes=fieldtypes)
+        fldsm = s.get(u"pool_meta")
+
+        t = time.time()
+        for m, d in recs:
+            s.deserialize(u"pool_meta", None, dict(zip(fldsm, m)))
+            s.deserialize(u"data1", None, dict(zip(data, d)))
+        print "%-16s deserialize dict   %.3fs" % (cls.__name__, time.time()-t)
+
+        if cls is PoolStructure:
+            decodem = s.decoder(u"pool_meta", fldsm)
+            decoded = s.decoder(u"data1", data)
+            t = time.time()
+            for m, d in recs:
+                decodem(m)
+                decoded(d)
+            print "%-16s decoder            %.3fs" % (cls.__name__, time.time()-t)
+
+        values = s.deserialize(u"data1", None, dict(zip(data, recs[0][1])))
+        t = time.time()
+        for i in xrange(n):
+            s.serialize(u"data1", None, values)
+        print "%-16s serialize dict     %.3fs" % (cls.__name__, time.time()-t)
+
+
+if __name__ == '__main__':
+    run(dates=False)
+    run(dates=True)
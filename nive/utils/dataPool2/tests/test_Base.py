@@ -168,6 +168,73 @@ class BaseTest(unittest.TestCase):
                           max=20,
                           sort=u"title, pool_type")
 
+    def test_sql_cache(self):
+        base = Base()
+        base.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+        try:
+            base.SetConnection(Connection())
+        except TypeError:
+            pass
+        flds = list(struct[u"pool_meta"])+list(struct[u"data1"])
+        kw = dict(dataTable=u"data1", operators={u"title":u"LIKE", u"id":u"BETWEEN"}, sort=u"title")
+        sql1, values1 = base.FmtSQLSelect(flds, parameter={u"title":u"a*", u"id":[1,5], u"pool_type":u"data1"}, **kw)
+        sql2, values2 = base.FmtSQLSelect(flds, parameter={u"title":u"b*", u"id":[2,6], u"pool_type":u"data2"}, **kw)
+        self.assertEqual(sql1, sql2)
+        self.assertItemsEqual(values2, [u"%b%%", 2, 6, u"data2"])
+        stats = base.GetStatementCacheStats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        # different shape
+        sql3, values3 = base.FmtSQLSelect(flds, parameter={u"title":u"", u"id":[2,6], u"pool_type":u"data2"}, **kw)
+        self.assertNotEqual(sql1, sql3)
+        self.assertItemsEqual(values3, [2, 6, u"data2"])
+        self.assertEqual(base.GetStatementCacheStats()["misses"], 2)
+        # uncached
+        nocache = Base(statementCacheSize=0)
+        nocache.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+        nocache.SetConnection(base.usedconnection)
+        self.assertEqual(nocache.FmtSQLSelect(flds, parameter={u"title":u"b*", u"id":[2,6], u"pool_type":u"data2"}, **kw), (sql2, values2))
+        self.assertEqual(nocache.GetStatementCacheStats(), None)
+
+    def test_sql_seek(self):
+        base = Base()
+        base.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+        try:
+            base.SetConnection(Connection())
+        except TypeError:
+            pass
+        flds = [u"id", u"title"]
+        sql, values = base.FmtSQLSelect(flds, parameter={u"pool_type":u"data1"}, sort=u"title ASC, id", max=10, 
+                                        seek=(u"title", u"abc", 12), logicalOperator=u"or")
+        self.assert_(sql.find(u"(meta__.title > %s OR (meta__.title = %s AND meta__.id > %s))")!=-1)
+        self.assert_(sql.find(u"WHERE (")!=-1)
+        self.assertEqual(values, [u"data1", u"abc", u"abc", 12])
+        # cached statement
+        sql2, values = base.FmtSQLSelect(flds, parameter={u"pool_type":u"data2"}, sort=u"title ASC, id", max=10, 
+                                        seek=(u"title", u"xyz", 13), logicalOperator=u"or")
+        self.assertEqual(sql, sql2)
+        self.assertEqual(values, [u"data2", u"xyz", u"xyz", 13])
+        sql, values = base.FmtSQLSelect(flds, sort=u"id", max=10, seek=(u"id", 12, 12), ascending=0)
+        self.assert_(sql.find(u"WHERE meta__.id < %s")!=-1)
+        self.assertEqual(values, [12])
+        sql, values = base.FmtSQLSelect(flds, sort=u"title DESC, id", max=10, seek=(u"title", None, 12), ascending=0)
+        self.assert_(sql.find(u"(meta__.title IS NULL AND meta__.id < %s)")!=-1)
+
+    def test_statementcache(self):
+        cache = StatementCache(2)
+        cache.set(1, u"a")
+        cache.set(2, u"b")
+        self.assertEqual(cache.get(1), u"a")
+        cache.set(3, u"c")
+        # 2 is least recently used
+        self.assertEqual(cache.get(2), None)
+        self.assertEqual(cache.get(1), u"a")
+        self.assertEqual(cache.get(3), u"c")
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual(cache.get([1]), None)
+        cache.clear()
+        self.assertEqual(cache.stats()["hits"], 0)
+
 
 
 
@@ -4,7 +4,8 @@ import copy, time
 import unittest
 
 
-from nive.definitions import FieldConf
+from nive.definitions import FieldConf, MetaIndexes
+from nive import definitions
 from nive.utils.dataPool2.dbManager import *
 from nive.utils.path import DvPath
 
@@ -100,6 +101,56 @@ class Sqlite3Test(unittest.TestCase):
         self._deltable()
 
 
+    def test_Indexes(self):
+        self._createtbl()
+        self.assert_(self.db.UpdateStructure(tablename, SystemFlds))
+        flds = [FieldConf(id="pool_type", datatype="list", index=True), 
+                FieldConf(id="pool_filename", datatype="string", index="unique"),
+                FieldConf(id="title", datatype="string"),
+                FieldConf(id="pool_unitref", datatype="unit")]
+        indexes = self.db.ConvertConfToIndexes(tablename, flds, [("pool_unitref","pool_sort"), {"fields":("title",), "id":"ix_title"}])
+        self.assertEqual([i["id"] for i in indexes], [u"testtable_pool_type", u"testtable_pool_filename", u"testtable_pool_unitref", 
+                                                       u"testtable_pool_unitref_pool_sort", u"ix_title"])
+        self.assertEqual(indexes[1]["unique"], True)
+        self.assertEqual(indexes[3]["fields"], ("pool_unitref","pool_sort"))
+        
+        self.assertEqual(len(self.db.UpdateIndexes(tablename, indexes)), 5)
+        existing = self.db.GetIndexes(tablename)
+        self.assertEqual(len(existing), 5)
+        self.assertEqual(existing[u"testtable_pool_unitref_pool_sort"]["fields"], ("pool_unitref","pool_sort"))
+        self.assertEqual(existing[u"testtable_pool_filename"]["unique"], True)
+        # nothing changed
+        self.assertEqual(self.db.UpdateIndexes(tablename, indexes), [])
+        # changed index definition
+        indexes[4]["fields"] = ("title","pool_type")
+        self.assertEqual(self.db.UpdateIndexes(tablename, indexes), [])
+        self.assertEqual(self.db.UpdateIndexes(tablename, indexes, modify=True), [u"ix_title"])
+        self.assertEqual(self.db.GetIndexes(tablename)[u"ix_title"]["fields"], ("title","pool_type"))
+        
+        self.assert_(self.db.DropIndex(tablename, u"ix_title"))
+        self.assertFalse(u"ix_title" in self.db.GetIndexes(tablename))
+        self._deltable()
+
+
+    def test_MetaIndexes(self):
+        indexes = self.db.ConvertConfToIndexes(u"pool_meta", definitions.SystemFlds, MetaIndexes)
+        self.assertEqual(sorted([i["id"] for i in indexes]), [u"pool_meta_pool_filename", u"pool_meta_pool_type", 
+                                                              u"pool_meta_pool_unitref_pool_sort", u"pool_meta_pool_wfa"])
+
+
+    def test_Explain(self):
+        self._createtbl()
+        self.assert_(self.db.UpdateStructure(tablename, SystemFlds))
+        plan = self.db.Explain(u"select id from testtable where pool_type = ? order by title limit ?, ?")
+        self.assert_([s for s in plan if s["scan"] and s["table"]==tablename])
+        self.assert_([s for s in plan if s["filesort"]])
+        self.db.CreateIndex(tablename, u"ix_type", (u"pool_type", u"title"))
+        plan = self.db.Explain(u"select id from testtable where pool_type = %s order by title", (u"type1",))
+        self.assertEqual(plan[0]["index"], u"ix_type")
+        self.assertFalse([s for s in plan if s["scan"] or s["filesort"]])
+        self._deltable()
+
+
     
     def _createtbl(self):
         try:
@@ -57,5 +57,55 @@ class MySqlTest(dbTest, uTestCase):
     def checkdb(self):
         myapp()
     
+
+class FakeCursor(object):
+    # records statements and returns auto increment ids with gaps
+    def __init__(self, step=1):
+        self.statements = []
+        self.lastrowid = 0
+        self.next = 100
+        self.step = step
+    def execute(self, sql, values=None):
+        if sql.startswith(u"SELECT @@"):
+            self.result = (1, self.step)
+            return
+        self.statements.append((sql, values))
+        self.lastrowid = self.next
+        self.next += sql.count(u"(%s)")*self.step + 10
+    def fetchone(self):
+        return self.result
+
+
+class MySqlInsertTest(unittest.TestCase):
+
+    def setUp(self):
+        from nive.utils.dataPool2.mySqlPool import MySql
+        self.pool = MySql.__new__(MySql)
+        self.pool._debug = 0
+        self.pool.BatchSize = 2
+
+    def test_statements(self):
+        self.pool._autoincMode = 1
+        cursor = FakeCursor()
+        ids = self.pool._InsertMany(u"INSERT INTO data1 (ftext) VALUES (%s)", [[1],[2],[3]], cursor)
+        self.assertEqual(len(cursor.statements), 2)
+        self.assertEqual(cursor.statements[0], (u"INSERT INTO data1 (ftext) VALUES (%s),(%s)", [1,2]))
+        self.assertEqual(ids, [100, 101, 112])
+
+    def test_increment(self):
+        self.pool._autoincMode = None
+        cursor = FakeCursor(step=3)
+        ids = self.pool._InsertMany(u"INSERT INTO data1 (ftext) VALUES (%s)", [[1],[2],[3]], cursor)
+        self.assertEqual(len(cursor.statements), 2)
+        self.assertEqual(ids, [100, 103, 116])
+
+    def test_interleaved(self):
+        self.pool._autoincMode = 2
+        cursor = FakeCursor()
+        ids = self.pool._InsertMany(u"INSERT INTO data1 (ftext) VALUES (%s)", [[1],[2],[3]], cursor)
+        self.assertEqual(len(cursor.statements), 3)
+        self.assertEqual(ids, [100, 111, 122])
+
+
 def __test():
     unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: latin-1 -*-
+
+import unittest
+import threading
+
+from pyramid import testing
+from pyramid.response import Response
+
+from nive.utils.dataPool2.collector import *
+from nive.utils.dataPool2.sqlite3Pool import Sqlite3, Sqlite3Memory
+
+from nive.tests.db_app import app_db
+from test_db import conn, memconn
+from test_Base import conf, struct
+
+
+collconn = conn.copy(queryCollector=True, queryRepeat=3)
+memcollconn = memconn.copy(queryCollector=True, queryRepeat=3)
+
+
+class CollectorTest(unittest.TestCase):
+
+    def setUp(self):
+        app_db()
+        self.pool = Sqlite3(connParam=collconn, **conf)
+        self.pool.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+        self.collector = self.pool.usedconnection.collector
+        self.collector.Reset()
+
+    def tearDown(self):
+        self.collector.Reset()
+        self.pool.Close()
+
+
+    def test_shape(self):
+        self.assertEqual(SqlShape(u"select id from pool_meta\n  where id=12 and title='it''s' and x=\"a\""),
+                         u"select id from pool_meta where id=? and title=? and x=?")
+        self.assertEqual(SqlShape(u"select id from data1 where id IN (1,2, 3) and pool_unitref=%s"),
+                         u"select id from data1 where id IN (?) and pool_unitref=?")
+        self.assertEqual(SqlShape(u"select data1.id, t2.x from data1"), u"select data1.id, t2.x from data1")
+
+
+    def test_collect(self):
+        self.assert_(self.pool.usedconnection.collector)
+        ids = [self.pool.CreateEntry(u"data1", user=u"unittest").GetID() for i in range(3)]
+        self.pool.Commit()
+        self.collector.Reset()
+        try:
+            for id in ids:
+                self.pool.GetEntry(id)
+            records = self.collector.Records()
+            self.assert_(len(records) >= 3)
+            self.assert_(records[0]["caller"].find(u"test_collector.py") != -1)
+            self.assertEqual(records[0]["rows"], 1)
+            summary = self.collector.Summary()
+            self.assertEqual(summary["count"], len(records))
+            self.assert_(summary["repeated"])
+            self.assert_(summary["repeated"][0]["count"] >= 3)
+            self.assert_(self.collector.FormatSummary().find(u"repeated=") != -1)
+        finally:
+            for id in ids:
+                self.pool.DeleteEntry(id)
+            self.pool.Commit()
+
+
+    def test_history(self):
+        self.collector.ResetHistory()
+        for i in range(3):
+            self.pool.Query(u"select id from pool_meta where id=%d" % i)
+        self.pool.Query(u"select id from pool_meta where pool_type='x'")
+        history = self.collector.History()
+        self.assertEqual(history[0]["shape"], u"select id from pool_meta where id=?")
+        self.assertEqual(history[0]["count"], 3)
+        self.assertEqual(len(history), 2)
+        self.collector.Reset()
+        self.assertEqual(len(self.collector.History()), 2)
+        self.collector.historySize = 2
+        self.pool.Query(u"select id from pool_meta where pool_state=1")
+        self.assertEqual(len(self.collector.History()), 2)
+        self.collector.ResetHistory()
+        self.assertEqual(self.collector.History(), [])
+
+
+    def test_local_size(self):
+        self.collector.localSize = 3
+        self.collector.local = threading.local()
+        try:
+            for i in range(5):
+                self.pool.Query(u"select id from pool_meta where id=%d" % i)
+            records = self.collector.Records()
+            self.assertEqual(len(records), 3)
+            self.collector.Reset()
+            self.assertEqual(self.collector.Records(), [])
+        finally:
+            self.collector.localSize = QueryCollector.localSize
+            self.collector.local = threading.local()
+
+
+    def test_request(self):
+        request = testing.DummyRequest()
+        testing.setUp(request=request)
+        try:
+            self.pool.Query(u"select id from pool_meta where id=1")
+            self.assertEqual(len(self.collector.Records()), 1)
+            response = Response()
+            for callback in request.response_callbacks:
+                callback(request, response)
+            self.assert_(response.headers["X-Nive-Queries"].find(u"queries=1") != -1)
+            self.assertEqual(self.collector.Records(), [])
+        finally:
+            testing.tearDown()
+
+
+    def test_disabled(self):
+        pool = Sqlite3(connParam=conn, **conf)
+        self.assertEqual(pool.usedconnection.collector, None)
+        pool.Close()
+
+
+class CollectorMemoryTest(CollectorTest):
+    """
+    Runs the tests with a memory database
+    """
+
+    def setUp(self):
+        app_db([memconn])
+        self.pool = Sqlite3Memory(connParam=memcollconn, **conf)
+        self.pool.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+        self.collector = self.pool.usedconnection.collector
+        self.collector.Reset()
@@ -1,14 +1,17 @@
 # -*- coding: latin-1 -*-
 
 import copy
-from time import time
+import os
+import threading
+from time import time, sleep
 import unittest
 
-from nive.definitions import DatabaseConf
+from nive.definitions import DatabaseConf, ConfigurationError
 from nive.utils.dataPool2.connection import *
-from nive.utils.dataPool2.sqlite3Pool import Sqlite3
+from nive.utils.dataPool2.sqlite3Pool import Sqlite3, Sqlite3Connection, Sqlite3ConnRequest, Sqlite3ConnWAL, Sqlite3ConnMemory
 
-from sqlite3 import OperationalError
+import sqlite3
+from pyramid import testing
 
 from nive.tests.db_app import app_db
 
@@ -18,6 +21,8 @@ from nive.tests import __local
 conn = DatabaseConf(
     dbName = __local.ROOT+"nive.db"
 )
+walconn = conn.copy(dbName=__local.ROOT+"nive_wal2.db", poolTimeout=0.1, cacheSize=-4000)
+replconn = conn.copy(dbName=__local.ROOT+"nive_primary.db", replicas=[{"dbName": __local.ROOT+"nive_replica.db"}])
 
 
 class ConnectionTest(unittest.TestCase):
@@ -32,5 +37,260 @@ class ConnectionTest(unittest.TestCase):
     def test_connreq(self):
         self.assert_(ConnectionRequest(conn))
 
+    def test_pool(self):
+        factory = lambda: sqlite3.connect(conn.dbName, check_same_thread=False)
+        pool = ConnectionPool(factory, maxsize=2, timeout=0.05, idle=300, validateInterval=0)
+        c1 = pool.checkout()
+        c2 = pool.checkout()
+        self.assertRaises(OperationalError, pool.checkout)
+        pool.checkin(c1)
+        self.assert_(pool.checkout() is c1)
+        pool.checkin(c1)
+        pool.checkin(c2, broken=True)
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["idle"], stats["inuse"]), (1, 1, 0))
+        self.assertEqual((stats["created"], stats["closed"], stats["timeouts"]), (2, 1, 1))
+        # idle eviction and validation
+        pool.idle = 0.01
+        sleep(0.02)
+        c3 = pool.checkout()
+        self.assert_(c3 is not c1)
+        self.assertEqual(pool.stats()["evicted"], 1)
+        pool.checkin(c3)
+        pool.validate = lambda c: False
+        pool.validateIdle()
+        self.assertEqual(pool.stats()["size"], 0)
+        pool.minsize = 2
+        pool.fill()
+        self.assertEqual(pool.stats()["idle"], 2)
+        pool.close()
+        self.assertEqual(pool.stats()["size"], 0)
+        self.assertRaises(OperationalError, pool.checkout)
+
+    def test_pool_validate(self):
+        factory = lambda: sqlite3.connect(conn.dbName, check_same_thread=False)
+        pool = ConnectionPool(factory, maxsize=3, minsize=2, timeout=0.05, idle=300, validateInterval=0.01)
+        pool.fill()
+        sleep(0.02)
+        c3 = pool.checkout()
+        pool.checkin(pool.checkout())
+        pool.checkin(c3)
+        # only connections idle for validateInterval are validated. one at a time.
+        validated = []
+        def validate(c):
+            validated.append((c, pool.stats()["idle"]))
+            return c is not c3
+        pool.validate = validate
+        pool.validateIdle()
+        self.assertEqual(validated, [])
+        sleep(0.02)
+        pool.validateIdle()
+        self.assertEqual(len(validated), 2)
+        self.assertEqual([i for c, i in validated], [1, 1])
+        self.assertEqual(pool.stats()["invalid"], 1)
+        self.assertEqual(pool.stats()["idle"], 1)
+        pool.close()
+
+    def test_connpooled(self):
+        c = SqlitePooled(conn.copy(poolSize=1, poolTimeout=0.05))
+        self.assertEqual(c.GetPoolStats()["size"], 0)
+        c.cursor().execute(u"SELECT 1")
+        db = c.dbapi
+        self.assertEqual(c.GetPoolStats()["inuse"], 1)
+        c.close()
+        self.assertEqual(c.GetPoolStats()["idle"], 1)
+        c.VerifyConnection()
+        self.assert_(c.dbapi is db)
+        # reconnect closes the used connection
+        c.connect()
+        self.assert_(c.dbapi is not db)
+        self.assertEqual(c.GetPoolStats()["size"], 1)
+        c.close()
+        c.pool.close()
+
+    def test_connwal(self):
+        c = Sqlite3ConnWAL(walconn)
+        cursor = c.cursor()
+        cursor.execute(u"CREATE TABLE IF NOT EXISTS waltest (id INTEGER)")
+        cursor.execute(u"DELETE FROM waltest")
+        c.commit()
+        cursor.execute(u"PRAGMA journal_mode")
+        self.assertEqual(cursor.fetchone()[0], u"wal")
+        c.commit()
+        cursor.execute(u"INSERT INTO waltest VALUES (1)")
+        # uncommitted changes are visible for the writing thread
+        cursor.execute(u"SELECT COUNT(*) FROM waltest")
+        self.assertEqual(cursor.fetchone()[0], 1)
+        # other threads can read but wait for the writer
+        result = []
+        def other():
+            cursor = c.cursor()
+            cursor.execute(u"SELECT COUNT(*) FROM waltest")
+            result.append(cursor.fetchone()[0])
+            try:
+                cursor.execute(u"INSERT INTO waltest VALUES (2)")
+                c.commit()
+            except OperationalError:
+                result.append(u"timeout")
+            c.close()
+        t = threading.Thread(target=other)
+        t.start()
+        t.join()
+        self.assertEqual(result, [0, u"timeout"])
+        c.commit()
+        t = threading.Thread(target=other)
+        t.start()
+        t.join()
+        self.assertEqual(result, [0, u"timeout", 1])
+        cursor.execute(u"SELECT COUNT(*) FROM waltest")
+        self.assertEqual(cursor.fetchone()[0], 2)
+        # readers are read only
+        self.assertRaises(sqlite3.OperationalError, c.dbapi.execute, u"DELETE FROM waltest")
+        c.close()
+        c.pool.close()
+
+    def test_connwal_release(self):
+        c = Sqlite3ConnWAL(walconn)
+        cursor = c.cursor()
+        cursor.execute(u"CREATE TABLE IF NOT EXISTS waltest (id INTEGER)")
+        cursor.execute(u"DELETE FROM waltest")
+        c.commit()
+        # a thread ending without commit does not block the writer
+        def write(close):
+            cursor = c.cursor()
+            cursor.execute(u"INSERT INTO waltest VALUES (1)")
+            if close:
+                c.close()
+        for close in (True, False):
+            t = threading.Thread(target=write, args=(close,))
+            t.start()
+            t.join()
+            cursor.execute(u"INSERT INTO waltest VALUES (2)")
+            c.commit()
+            cursor.execute(u"SELECT id FROM waltest")
+            self.assertEqual(cursor.fetchall(), [(2,)])
+            cursor.execute(u"DELETE FROM waltest")
+            c.commit()
+        # the timeout names the thread holding the writer
+        cursor.execute(u"INSERT INTO waltest VALUES (3)")
+        result = []
+        def other():
+            try:
+                c.cursor().execute(u"INSERT INTO waltest VALUES (4)")
+            except OperationalError, e:
+                result.append(unicode(e))
+            c.close()
+        t = threading.Thread(target=other)
+        t.start()
+        t.join()
+        self.assert_(result[0].find(threading.current_thread().name) != -1)
+        # requests release the writer when finished
+        c.rollback()
+        request = testing.DummyRequest()
+        testing.setUp(request=request)
+        try:
+            c.cursor().execute(u"INSERT INTO waltest VALUES (5)")
+            self.assert_(c.local.writer)
+            for callback in request.finished_callbacks:
+                callback(request)
+            self.assertEqual(c.local.writer, None)
+            self.assertEqual(c._writerOwner, None)
+        finally:
+            testing.tearDown()
+        c.close()
+        c.pool.close()
+
+    def test_pragmas(self):
+        c = Sqlite3Connection(conn.copy(synchronous="normal", mmapSize=1024*1024))
+        cursor = c.cursor()
+        cursor.execute(u"PRAGMA synchronous")
+        self.assertEqual(cursor.fetchone()[0], 1)
+        c.close()
+        self.assertRaises(ConfigurationError, Sqlite3Connection, conn.copy(journalMode="unknown"))
+
+    def test_connreplicated(self):
+        for dbName, name in ((replconn.dbName, u"primary"), (replconn.replicas[0]["dbName"], u"replica")):
+            db = sqlite3.connect(dbName)
+            db.execute(u"CREATE TABLE IF NOT EXISTS repltest (name TEXT)")
+            db.execute(u"DELETE FROM repltest")
+            db.execute(u"INSERT INTO repltest VALUES (?)", (name,))
+            db.commit()
+            db.close()
+        def read(c):
+            cursor = c.cursor()
+            cursor.execute(u"SELECT name FROM repltest")
+            return cursor.fetchone()[0]
+        def write(c, name):
+            c.cursor().execute(u"UPDATE repltest SET name=?", (name,))
+            c.commit()
+
+        c = SqliteReplicated(replconn)
+        self.assertEqual(read(c), u"replica")
+        # reads stick to the primary after writes
+        write(c, u"primary2")
+        self.assertEqual(read(c), u"primary2")
+        c.close()
+        self.assertEqual(read(c), u"replica")
+        c.close()
+        
+        # requests
+        request = testing.DummyRequest()
+        testing.setUp(request=request)
+        try:
+            self.assertEqual(read(c), u"replica")
+            write(c, u"primary3")
+            self.assertEqual(read(c), u"primary3")
+            for callback in request.finished_callbacks:
+                callback(request)
+            self.assertEqual(c.replicas[0].stats()["inuse"], 0)
+            request = testing.DummyRequest()
+            testing.setUp(request=request)
+            self.assertEqual(read(c), u"replica")
+        finally:
+            testing.tearDown()
+        c.close()
+
+        # unavailable replicas are skipped
+        c = SqliteReplicated(replconn.copy(replicas=[{"dbName": replconn.dbName+"/nonexisting.db"}]))
+        self.assertEqual(read(c), u"primary3")
+        c.close()
+
+    def test_connmemory(self):
+        memconn = conn.copy(dbName=u"memorytest")
+        c = Sqlite3ConnMemory(memconn)
+        c.cursor().execute(u"CREATE TABLE memtest (id INTEGER)")
+        c.cursor().execute(u"INSERT INTO memtest VALUES (1)")
+        c.commit()
+        c2 = Sqlite3ConnMemory(memconn)
+        db = c2.PrivateConnection()
+        self.assertEqual(db.execute(u"SELECT COUNT(*) FROM memtest").fetchone()[0], 1)
+        db.close()
+        # the database is removed if all connections are closed
+        c.Drop()
+        c2.close()
+        c = Sqlite3ConnMemory(memconn)
+        self.assertRaises(sqlite3.OperationalError, c.cursor().execute, u"SELECT COUNT(*) FROM memtest")
+        c.Drop()
+        self.assertFalse(os.path.exists(u"memorytest"))
+
+    def test_isreadstatement(self):
+        self.assert_(IsReadStatement(u"  select id from pool_meta"))
+        self.assert_(IsReadStatement(u"\nWITH RECURSIVE parents(id) AS (SELECT 1) SELECT id FROM parents"))
+        self.assertFalse(IsReadStatement(u"SELECT id FROM pool_meta FOR UPDATE"))
+        self.assertFalse(IsReadStatement(u"UPDATE pool_meta SET title=''"))
+        self.assertFalse(IsReadStatement(u"SELECTED"))
+
+
+class SqliteReplicated(ConnectionReplicated, Sqlite3ConnRequest):
+    ReplicaConnection = Sqlite3Connection
+    
+    def __init__(self, config = None, connectNow = True):
+        Sqlite3ConnRequest.__init__(self, config, connectNow)
+        self.InitReplicas()
+
+
+class SqlitePooled(ConnectionPooled, Sqlite3Connection):
+    check_same_thread = False
+
 
 
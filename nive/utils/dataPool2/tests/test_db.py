@@ -1,13 +1,17 @@
 # -*- coding: latin-1 -*-
 
+import os
 import copy
+import hashlib
 from time import time
 import unittest
+import threading
 from types import UnicodeType
 
 from nive.definitions import DatabaseConf
 from nive.utils.dataPool2.base import *
-from nive.utils.dataPool2.sqlite3Pool import Sqlite3
+import shutil
+from nive.utils.dataPool2.sqlite3Pool import Sqlite3, Sqlite3ConnWAL, Sqlite3Memory
 from nive.utils.path import DvPath
 
 from sqlite3 import OperationalError
@@ -21,6 +25,8 @@ from nive.tests import __local
 conn = DatabaseConf(
     dbName = __local.ROOT+"nive.db"
 )
+walconn = conn.copy(dbName=__local.ROOT+"nive_wal.db", synchronous="NORMAL")
+memconn = conn.copy(context="Memory")
 
 def getPool():
     p = Sqlite3(connParam=conn, **conf)
@@ -330,6 +336,238 @@ class dbTest(object):
         self.assert_(c==c3)
 
 
+    def test_trashcan(self):
+        self.pool.useTrashcan = True
+        self.pool.trashcanQueue = True
+        try:
+            id = self.create1()
+            e = self.pool.GetEntry(id)
+            f = e.CommitFile(u"file1", {"file":file1_1, "filename":"file1.txt"})
+            e.Commit(user="unittest")
+            path = DvPath(self.pool._GetTrashcanDirectory(id))
+            path.SetNameExtension(DvPath(e.GetFile(u"file1").abspath()).GetNameExtension())
+            del e
+            self.delete(id)
+            purger = self.pool.GetTrashcanPurger()
+            purger.Stop()
+            self.assert_(path.IsFile())
+            self.assertEqual(purger.stats()["pending"], 0)
+            self.assert_(purger.Purge(0)["files"] >= 1)
+            self.assertFalse(path.IsFile())
+        finally:
+            self.pool.useTrashcan = False
+            self.pool.trashcanQueue = False
+            self.pool._purger = None
+
+
+    def test_directories(self):
+        self.assertEqual(self.pool._GetDirectory(123456), u"3400/56")
+        self.pool.directoryDepth = 3
+        try:
+            self.assertEqual(self.pool._GetDirectory(123456), u"56/34/12")
+            self.assertEqual(self.pool._GetDirectory(12), u"12/00/00")
+            self.pool.directoryWidth = 3
+            self.assertEqual(self.pool._GetDirectory(1234567), u"567/234/001")
+        finally:
+            self.pool.directoryDepth = 0
+            self.pool.directoryWidth = 2
+
+
+    def test_relocate(self):
+        id = self.create1()
+        try:
+            e = self.pool.GetEntry(id)
+            e.CommitFile(u"file1", {"file":file1_1, "filename":"file1.txt"})
+            e.Commit(user="unittest")
+            old = e.GetFile(u"file1").path
+            self.assert_(old.find(self.pool._GetDirectory(id)) != -1)
+            self.pool.directoryDepth = 3
+            last = 0
+            moved = 0
+            while True:
+                result = self.pool.RelocateFiles(start=last, batchSize=50)
+                moved += result["moved"]
+                last = result["last"]
+                if not last:
+                    break
+            self.assert_(moved >= 1)
+            e = self.pool.GetEntry(id)
+            f = e.GetFile(u"file1")
+            self.assert_(f.path.startswith(self.pool._GetDirectory(id) + u"/"))
+            self.assertEqual(f.read(), file1_1)
+            self.assertFalse(DvPath(self.pool.root.GetStr() + old).IsFile())
+            # nothing left to move
+            self.assertEqual(self.pool.RelocateFiles(batchSize=1000)["moved"], 0)
+        finally:
+            self.pool.directoryDepth = 0
+            self.delete(id)
+
+
+    def test_relocate_blobs(self):
+        # root without trailing slash stores paths as /_blobs/...
+        root = self.pool.root
+        self.pool.root = DvPath(str(root).rstrip(u"/"))
+        self.pool.useContentStore = True
+        ids = [self.create1(), self.create1()]
+        try:
+            for id in ids:
+                e = self.pool.GetEntry(id)
+                f = e.CommitFile(u"file1", {"file":file1_1, "filename":"file1.txt"})
+                e.Commit(user="unittest")
+            self.assert_(f.isBlob())
+            blob = DvPath(self.pool._GetBlobPath(f.digest))
+            self.pool.directoryDepth = 3
+            last = 0
+            while True:
+                last = self.pool.RelocateFiles(start=last, batchSize=50)["last"]
+                if not last:
+                    break
+            self.assert_(blob.IsFile())
+            for id in ids:
+                e = self.pool.GetEntry(id)
+                f = e.GetFile(u"file1")
+                self.assert_(f.isBlob())
+                self.assertEqual(f.read(), file1_1)
+        finally:
+            self.pool.directoryDepth = 0
+            self.pool.useContentStore = False
+            self.pool.root = root
+            for id in ids:
+                self.delete(id)
+
+
+    def test_content_store_release(self):
+        id1 = self.create1()
+        id2 = self.create1()
+        ids = [id1, id2]
+        self.pool.useContentStore = True
+        try:
+            e1 = self.pool.GetEntry(id1)
+            f1 = e1.CommitFile(u"file1", {"file":file1_1, "filename":"file1.txt"})
+            e1.Commit(user="unittest")
+            blob = DvPath(self.pool._GetBlobPath(f1.digest))
+            del e1
+            # the blob is released by another entry before the new record is stored
+            e2 = self.pool.GetEntry(id2)
+            update = e2._UpdateMeta
+            def _UpdateMeta(file, cursor):
+                self.delete(id1)
+                self.assertFalse(blob.IsFile())
+                update(file, cursor)
+            e2._UpdateMeta = _UpdateMeta
+            e2.CommitFile(u"file1", {"file":file1_1, "filename":"file1.txt"})
+            e2.Commit(user="unittest")
+            del e2._UpdateMeta
+            self.assert_(blob.IsFile())
+            self.assertEqual(e2.GetFile(u"file1").read(), file1_1)
+            self.assertFalse([n for n in os.listdir(str(self.pool._GetBlobDirectory())) if n.startswith(u"_temp_")])
+        finally:
+            self.pool.useContentStore = False
+            self.delete(id2)
+
+
+    def test_content_store_replace(self):
+        id = self.create1()
+        try:
+            e = self.pool.GetEntry(id)
+            e.CommitFile(u"file1", {"file":file1_1, "filename":"file1.txt"})
+            e.Commit(user="unittest")
+            old = DvPath(e.GetFile(u"file1").abspath())
+            self.assert_(old.IsFile())
+            # replacing a file stored before the content store was enabled
+            self.pool.useContentStore = True
+            f = e.CommitFile(u"file1", {"file":file1_2, "filename":"file1.txt"})
+            e.Commit(user="unittest")
+            self.assert_(f.isBlob())
+            self.assertFalse(old.IsFile())
+            self.assertEqual(e.GetFile(u"file1").read(), file1_2)
+        finally:
+            self.pool.useContentStore = False
+            self.delete(id)
+
+
+    def test_content_store_rollback(self):
+        id = self.create1()
+        self.pool.useContentStore = True
+        try:
+            e = self.pool.GetEntry(id)
+            f1 = e.CommitFile(u"file1", {"file":file1_1, "filename":"file1.txt"})
+            e.Commit(user="unittest")
+            blob = DvPath(self.pool._GetBlobPath(f1.digest))
+            # replaced files are kept until commit
+            e.CommitFile(u"file1", {"file":file1_2, "filename":"file1.txt"})
+            self.assert_(blob.IsFile())
+            self.pool.Undo()
+            self.assertEqual(e.GetFile(u"file1").digest, f1.digest)
+            self.assertEqual(e.GetFile(u"file1").read(), file1_1)
+            # failing entry commit
+            commit = e.CommitFile
+            def CommitFile(key, file, cursor=None, cleanup=True):
+                commit(key, file, cursor=cursor, cleanup=cleanup)
+                raise IOError, "File too big"
+            e.CommitFile = CommitFile
+            e.files.set(u"file1", {"file":file1_2, "filename":"file1.txt"})
+            self.assertRaises(IOError, e.Commit, "unittest")
+            del e.CommitFile
+            self.assertEqual(e.GetFile(u"file1").read(), file1_1)
+            # deleted files
+            self.assert_(e.DeleteFile(u"file1"))
+            self.pool.Undo()
+            self.assertEqual(e.GetFile(u"file1").read(), file1_1)
+            self.assert_(e.DeleteFile(u"file1"))
+            self.pool.Commit()
+            self.assertFalse(blob.IsFile())
+        finally:
+            self.pool.useContentStore = False
+            self.delete(id)
+
+
+    def test_content_store(self):
+        self.pool.useContentStore = True
+        id1 = self.create1()
+        id2 = self.create1()
+        ids = [id1, id2]
+        try:
+            e1 = self.pool.GetEntry(id1)
+            f1 = e1.CommitFile(u"file1", {"file":file1_1, "filename":"file1.txt"})
+            e1.Commit(user="unittest")
+            e2 = self.pool.GetEntry(id2)
+            f2 = e2.CommitFile(u"file1", {"file":file1_1, "filename":"other.txt"})
+            e2.Commit(user="unittest")
+            # identical files are stored once
+            self.assertEqual(f1.digest, hashlib.sha256(file1_1).hexdigest())
+            self.assert_(f1.isBlob())
+            self.assertEqual(f1.path, f2.path)
+            self.assertEqual(self.pool.FileReferences(f1.digest), 2)
+            self.assertEqual(e2.GetFile(u"file1").filename, u"other.txt")
+            # duplicates reference the same file
+            id3 = self.duplicate(id1)
+            ids.append(id3)
+            self.assertEqual(self.pool.GetEntry(id3).GetFile(u"file1").path, f1.path)
+            self.assertEqual(self.pool.FileReferences(f1.digest), 3)
+            # replacing a file removes the reference
+            f2 = e2.CommitFile(u"file1", {"file":file1_2, "filename":"other.txt"})
+            e2.Commit(user="unittest")
+            self.assertEqual(self.pool.FileReferences(f1.digest), 2)
+            self.assertEqual(e2.GetFile(u"file1").read(), file1_2)
+            # the file is deleted with the last reference
+            blob = DvPath(self.pool._GetBlobPath(f1.digest))
+            self.delete(id1)
+            self.assert_(blob.IsFile())
+            e3 = self.pool.GetEntry(id3)
+            self.assertEqual(e3.GetFile(u"file1").read(), file1_1)
+            self.assert_(e3.DeleteFile(u"file1"))
+            self.pool.Commit()
+            self.assertFalse(blob.IsFile())
+            self.delete(id2)
+            self.assertFalse(DvPath(self.pool._GetBlobPath(f2.digest)).IsFile())
+        finally:
+            self.pool.useContentStore = False
+            for id in ids:
+                if self.pool.IsIDUsed(id):
+                    self.delete(id)
+
+
     def test_preload(self):
 
         t = time()
@@ -377,6 +615,227 @@ class dbTest(object):
         self.assert_(self.pool.IsIDUsed(id) == False)
 
 
+    def test_batch(self):
+        ids = [self.create1(), self.create2(), self.create1(), self.create2(), self.create1()]
+        self.set1(ids[0])
+        batch = list(reversed(ids)) + [999999999]
+        try:
+            self.pool.BatchSize = 2
+            for preload in (u"all", u"meta", u"skip"):
+                entries = self.pool.GetBatch(batch, preload=preload)
+                if preload == u"skip":
+                    self.assertEqual([e.id for e in entries], batch)
+                    continue
+                self.assertEqual([e.id for e in entries], batch[:-1])
+            entries = self.pool.GetBatch(batch, preload=u"all")
+            self.assertEqual(entries[-1].data.get(u"fnumber"), data1_1.get(u"fnumber"))
+            self.assertEqual(entries[1].GetDataTbl(), u"data2")
+            meta = [{"id": id, "pool_datatbl": self.pool.GetEntry(id).GetDataTbl()} for id in ids]
+            entries = self.pool.GetBatch(batch, preload=u"all", meta=meta)
+            self.assertEqual([e.id for e in entries], batch[:-1])
+        finally:
+            del self.pool.BatchSize
+            for id in ids:
+                self.delete(id)
+
+
+    def test_batch_readonly(self):
+        ids = [self.create1(), self.create2(), self.create1()]
+        self.set1(ids[0])
+        try:
+            for preload in (u"all", u"meta", u"skip"):
+                entries = self.pool.GetBatch(ids+[999999999], preload=preload, readonly=True)
+                self.assertEqual([e.id for e in entries], ids)
+                self.assert_(isinstance(entries[0], ReadonlyEntry))
+                self.assertEqual(entries[1].GetDataTbl(), u"data2")
+                self.assertEqual(entries[0].meta.title, meta1[u"title"])
+                self.assertEqual(entries[0].GetMetaField(u"id"), ids[0])
+                self.assertEqual(entries[0].meta.nonexisting, None)
+                self.assertRaises(TypeError, entries[0].meta.__setitem__, u"title", u"changed")
+                self.assertRaises(AttributeError, setattr, entries[0], u"cache", 1)
+            entries = self.pool.GetBatch(ids, readonly=True)
+            self.assertEqual(entries[0].data.fnumber, data1_1.get(u"fnumber"))
+            self.assertEqual(entries[0].GetDataField(u"fnumber"), data1_1.get(u"fnumber"))
+            batch = self.pool.GetBatch(ids)
+            self.assertEqual(entries[1].GetMeta(), batch[1].GetMeta())
+            self.assertEqual(dict(entries[1].GetData()), batch[1].data.copy())
+        finally:
+            for id in ids:
+                self.delete(id)
+
+
+    def test_deferred(self):
+        self.pool.structure.Init(structure=struct, 
+                                 fieldtypes={u"data1": {u"ftext": "text", u"fmselect": "mselection"}}, 
+                                 stdMeta=struct[u"pool_meta"], 
+                                 deferred={u"data1": (u"ftext",)})
+        self.assertEqual(self.pool.structure.preloaded(u"data1"), tuple([f for f in struct[u"data1"] if f!=u"ftext"]))
+        id = self.create1()
+        e = self.pool.GetEntry(id)
+        e.data.update(data1_1)
+        e.Commit(user="unittest")
+        try:
+            for preload in (u"all", u"stdmetadata", u"meta"):
+                e = self.pool.GetEntry(id, preload=preload)
+                self.assertEqual(e.data.fnumber, data1_1[u"fnumber"])
+                self.assertFalse(e.data.IsLoaded(u"ftext"))
+                self.assert_(e.data.has_key(u"ftext"))
+                self.assert_(u"ftext" in e.data.keys())
+                self.assertFalse(e.data.IsLoaded(u"ftext"))
+                # lists are deserialized on first access
+                self.assertFalse(isinstance(e.data._content_[u"fmselect"], tuple))
+                self.assertEqual(list(e.data.fmselect), data1_1[u"fmselect"])
+                self.assertEqual(e.data.ftext, data1_1[u"ftext"])
+                self.assert_(e.data.IsLoaded(u"ftext"))
+            e = self.pool.GetEntry(id)
+            self.assertEqual(e.GetData().copy()[u"ftext"], data1_1[u"ftext"])
+            e = self.pool.GetBatch([id])[0]
+            self.assertFalse(e.data.IsLoaded(u"ftext"))
+            self.assertEqual(e.data.copy()[u"ftext"], data1_1[u"ftext"])
+            e = self.pool.GetBatch([id], readonly=True)[0]
+            self.assertEqual(e.data.ftext, None)
+            self.assertEqual(list(e.data.fmselect), data1_1[u"fmselect"])
+        finally:
+            self.delete(id)
+
+
+    def test_batch_files(self):
+        ids = [self.create1(), self.create1()]
+        self.setfile1(ids[0])
+        self.setfile2(ids[0])
+        try:
+            self.assertEqual(sorted([f[u"filekey"] for f in self.pool.GetFilesBatch(ids)[ids[0]]]), [u"file1", u"file2"])
+            for preload in (u"all", u"skip"):
+                entries = self.pool.GetBatch(ids, preload=preload, files=True)
+                # file wrappers are set and not loaded again
+                for e in entries:
+                    e.Files = None
+                self.assertEqual(entries[0].files.get(u"file1").read(), file1_1)
+                self.assertEqual(entries[0].files[u"file2"].filename, u"file2.txt")
+                self.assertEqual(entries[1].files.get(u"file1"), None)
+                self.assertEqual(entries[1].files.keys(), [])
+            entries = self.pool.GetBatch(ids)
+            self.assert_(entries[1].files.IsEmpty())
+        finally:
+            for id in ids:
+                self.delete(id)
+
+
+    def test_create_many(self):
+        c = self.statdb()
+        rows = [{"meta": {u"title": u"bulk 1", u"pool_unitref": 0}, "data": {u"fstr": u"text 1"}, "fulltext": u"fulltext 1"},
+                {"meta": {u"title": u"bulk 2", u"pool_unitref": 0}, "data": {u"fstr": u"text 2"}, "fulltext": u"fulltext 2"},
+                {"meta": {u"title": u"bulk 3"}, "data": {}}]
+        ids = self.pool.CreateEntries(u"data2", rows, user=u"unittest")
+        try:
+            self.assertEqual(len(ids), 3)
+            self.assertEqual(c+3, self.statdb())
+            for id, row in zip(ids, rows):
+                e = self.pool.GetEntry(id)
+                self.assertEqual(e.meta.get(u"title"), row["meta"][u"title"])
+                self.assertEqual(e.meta.get(u"pool_createdby"), u"unittest")
+                self.assertEqual(e.GetDataTbl(), u"data2")
+                if row["data"]:
+                    self.assertEqual(e.data.get(u"fstr"), row["data"][u"fstr"])
+            self.assertEqual(self.pool.GetEntry(ids[1]).GetFulltext(), u"fulltext 2")
+            self.assertEqual(self.pool.CreateEntries(u"data2", []), [])
+        finally:
+            for id in ids:
+                self.delete(id)
+        self.assertEqual(c, self.statdb())
+
+
+    def test_create_many_batches(self):
+        rows = [{"meta": {u"title": u"bulk %d" % i}, "data": {u"fstr": u"text %d" % i}} for i in range(7)]
+        self.pool.BatchSize = 3
+        try:
+            ids = self.pool.CreateEntries(u"data2", rows, user=u"unittest")
+        finally:
+            del self.pool.BatchSize
+        try:
+            self.assertEqual(len(set(ids)), 7)
+            for id, row in zip(ids, rows):
+                e = self.pool.GetEntry(id)
+                self.assertEqual(e.meta.get(u"title"), row["meta"][u"title"])
+                self.assertEqual(e.data.get(u"fstr"), row["data"][u"fstr"])
+        finally:
+            for id in ids:
+                self.delete(id)
+
+
+    def test_update_many(self):
+        ids = [self.create2(), self.create2(), self.create2()]
+        try:
+            rows = [(ids[0], {u"title": u"many 1", u"pool_sort": 30}), 
+                    (ids[1], {u"title": u"many 2", u"pool_sort": 20}), 
+                    (ids[2], {u"pool_sort": 10})]
+            self.assertEqual(self.pool.UpdateFieldsMany(self.pool.MetaTable, rows), 3)
+            self.pool.Commit()
+            e = self.pool.GetEntry(ids[1])
+            self.assertEqual(e.meta.get(u"title"), u"many 2")
+            self.assertEqual(e.GetMetaField(u"pool_sort"), 20)
+            self.assertEqual(self.pool.GetEntry(ids[2]).GetMetaField(u"pool_sort"), 10)
+            self.assertEqual(self.pool.UpdateFieldsMany(self.pool.MetaTable, []), 0)
+        finally:
+            for id in ids:
+                self.delete(id)
+
+
+    def test_iterate(self):
+        ids = [self.create2(), self.create2(), self.create2()]
+        try:
+            sql = u"select id from pool_meta where id >= %s order by id" % (self.pool.placeholder)
+            it = self.pool.Iterate(sql, (ids[0],), batchsize=2)
+            self.assertEqual([r[0] for r in it], ids)
+            # stop early and close the cursor
+            it = self.pool.Iterate(sql, (ids[0],), batchsize=2)
+            self.assertEqual(it.next()[0], ids[0])
+            it.close()
+            self.assertEqual(list(self.pool.Iterate(sql, (ids[-1]+1,))), [])
+        finally:
+            for id in ids:
+                self.delete(id)
+
+
+    def test_getcount(self):
+        sql = u"select count(*) from pool_meta"
+        cnt = self.pool.GetCount(sql)
+        self.assertEqual(self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"cached"), cnt)
+        id = self.create2()
+        try:
+            # invalidated by write
+            self.assertEqual(self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"cached"), cnt+1)
+            self.assertEqual(self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"estimate") is not None, True)
+            # changes not made by the pool are not recognized until the table is marked as changed
+            self.pool.Query(u"update pool_meta set pool_sort=1 where id=%d" % (id))
+            self.assertEqual(self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"cached"), cnt+1)
+        finally:
+            self.delete(id)
+        self.assertEqual(self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"cached"), cnt)
+
+
+    def test_getcount_commit(self):
+        # a count cached by another thread before the changes are committed is not used
+        sql = u"select count(*) from pool_meta"
+        cnt = self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"cached")
+        data, id = self.pool.InsertFields(self.pool.MetaTable, {u"pool_datatbl": u"data2", u"pool_dataref": 0}, idColumn=u"id")
+        try:
+            result = []
+            def count():
+                result.append(self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"cached"))
+                self.pool.usedconnection.close()
+            t = threading.Thread(target=count)
+            t.start()
+            t.join()
+            self.assertEqual(len(result), 1)
+            self.pool.Commit()
+            self.assertEqual(self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"cached"), cnt+1)
+        finally:
+            self.pool.DeleteRecords(self.pool.MetaTable, {u"id": id})
+            self.pool.Commit()
+        self.assertEqual(self.pool.GetCount(sql, tables=[u"pool_meta"], strategy=u"cached"), cnt)
+
+
     def test_duplicate_base(self):
 
         t = time()
@@ -619,6 +1078,93 @@ class dbTest(object):
         base.GetParentTitles(1)
 
 
+    def test_tree_recursive(self):
+        base = self.pool
+        if not base.SupportsRecursiveQueries():
+            return
+        # chain deeper than 10 levels
+        ids = []
+        parent = 0
+        for i in range(15):
+            e = base.CreateEntry(u"data1", user="unittest")
+            e.meta.update({u"pool_unitref": parent, u"title": u"level%02d" % i})
+            e.Commit(user="unittest")
+            parent = e.GetID()
+            ids.append(parent)
+        try:
+            self.assertEqual(base.GetParentPath(ids[-1]), ids[:-1])
+            self.assertEqual(base.GetParentTitles(ids[-1]), [u"level%02d" % i for i in range(14)])
+            self.assertEqual(base.GetParentPath(ids[0]), [])
+            self.assertEqual(base.GetContainedIDs(base=ids[0]), ids[1:])
+            self.assertEqual(base.GetContainedIDs(base=ids[-1]), [])
+
+            tree = base.GetTree(flds=[u"id", u"title"], base=ids[0])
+            self.assertEqual(tree[u"id"], ids[0])
+            level = 1
+            while tree[u"items"]:
+                self.assertEqual(len(tree[u"items"]), 1)
+                tree = tree[u"items"][0]
+                self.assertEqual(tree[u"id"], ids[level])
+                self.assertEqual(tree[u"title"], u"level%02d" % level)
+                level += 1
+            self.assertEqual(level, 15)
+
+            # fallback queries return the same result for the first 10 levels
+            base._recursiveQueries = False
+            self.assertEqual(base.GetParentPath(ids[8]), ids[:8])
+            self.assertEqual(base.GetContainedIDs(base=ids[-4]), ids[-3:])
+        finally:
+            base._recursiveQueries = None
+            for id in reversed(ids):
+                base.DeleteEntry(id)
+            base.Commit(user="unittest")
+
+
+    def test_tree_index(self):
+        base = self.pool
+        base.useTreeIndex = True
+        # a -> b -> c, d
+        ids = []
+        for parent in (0, 0, 2, 0):
+            e = base.CreateEntry(u"data1", user="unittest")
+            if parent:
+                parent = ids[parent-1]
+            e.meta.update({u"pool_unitref": parent, u"title": u"tree%d" % len(ids)})
+            e.Commit(user="unittest")
+            ids.append(e.GetID())
+        a, b, c, d = ids
+        try:
+            e = base.GetEntry(b)
+            e.meta[u"pool_unitref"] = a
+            e.Commit(user="unittest")
+            self.assertEqual(base.GetParentPath(c), [a, b])
+            self.assertEqual(base.GetParentTitles(c), [u"tree0", u"tree1"])
+            self.assertItemsEqual(base.GetContainedIDs(base=a), [b, c])
+            self.assert_(base.IsContained(c, a))
+            self.assertFalse(base.IsContained(a, c))
+
+            # move subtree b -> d
+            base.GetEntry(b).SetMetaField(u"pool_unitref", d)
+            self.assertEqual(base.GetParentPath(c), [d, b])
+            self.assertEqual(base.GetContainedIDs(base=a), [])
+            self.assertEqual(base.GetContainedIDs(base=d), [b, c])
+
+            # compare with index rebuilt from pool_meta
+            sql = u"SELECT ancestor, descendant, depth FROM pool_tree WHERE descendant IN (%s,%s,%s,%s)" % tuple(ids)
+            current = base.Query(sql)
+            base.RebuildTreeIndex()
+            self.assertItemsEqual(base.Query(sql), current)
+
+            base.DeleteEntry(c)
+            base.Commit(user="unittest")
+            self.assertEqual(base.GetContainedIDs(base=d), [b])
+        finally:
+            for id in ids:
+                base.DeleteEntry(id)
+            base.Commit(user="unittest")
+            base.useTreeIndex = False
+
+
 
 
 
@@ -642,6 +1188,42 @@ class Sqlite3Test(dbTest, unittest.TestCase):
         self.assert_(self.pool.connection.IsConnected())
         #print "OK"
 
+
+class Sqlite3WALTest(Sqlite3Test):
+    """
+    Runs the tests with a separate database in WAL mode
+    """
+    def setUp(self):
+        dbfile = DvPath(walconn["dbName"])
+        if not dbfile.IsFile():
+            self.checkdb()
+            shutil.copy(conn["dbName"], walconn["dbName"])
+        self.pool = Sqlite3(connection=Sqlite3ConnWAL(walconn), **conf)
+        self.pool.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+        self.connect()
+
+    def tearDown(self):
+        self.pool.Close()
+        self.pool.usedconnection.pool.close()
+
+
+class Sqlite3MemoryTest(Sqlite3Test):
+    """
+    Runs the tests with a memory database
+    """
+    def setUp(self):
+        self.checkdb()
+        self.pool = Sqlite3Memory(connParam=memconn, **conf)
+        self.pool.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+        self.connect()
+
+    def checkdb(self):
+        app_db([memconn])
+
+    def test_getcount_commit(self):
+        # shared cache: readers on other connections are locked out until commit
+        pass
+
     
 
 if __name__ == '__main__':
@@ -2,9 +2,18 @@
 
 import copy, time, StringIO
 import unittest
+import shutil
+import sqlite3
 from pkg_resources import resource_filename
 
+from nive.definitions import ConfigurationError
 from nive.utils.dataPool2.files import File
+from nive.utils.dataPool2.sqlite3Pool import Sqlite3, Sqlite3Memory
+
+from nive.tests.db_app import app_db
+from nive.tests import __local
+from test_db import conn, memconn
+from test_Base import conf, struct, file1_1, file1_2
 
 
 class fileentrytest(object):
@@ -137,6 +146,13 @@ class FileTest(unittest.TestCase):
         self.assert_(file.extension=="png")
         
         
+    def test_blob(self):
+        self.assert_(File("aaa", path="_blobs/ab/cd/abcdef", digest="abcdef").isBlob())
+        self.assert_(File("aaa", path="/_blobs/ab/cd/abcdef").isBlob())
+        self.assertFalse(File("aaa", path="0000/01/000001_aaa_.txt").isBlob())
+        self.assertFalse(File("aaa", filename="qqqq.png").isBlob())
+        
+        
     def test_dict(self):
         file = File(filekey="aaa",
                     filename="qqqq.png", 
@@ -159,3 +175,110 @@ class FileTest(unittest.TestCase):
         
         for k in file:
             self.assert_(k)
+
+
+
+class filePoolTest(object):
+    """
+    Stores files through the pool. Subclasses set `self.pool`.
+    """
+
+    def test_commit(self):
+        e = self.pool.CreateEntry(u"data2", user=u"unittest")
+        e.Commit(user=u"unittest")
+        id = e.GetID()
+        try:
+            self.assert_(e.CommitFile(u"file1", File(filekey=u"file1", filename=u"file1.txt", file=file1_1)))
+            e.Commit(user=u"unittest")
+            file = e.GetFile(u"file1")
+            self.assertEqual(file.filename, u"file1.txt")
+            self.assertEqual(file.size, len(file1_1))
+            self.assertEqual(file.read(4), file1_1[:4])
+            file.seek(0)
+            self.assertEqual(file.read(), file1_1)
+            file.close()
+            
+            # replace
+            self.assert_(e.CommitFile(u"file1", {"file":file1_2, "filename":u"file2.txt"}))
+            e.Commit(user=u"unittest")
+            e2 = self.pool.GetEntry(id)
+            self.assertEqual(e2.GetFile(u"file1").read(), file1_2)
+            self.assertEqual(e2.GetFile(u"file1").filename, u"file2.txt")
+            
+            # delete
+            self.assert_(e2.DeleteFile(u"file1"))
+            e2.Commit(user=u"unittest")
+            self.assertEqual(self.pool.GetEntry(id).GetFile(u"file1"), None)
+        finally:
+            del e
+            self.pool.DeleteEntry(id)
+            self.pool.Commit(user=u"unittest")
+
+
+class Sqlite3FileTest(filePoolTest, unittest.TestCase):
+
+    def setUp(self):
+        app_db()
+        self.pool = Sqlite3(connParam=conn, **conf)
+        self.pool.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+
+    def tearDown(self):
+        self.pool.Close()
+
+
+class Sqlite3MemoryFileTest(filePoolTest, unittest.TestCase):
+
+    def setUp(self):
+        app_db([memconn])
+        self.pool = Sqlite3Memory(connParam=memconn, **conf)
+        self.pool.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+
+    def tearDown(self):
+        self.pool.Close()
+
+
+nodigestconn = conn.copy(dbName=__local.ROOT+"nive_nodigest.db")
+
+class Sqlite3NoDigestTest(unittest.TestCase):
+    """
+    Runs with a file table created before digests were added
+    """
+
+    def setUp(self):
+        app_db()
+        self.conn = nodigestconn
+        shutil.copy(conn.dbName, self.conn.dbName)
+        db = sqlite3.connect(self.conn.dbName)
+        db.execute(u"drop table pool_files")
+        db.execute(u"""create table pool_files(fileid INTEGER PRIMARY KEY AUTOINCREMENT, id INTEGER NOT NULL DEFAULT 0, 
+                   filekey VARCHAR(35) NOT NULL DEFAULT '', filename VARCHAR(255) NOT NULL DEFAULT '', path VARCHAR(255) NOT NULL DEFAULT '', 
+                   size INTEGER NOT NULL DEFAULT 0, extension VARCHAR(5) NOT NULL DEFAULT '', version VARCHAR(5) NOT NULL DEFAULT '')""")
+        db.commit()
+        db.close()
+        self.pool = Sqlite3(connParam=self.conn, **conf)
+        self.pool.structure.Init(structure=struct, stdMeta=struct[u"pool_meta"])
+
+    def tearDown(self):
+        self.pool.Close()
+
+
+    def test_files(self):
+        self.assertFalse(self.pool.SupportsFileDigests())
+        e = self.pool.CreateEntry(u"data2", user=u"unittest")
+        e.Commit(user=u"unittest")
+        id = e.GetID()
+        try:
+            self.assert_(e.CommitFile(u"file1", {"file":file1_1, "filename":u"file1.txt"}))
+            e.Commit(user=u"unittest")
+            self.assert_(e.CommitFile(u"file1", {"file":file1_2, "filename":u"file1.txt"}))
+            e.Commit(user=u"unittest")
+            self.assertEqual(e.GetFile(u"file1").read(), file1_2)
+            self.assertEqual(len(self.pool.GetFilesBatch([id])[id]), 1)
+            # the content store requires the digest column
+            self.pool.useContentStore = True
+            self.assertRaises(ConfigurationError, e.CommitFile, u"file1", {"file":file1_1, "filename":u"file1.txt"})
+            self.pool.useContentStore = False
+        finally:
+            del e
+            self.pool.DeleteEntry(id)
+            self.pool.Commit(user=u"unittest")
@@ -6,6 +6,10 @@ from datetime import datetime
 from datetime import date
 
 from nive.utils.dataPool2.structure import *
+from nive.utils.dataPool2.sqlite3Pool import Sqlite3, Sqlite3Memory
+
+from nive.tests.db_app import app_db
+from test_db import conn, memconn
 
 from nive.tests import __local
 
@@ -90,6 +94,16 @@ class StructureTest(unittest.TestCase):
         self.assert_(structure["data2"])
         self.assert_(structure.has_key("data2"))
         self.assert_(len(structure.keys())==3)
+
+    def test_deferred(self):
+        structure = PoolStructure(structure=test_Base.struct, 
+                                  fieldtypes=ftypes, 
+                                  stdMeta=[u"id",u"pool_type"],
+                                  deferred={u"data2": [u"ftext", u"unknown"]})
+        self.assertEqual(structure.deferred, {u"data2": (u"ftext",)})
+        self.assertEqual(structure.preloaded(u"data2"), (u"fstr",))
+        self.assertEqual(structure.preloaded(u"data1"), test_Base.struct[u"data1"])
+        self.assertEqual(structure.preloaded(u"none", u"aaa"), u"aaa")
         
         
 
@@ -204,6 +218,32 @@ class ConversionTest(unittest.TestCase):
     def test_ds_json(self):
         self.assert_(self.structure.deserialize(u"data2", u"fjson", json.dumps(["aaa","bbb"]))[0]=="aaa")
 
+    def test_decoder(self):
+        decode = self.structure.decoder(u"data2", (u"fstr", u"fmselection", u"fjson", u"somevalue"))
+        values = decode((u"text", json.dumps(["aaa","bbb"]), u"", u"_json_"+json.dumps([1])))
+        self.assertEqual(values, {u"fstr": u"text", u"fmselection": [u"aaa",u"bbb"], u"fjson": None, u"somevalue": [1]})
+        decode = self.structure.decoder(u"pool_meta")
+        self.assertEqual(sorted(decode(range(len(self.structure[u"pool_meta"]))).keys()), sorted(self.structure[u"pool_meta"]))
+
+    def test_lazy(self):
+        value = json.dumps(["aaa","bbb"])
+        self.assertEqual(self.structure.lazy(u"data2"), frozenset([u"fmselection", u"fmcheckboxes", u"furllist", u"funitlist", u"fjson"]))
+        values = self.structure.deserialize(u"data2", None, {u"fmselection": value, u"ftime": u"1.5"}, lazy=True)
+        self.assertEqual(values[u"fmselection"], value)
+        self.assertEqual(values[u"ftime"], 1.5)
+        decode = self.structure.decoder(u"data2", (u"fstr", u"fjson"), lazy=True)
+        self.assertEqual(decode((u"text", value)), {u"fstr": u"text", u"fjson": value})
+
+    def test_codec(self):
+        se, de, lazy = self.structure.codec(u"data2")
+        self.assertEqual(lazy, frozenset([u"fmselection", u"fmcheckboxes", u"furllist", u"funitlist", u"fjson"]))
+        self.assertEqual(se[u"fstr"], self.structure._se_text)
+        self.assertEqual(de[u"fstr"], None)
+        self.assertEqual(de[u"funitlist"], self.structure._de_unitlist)
+        # unknown tables are compiled on first use
+        self.assertEqual(self.structure.codec(u"unknown"), ({}, {}, frozenset()))
+        self.assertEqual(self.structure.serialize(u"unknown", u"somevalue", "123"), u"123")
+
 
 
 def seCallback(value, field):
@@ -231,6 +271,12 @@ class CallbackTest(unittest.TestCase):
     def test_serialize_callback(self):
         self.assert_(self.structure.serialize(u"pool_meta", u"title", u"somevalue")==u"SOMEVALUE")
         self.assert_(self.structure.deserialize(u"pool_meta", u"title", u"somevalue")==u"Somevalue")
+        # changed in place
+        self.assert_(self.structure.deserialize(u"data2", u"ftext", u"somevalue")==u"somevalue")
+        self.structure.deserializeCallbacks[u"text"] = deCallback
+        self.assert_(self.structure.deserialize(u"data2", u"ftext", u"somevalue")==u"somevalue")
+        self.structure.Compile()
+        self.assert_(self.structure.deserialize(u"data2", u"ftext", u"somevalue")==u"Somevalue")
 
         
     def test_se_mselection(self):
@@ -252,4 +298,52 @@ class CallbackTest(unittest.TestCase):
         self.assert_(self.structure.serialize(u"pool_meta", u"pool_sort", "123.0")==123.0)
         self.assert_(self.structure.serialize(u"pool_meta", u"pool_sort", 123.12)==123.12)
 
-        
\ No newline at end of file
+
+
+class structurePoolTest(object):
+    """
+    Stores and loads serialized values through the pool. Subclasses set `self.pool`.
+    """
+
+    def test_roundtrip(self):
+        self.pool.structure.Init(structure=test_Base.struct,
+                                 fieldtypes=ftypes,
+                                 stdMeta=test_Base.struct[u"pool_meta"])
+        e = self.pool.CreateEntry(u"data2", user=u"unittest")
+        e.meta.update({u"title": u"\xe4\xf6\xfc", u"pool_sort": u"12.5", u"pool_wfa": [u"edit"]})
+        e.data.update({u"fstr": 123, u"ftext": u"text"})
+        e.Commit(user=u"unittest")
+        id = e.GetID()
+        del e
+        try:
+            e = self.pool.GetEntry(id)
+            self.assertEqual(e.meta[u"title"], u"\xe4\xf6\xfc")
+            self.assertEqual(e.meta[u"pool_sort"], 12.5)
+            self.assertEqual(e.meta[u"pool_wfa"], u"edit")
+            self.assert_(isinstance(e.meta[u"pool_change"], datetime))
+            self.assertEqual(e.data[u"fstr"], u"123")
+            self.assertEqual(e.data[u"ftext"], u"text")
+            del e
+        finally:
+            self.pool.DeleteEntry(id)
+            self.pool.Commit(user=u"unittest")
+
+
+class Sqlite3StructureTest(structurePoolTest, unittest.TestCase):
+
+    def setUp(self):
+        app_db()
+        self.pool = Sqlite3(connParam=conn, **test_Base.conf)
+
+    def tearDown(self):
+        self.pool.Close()
+
+
+class Sqlite3MemoryStructureTest(structurePoolTest, unittest.TestCase):
+
+    def setUp(self):
+        app_db([memconn])
+        self.pool = Sqlite3Memory(connParam=memconn, **test_Base.conf)
+
+    def tearDown(self):
+        self.pool.Close()
@@ -0,0 +1,131 @@
+# -*- coding: latin-1 -*-
+
+import os
+import shutil
+import unittest
+from time import time
+
+from nive.utils.dataPool2.trashcan import TrashcanPurger
+from nive.utils.dataPool2.sqlite3Pool import Sqlite3
+from test_db import conn
+from test_Base import conf
+
+from nive.tests import __local
+
+
+root = __local.ROOT+"trashcan_test"
+
+
+def write(path, data="0123456789", age=0):
+    d = os.path.dirname(path)
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    f = open(path, "wb")
+    f.write(data)
+    f.close()
+    if age:
+        t = time() - age
+        os.utime(path, (t, t))
+    return path
+
+
+class TrashcanTest(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.isdir(root):
+            shutil.rmtree(root)
+        self.trash = os.path.join(root, "_trashcan")
+        self.purger = TrashcanPurger(self.trash, retention=3600, delay=0.01)
+
+    def tearDown(self):
+        self.purger.Stop()
+        shutil.rmtree(root, True)
+
+
+    def test_purge(self):
+        old = write(os.path.join(self.trash, "0100", "1_file1.txt"), age=7200)
+        new = write(os.path.join(self.trash, "0200", "2_file1.txt"))
+        result = self.purger.Purge()
+        self.assertEqual(result["files"], 1)
+        self.assertEqual(result["bytes"], 10)
+        self.assertEqual(result["directories"], 1)
+        self.assertFalse(os.path.exists(old))
+        self.assert_(os.path.exists(new))
+        result = self.purger.Purge(0)
+        self.assertEqual(result["files"], 1)
+        self.assertEqual(os.listdir(self.trash), [])
+        self.assertEqual(self.purger.stats()["freed"], 20)
+        # missing trashcan
+        shutil.rmtree(self.trash)
+        self.assertEqual(self.purger.Purge()["files"], 0)
+
+
+    def test_move(self):
+        source = write(os.path.join(root, "0100", "1_file1.txt"), age=7200)
+        target = os.path.join(self.trash, "0100", "1_file1.txt")
+        self.assert_(self.purger.Move(source, target))
+        self.assertFalse(os.path.exists(source))
+        self.assert_(os.path.exists(target))
+        # the retention starts with the move
+        self.assertEqual(self.purger.Purge()["files"], 0)
+        self.assertFalse(self.purger.Move(source, target))
+        self.assertEqual(self.purger.stats()["errors"], 1)
+
+
+    def test_queue(self):
+        sources = [write(os.path.join(root, "0100", "%d_file1.txt" % i)) for i in range(3)]
+        targets = [os.path.join(self.trash, "0100", "%d_file1.txt" % i) for i in range(3)]
+        self.purger.Stop()
+        for s, t in zip(sources, targets):
+            self.assert_(self.purger.Enqueue(s, t))
+        # renamed at once
+        for s in sources:
+            self.assertFalse(os.path.exists(s))
+        self.purger.Stop()
+        for t in targets:
+            self.assert_(os.path.exists(t))
+        stats = self.purger.stats()
+        self.assertEqual(stats["queued"], 3)
+        self.assertEqual(stats["moved"], 3)
+        self.assertEqual(stats["pending"], 0)
+        self.assertFalse(self.purger.Enqueue(sources[0], targets[0]))
+
+
+    def test_delete(self):
+        source = write(os.path.join(root, "0100", "1_file1.txt"))
+        self.assert_(self.purger.Enqueue(source))
+        self.purger.Flush()
+        self.assertEqual(os.listdir(os.path.join(root, "0100")), [])
+        self.assertEqual(os.listdir(os.path.join(self.trash, self.purger.Pending)), [])
+
+
+    def test_pending(self):
+        # queued files left by a stopped process are purged after the retention time
+        source = write(os.path.join(root, "0100", "1_file1.txt"), age=7200)
+        self.purger.Stop()
+        self.purger.Start = lambda: None
+        self.assert_(self.purger.Enqueue(source))
+        self.assertEqual(os.listdir(os.path.join(root, "0100")), [])
+        purger = TrashcanPurger(self.trash, retention=3600)
+        self.assertEqual(purger.Purge()["files"], 0)
+        self.assertEqual(purger.Purge(0)["files"], 1)
+        self.assertEqual(os.listdir(os.path.join(self.trash, purger.Pending)), [])
+        self.purger._queue = []
+
+
+    def test_pool(self):
+        # the purger is started with the pool if a retention is set
+        pool = Sqlite3(connParam=conn, **dict(conf, root=root+"/", useTrashcan=True, trashcanRetention=3600))
+        try:
+            self.assert_(pool._purger)
+            self.assert_(pool._purger._worker.is_alive())
+        finally:
+            pool.Close()
+        self.assertEqual(pool._purger._worker, None)
+        pool = Sqlite3(connParam=conn, **dict(conf, root=root+"/", useTrashcan=True))
+        self.assertEqual(pool._purger, None)
+        pool.Close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+#----------------------------------------------------------------------
+# Copyright 2012, 2013 Arndt Droullier, Nive GmbH. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#----------------------------------------------------------------------
+
+__doc__ = """
+Trashcan purger
+---------------
+Empties the trashcan directory of the file storage and moves deleted files to the trashcan
+in the background. Enable in the database configuration ::
+
+    DatabaseConf(useTrashcan=True, trashcanRetention=30*24*3600, trashcanQueue=True)
+
+Files are kept in the trashcan for `trashcanRetention` seconds after deletion. The purger
+runs every `trashcanInterval` seconds in a background thread and removes older files and
+empty directories. The freed space is logged as `nive.trashcan`.
+
+If `trashcanQueue` is enabled, deleted files are only renamed to the trashcan directory
+`_pending` while the request is processed. Moving the files to their trashcan directory is 
+queued and done in batches by the background thread. Files left in `_pending` if the process
+exits with queued moves are removed by the purger after the retention time.
+"""
+
+import os
+import uuid
+import logging
+import threading
+from time import time
+
+
+class TrashcanPurger(object):
+    """
+    Moves deleted files to the trashcan and removes trashcan files older than `retention`
+    seconds. ::
+
+        root      = trashcan directory
+        retention = seconds deleted files are kept. 0 = files are not purged automatically
+        interval  = seconds between two purge runs of the background thread
+        batchSize = maximum number of queued moves processed at once
+        delay     = seconds queued moves are collected before processing
+
+    The background thread is started by `Start()` or the first queued file. Call `Stop()`
+    to process pending moves and stop the thread. Use `stats()` to get purger statistics.
+    """
+    Pending = u"_pending"    # directory of queued files
+
+    def __init__(self, root, retention=0, interval=3600, batchSize=100, delay=1):
+        self.root = root
+        self.retention = retention
+        self.interval = interval
+        self.batchSize = batchSize
+        self.delay = delay
+        self._queue = []
+        self._cond = threading.Condition()
+        self._fslock = threading.Lock()
+        self._worker = None
+        self._stop = False
+        self._lastPurge = time()
+        self._stats = dict(queued=0, moved=0, purged=0, freed=0, errors=0)
+
+
+    def Enqueue(self, source, target=None):
+        """
+        Queues the file `source` to be moved to `target`. If target is None the file is
+        deleted. The file is renamed to the pending directory at once so the original path 
+        can be reused. Returns False if the rename failed.
+        """
+        pending = os.path.join(self.root, self.Pending)
+        staged = os.path.join(pending, unicode(uuid.uuid4()))
+        try:
+            try:
+                os.makedirs(pending)
+            except OSError:
+                # created by another thread or process 
+                if not os.path.isdir(pending):
+                    raise
+            os.rename(source, staged)
+            # the retention starts with the deletion
+            os.utime(staged, None)
+        except OSError, e:
+            self._stats["errors"] += 1
+            logging.getLogger("nive.trashcan").warning(u"Rename failed: %s (%s)", source, unicode(e))
+            return False
+        self._cond.acquire()
+        try:
+            self._queue.append((staged, target))
+            self._stats["queued"] += 1
+            if len(self._queue) == 1 or len(self._queue) >= self.batchSize:
+                self._cond.notify()
+        finally:
+            self._cond.release()
+        self.Start()
+        return True
+
+
+    def Flush(self):
+        """
+        Processes all queued moves in the current thread. Returns the number of moved or
+        deleted files.
+        """
+        cnt = 0
+        while True:
+            self._cond.acquire()
+            try:
+                batch = self._queue[:self.batchSize]
+                del self._queue[:self.batchSize]
+            finally:
+                self._cond.release()
+            if not batch:
+                return cnt
+            self._fslock.acquire()
+            try:
+                for source, target in batch:
+                    if self.Move(source, target):
+                        cnt += 1
+            finally:
+                self._fslock.release()
+
+
+    def Move(self, source, target=None):
+        """
+        Moves the file to the trashcan path `target` or deletes the file if target is
+        None. Existing files are replaced. Returns True on success.
+        """
+        try:
+            if target is None:
+                os.remove(source)
+            else:
+                directory = os.path.dirname(target)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                if os.path.exists(target):
+                    os.remove(target)
+                os.rename(source, target)
+                # the retention starts with the deletion
+                os.utime(target, None)
+        except OSError, e:
+            self._stats["errors"] += 1
+            logging.getLogger("nive.trashcan").warning(u"Move failed: %s (%s)", source, unicode(e))
+            return False
+        self._stats["moved"] += 1
+        return True
+
+
+    def Purge(self, retention=None):
+        """
+        Deletes trashcan files older than `retention` seconds and empty directories. If
+        retention is None the configured retention is used. Returns a dictionary ::
+
+            files       = number of deleted files
+            bytes       = freed space in bytes
+            directories = number of removed directories
+            errors      = number of files which could not be deleted
+        """
+        if retention is None:
+            retention = self.retention
+        limit = time() - retention
+        pending = os.path.join(self.root, self.Pending)
+        result = dict(files=0, bytes=0, directories=0, errors=0)
+        self._fslock.acquire()
+        try:
+            if os.path.isdir(self.root):
+                for path, dirs, files in os.walk(self.root, topdown=False):
+                    for name in files:
+                        filepath = os.path.join(path, name)
+                        try:
+                            stat = os.stat(filepath)
+                            if stat.st_mtime > limit:
+                                continue
+                            os.remove(filepath)
+                        except OSError:
+                            result["errors"] += 1
+                            continue
+                        result["files"] += 1
+                        result["bytes"] += stat.st_size
+                    if os.path.normpath(path) in (os.path.normpath(self.root), os.path.normpath(pending)):
+                        continue
+                    try:
+                        if not os.listdir(path):
+                            os.rmdir(path)
+                            result["directories"] += 1
+                    except OSError:
+                        pass
+        finally:
+            self._lastPurge = time()
+            self._fslock.release()
+        self._stats["purged"] += result["files"]
+        self._stats["freed"] += result["bytes"]
+        self._stats["errors"] += result["errors"]
+        if result["files"] or result["errors"]:
+            logging.getLogger("nive.trashcan").info(u"Trashcan purged: files=%d; freed=%d bytes; errors=%d",
+                                                    result["files"], result["bytes"], result["errors"])
+        return result
+
+
+    def Start(self):
+        """ Starts the background thread if not running """
+        if self._worker:
+            return
+        self._cond.acquire()
+        try:
+            if self._worker:
+                return
+            self._stop = False
+            self._worker = threading.Thread(target=self._Loop, name="nive.TrashcanPurger")
+            self._worker.daemon = True
+        finally:
+            self._cond.release()
+        self._worker.start()
+
+
+    def Stop(self, timeout=10):
+        """ Stops the background thread and processes pending moves """
+        self._cond.acquire()
+        try:
+            worker = self._worker
+            self._stop = True
+            self._cond.notify()
+        finally:
+            self._cond.release()
+        if worker and worker is not threading.current_thread():
+            worker.join(timeout)
+        self._worker = None
+        self.Flush()
+
+
+    def stats(self):
+        """
+        Returns the purger statistics ::
+
+            queued  = number of queued files
+            pending = number of files waiting in the queue
+            moved   = number of moved or deleted files
+            purged  = number of files deleted by purge runs
+            freed   = freed space in bytes
+            errors  = number of failed file operations
+        """
+        s = self._stats.copy()
+        s["pending"] = len(self._queue)
+        return s
+
+
+    def _Loop(self):
+        log = logging.getLogger("nive.trashcan")
+        while True:
+            self._cond.acquire()
+            try:
+                if not self._stop and not self._queue:
+                    self._cond.wait(self._NextPurge())
+                if not self._stop and 0 < len(self._queue) < self.batchSize:
+                    # collect moves for `delay` seconds
+                    self._cond.wait(self.delay)
+                stop = self._stop
+            finally:
+                self._cond.release()
+            try:
+                self.Flush()
+                if not stop and self.retention and self.interval and time() - self._lastPurge >= self.interval:
+                    self.Purge()
+            except Exception, e:
+                log.error(u"Trashcan purger failed: %s", unicode(e))
+            if stop:
+                return
+
+
+    def _NextPurge(self):
+        # seconds until the next purge run or None to wait for new files
+        if not self.retention or not self.interval:
+            return None
+        return max(self._lastPurge + self.interval - time(), 0.1)
+
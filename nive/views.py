@@ -25,6 +25,7 @@ data rendering, url generation, http headers and user lookup.
 
 import os
 import time
+import urllib
 from datetime import datetime
 from email.utils import formatdate
 
@@ -36,14 +37,16 @@ from pyramid.security import authenticated_userid
 from pyramid.security import has_permission
 from pyramid.i18n import get_localizer
 
-from pyramid.httpexceptions import HTTPNotFound, HTTPFound, HTTPOk, HTTPForbidden
+from pyramid.httpexceptions import HTTPNotFound, HTTPFound, HTTPOk, HTTPForbidden, HTTPNotModified
 from pyramid.exceptions import NotFound
+from webob.etag import ETagMatcher
 
 from nive.i18n import _
 from nive.utils.utils import ConvertToStr, ConvertListToStr, ConvertToDateTime
 from nive.utils.utils import FmtSeconds, FormatBytesForDisplay, CutText, GetMimeTypeExtension
 from nive import FileNotFound
 from nive.definitions import IPage, IObject
+from nive.helper import ResolveName
 
 
 
@@ -64,6 +67,9 @@ class BaseView(object):
         self.appRequestKeys = []
         self._t = time.time()
         self.fileExpires = 3600
+        # fingerprinted file urls
+        self.fingerprintExpires = 365*24*3600
+        self.fingerprintLength = 16
 
 
     # url handling ----------------------------------------------------------------
@@ -114,12 +120,17 @@ class BaseView(object):
             file = u"%s/%s" % (self.viewModule.static, file)
         return static_url(file, self.request)
 
-    def FileUrl(self, fieldID, resource=None):
+    def FileUrl(self, fieldID, resource=None, fingerprint=None):
         """
         Generates the file url for the file contained in resource. The resource must have the 'file'
         view included (IFile). If the url is called the download is mapped to ``View.file``. 
         
         If resource is None the current context object is used as resource.
+        
+        If fingerprint is True the url includes the start of the file digest 
+        (``file/<fingerprint>/<filename>``). The url changes if the file is replaced and the
+        file is sent as immutable with far future expiry. Defaults to the application setting
+        `fileFingerprint`.
 
         returns url
         """
@@ -128,6 +139,14 @@ class BaseView(object):
         file = resource.files.get(fieldID)
         if not file:
             return u""
+        if fingerprint is None:
+            try:
+                fingerprint = resource.app.configuration.get("fileFingerprint")
+            except AttributeError:
+                fingerprint = False
+        digest = getattr(file, "digest", None)
+        if fingerprint and digest:
+            return u"%sfile/%s/%s" % (self.Url(resource), digest[:self.fingerprintLength], file.filename)
         return u"%sfile/%s" % (self.Url(resource), file.filename)
 
     def PageUrl(self, resource=None, usePageLink=0):
@@ -380,43 +399,82 @@ class BaseView(object):
         """
         Used by "file" view for the current context. 
         
-        Calls SendFile() for the file matching the filename of the current url.
+        Calls SendFile() for the file matching the filename of the current url. Urls
+        can include a fingerprint before the filename (see `FileUrl()`).
         """
         if not len(self.request.subpath):
             raise NotFound
-        file = self.context.GetFileByName(self.request.subpath[0])
+        file = self.context.GetFileByName(self.request.subpath[-1])
         if not file:
             raise NotFound
-        return self.SendFile(file)
+        fingerprint = None
+        if len(self.request.subpath) > 1:
+            fingerprint = self.request.subpath[0]
+        return self.SendFile(file, fingerprint=fingerprint)
 
 
-    def SendFile(self, file):
+    def SendFile(self, file, fingerprint=None):
         """
-        Creates the response and sends the file back. Uses the FileIterator.
+        Creates the response and sends the file back. The file body is set by the
+        file delivery configured for the application (see `GetFileDelivery()`).
+        
+        The file digest is used as strong ETag. Requests with matching `If-None-Match` 
+        header are answered without reading the file. If `fingerprint` matches the file 
+        digest, the file is sent as immutable with far future expiry.
         
         #!date format
         """
         if not file:
             return HTTPNotFound()
+        digest = getattr(file, "digest", None)
+        immutable = bool(digest and fingerprint and fingerprint == digest[:self.fingerprintLength])
+        if digest:
+            match = self.request.environ.get("HTTP_IF_NONE_MATCH")
+            if match and digest in ETagMatcher.parse(match, strong=False):
+                r = HTTPNotModified()
+                r.etag = digest
+                self._FileCache(r, immutable)
+                return r
         last_mod = file.mtime()
         if not last_mod:
             last_mod = self.context.meta.pool_change
         r = Response(content_type=str(GetMimeTypeExtension(file.extension)), conditional_response=True)
-        iterator = file.iterator()
-        if iterator:
-            r.app_iter = iterator
-        else:
-            try:
-                r.body = file.read()
-            except FileNotFound:
-                raise NotFound
-        r.content_length = file.size
+        try:
+            r = self.GetFileDelivery()(self.request, r, file)
+        except FileNotFound:
+            raise NotFound
         r.last_modified = last_mod
-        r.etag = '%s-%s' % (last_mod, hash(file.path))
-        r.cache_expires(self.fileExpires)
+        if digest:
+            r.etag = digest
+        else:
+            r.etag = '%s-%s' % (last_mod, hash(file.path))
+        self._FileCache(r, immutable)
         return r    
 
 
+    def GetFileDelivery(self):
+        """
+        Returns the file delivery configured as `fileDelivery` in the application 
+        configuration. Supported values are "wsgi" (default), "x-sendfile", 
+        "x-accel-redirect" or a dotted python name of a FileDelivery subclass.
+        """
+        try:
+            configuration = self.context.app.configuration
+        except AttributeError:
+            return FileDelivery()
+        delivery = configuration.get("fileDelivery") or "wsgi"
+        delivery = FileDeliveryModes.get(delivery) or ResolveName(delivery)
+        return delivery(configuration)
+
+
+    def _FileCache(self, response, immutable):
+        if immutable:
+            response.cache_expires(self.fingerprintExpires)
+            response.headers["Cache-Control"] = "public, max-age=%d, immutable" % self.fingerprintExpires
+            return
+        response.cache_expires(self.fileExpires)
+
+
     # http caching ----------------------------------------------------------------
 
     def CacheHeader(self, response, user=None):
@@ -761,6 +819,90 @@ class BaseView(object):
 
 
 
+# file delivery ---------------------------------------------------------------------
+
+class FileDelivery(object):
+    """
+    Sets the file as response body. If the server provides `wsgi.file_wrapper` the 
+    open file is passed to the server (e.g. sendfile), otherwise the file is read in chunks
+    by `FileIterable`. Range requests are served by seeking the requested part. 
+    
+    Subclass and call `response = delivery(request, response, file)` for custom delivery. 
+    """
+    blockSize = 4096*20
+    
+    def __init__(self, configuration=None):
+        self.configuration = configuration or {}
+
+    def __call__(self, request, response, file):
+        path = file.abspath()
+        if not path:
+            response.body = file.read()
+            return response
+        response.accept_ranges = "bytes"
+        wrapper = request.environ.get("wsgi.file_wrapper")
+        if wrapper and not request.environ.get("HTTP_RANGE"):
+            response.app_iter = wrapper(open(path, "rb"), self.blockSize)
+        else:
+            response.app_iter = file.iterator()
+        response.content_length = file.size
+        return response
+
+
+class XSendfileDelivery(FileDelivery):
+    """
+    Hands the file over to the front server by setting the `X-Sendfile` header with the
+    absolute file path (e.g. Apache mod_xsendfile, lighttpd). The response body is empty.
+    Range requests are handled by the front server.
+    """
+    header = "X-Sendfile"
+
+    def __call__(self, request, response, file):
+        location = self.Location(file)
+        if not location:
+            return FileDelivery.__call__(self, request, response, file)
+        response.app_iter = []
+        response.headers[self.header] = location
+        return response
+
+    def Location(self, file):
+        path = file.abspath()
+        if not path:
+            return None
+        if isinstance(path, unicode):
+            path = path.encode("utf-8")
+        return path
+
+
+class XAccelDelivery(XSendfileDelivery):
+    """
+    Hands the file over to nginx by setting the `X-Accel-Redirect` header. The internal
+    location is set as `fileDeliveryPath` in the application configuration (default 
+    "/_files/") and must point to the file root ::
+    
+        location /_files/ {
+            internal;
+            alias /var/nive/files/;
+        }
+    """
+    header = "X-Accel-Redirect"
+
+    def Location(self, file):
+        if not file.abspath():
+            return None
+        prefix = self.configuration.get("fileDeliveryPath") or u"/_files/"
+        path = file.path.replace(u"\\", u"/").lstrip(u"/")
+        location = prefix.rstrip(u"/") + u"/" + path
+        return urllib.quote(location.encode("utf-8"))
+
+
+FileDeliveryModes = {"wsgi": FileDelivery, 
+                     "x-sendfile": XSendfileDelivery, 
+                     "x-accel-redirect": XAccelDelivery}
+
+
+
+
 
 class FieldRenderer(object):
     